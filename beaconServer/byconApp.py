@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+
+import sys
+from os import environ, path, pardir
+
+"""
+WSGI entry point for running the `beacon` and `services` endpoints in a
+persistent application server, e.g.
+
+```
+gunicorn --chdir /path/to/bycon_install_dir/beaconServer --workers 8 --threads 1 byconApp:application
+```
+
+The application is limited to one request per process, serialized: the request
+state is installed into the process-wide `bycon` globals, so concurrency has to
+come from the number of (single threaded) worker processes. Threaded workers
+are served serially and a warning is written to the server's error log.
+
+The module has to be loaded before `bycon` since it switches it into the
+application mode. The public host name used for constructed URLs (handovers,
+server addresses) is read from the `HTTP_HOST` of each request; the startup
+value (default `localhost`) only switches `bycon` into the web mode. The `local`
+configuration is read relative to this script as for the CGI version.
+"""
+
+dir_path = path.dirname( path.abspath(__file__) )
+
+environ.update({"BYCON_APP_MODE": "true"})
+environ.setdefault("HTTP_HOST", "localhost")
+# `bycon` derives the `local` configuration path from the calling script
+sys.argv = [ path.abspath(__file__) ]
+
+from bycon import ByconApp
+
+application = ByconApp(
+    beacon_path=dir_path,
+    services_path=path.normpath(path.join(dir_path, pardir, "services"))
+)
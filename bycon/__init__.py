@@ -1,8 +1,10 @@
 # __init__.py
-import sys, traceback
+import sys, time, traceback
 from os import environ, path
 from pathlib import Path
 
+startup_t = time.perf_counter()
+
 pkg_path = path.dirname( path.abspath(__file__) )
 bycon_lib_path = path.join( pkg_path, "lib" )
 sys.path.append( pkg_path )
@@ -14,12 +16,15 @@ try:
 
     from beacon_auth import *
     from beacon_response_generation import *
+    from bycon_app import *
     from bycon_helpers import *
     from cytoband_parsing import *
     from dataset_parsing import *
     from genome_utils import *
     from handover_generation import *
+    from handover_storage import *
     from parameter_parsing import *
+    from query_cache import *
     from query_execution import *
     from query_generation import *
     from read_specs import *
@@ -30,15 +35,25 @@ try:
 
     # import byconServiceLibs
 
-    read_service_definition_files()
-    update_rootpars_from_local_or_HOST()
-    rest_path_elements()
-    set_beacon_defaults()
-    arguments_set_defaults()
-    parse_arguments()
-    set_entities()
-    initialize_bycon_service()
-    parse_filters()
+    # the startup steps are timed; the breakdown is kept in
+    # `BYC["STARTUP_TIMINGS"]` and printed in debug mode or to stderr if the
+    # `BYCON_STARTUP_TIMING` environment variable is set
+    # in the application mode only the configuration is loaded here and the
+    # request specific steps are run per request by `ByconApp`
+    s_t_s = {"imports": time.perf_counter() - startup_t}
+    init_fs = [read_service_definition_files]
+    if not APP_MODE:
+        init_fs += [update_rootpars_from_local_or_HOST] + REQUEST_INIT_STEPS
+    for init_f in init_fs:
+        step_t = time.perf_counter()
+        init_f()
+        s_t_s.update({init_f.__name__: time.perf_counter() - step_t})
+    s_t_s.update({"total": time.perf_counter() - startup_t})
+    BYC.update({"STARTUP_TIMINGS": s_t_s})
+    s_t_l = ", ".join([f'{k}: {round(v * 1000, 1)}ms' for k, v in s_t_s.items()])
+    prdbug(f'bycon startup timings - {s_t_l}')
+    if "BYCON_STARTUP_TIMING" in environ:
+        print(f'bycon startup timings - {s_t_l}', file=sys.stderr)
 
 except Exception:
     if not "___shell___" in ENV:
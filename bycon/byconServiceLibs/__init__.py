@@ -21,8 +21,11 @@ try:
     from importer_helpers import *
     from interval_utils import *
     from ontology_utils import *
+    from plot_cache import *
+    from probe_data import *
     from service_helpers import *
     from service_response_generation import *
+    from statusmap_store import *
 
 except Exception:
     if not "___shell___" in ENV:
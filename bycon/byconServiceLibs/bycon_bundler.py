@@ -1,13 +1,15 @@
 import csv, datetime, re, sys
 
+from itertools import chain
 from os import environ, path
-from pymongo import MongoClient
-from copy import deepcopy
 
 from bycon import (
     BYC,
     BYC_PARS,
-    DB_MONGOHOST,
+    DB_IN_QUERY_CHUNK_SIZE,
+    dataset_data_version,
+    get_mongo_client,
+    mongo_records_by_values,
     ByconVariant,
     return_paginated_list,
     prdbug
@@ -17,7 +19,9 @@ services_lib_path = path.join( path.dirname( path.abspath(__file__) ) )
 sys.path.append( services_lib_path )
 from datatable_utils import import_datatable_dict_line
 from file_utils import *
-from interval_utils import GenomeBins
+from interval_utils import GenomeBins, STATUSMAPS_PROJECTION
+from probe_data import ProbeData
+from statusmap_store import StatusmapStore
 from service_response_generation import CollationQuery
 
 ################################################################################
@@ -81,68 +85,103 @@ class ByconBundler:
     #--------------------------------------------------------------------------#
 
     def read_pgx_file(self, filepath):
-        self.filepath = filepath
+        self.data = []
+        for rows in self.pgx_file_chunks(filepath):
+            self.data.extend(rows)
 
-        h_lines = []
-        with open(self.filepath) as f:
-            for line in f:
-                line = line.strip()
-                if line.startswith("#"):
-                    h_lines.append(line)
+        return self
 
-        d_lines, fieldnames = read_tsv_to_dictlist(self.filepath, max_count=0)
-        self.header = h_lines
-        self.data = d_lines
-        self.fieldnames = fieldnames
 
-        return self
+    #--------------------------------------------------------------------------#
+
+    def pgx_file_chunks(self, filepath, chunk_size=1000):
+        """
+        Generator for the data lines of a pgxseg or other tab-delimited file, as
+        lists of up to `chunk_size` row dictionaries. The file is read in a
+        single pass; `#` prefixed header lines (e.g. `#meta=>`, `#sample=>`) are
+        collected into `self.header` and the column names into `self.fieldnames`
+        - both are available once the first chunk has been yielded (or the
+        generator has been exhausted for files w/o data lines).
+        """
+        self.filepath = filepath
+        self.header = []
+        self.fieldnames = []
+        chunk_size = max(1, chunk_size)
+
+        with open(self.filepath, newline='') as f:
+            data = csv.DictReader(self.__pgx_data_lines(f), delimiter="\t", quotechar='"')
+            self.fieldnames = list(data.fieldnames or [])
+            rows = []
+            for l in data:
+                rows.append(dict(l))
+                if len(rows) >= chunk_size:
+                    yield rows
+                    rows = []
+            if len(rows) > 0:
+                yield rows
         
 
     #--------------------------------------------------------------------------#
 
     def read_probedata_file(self, filepath):
-        self.filepath = filepath
+        """
+        Returns the probes of the file as list of probe objects
+        (`probe_id`, `reference_name`, `start`, `value`) in file order; see
+        `read_probedata_columns` for the columnar form used for plotting.
+        """
         self.probedata = []
+        for p_lines in self.pgx_file_chunks(filepath):
+            p_i, r_n, s_t, v_a = self.fieldnames[:4]
+            for l in p_lines:
+                self.probedata.append({
+                    "probe_id": l.get(p_i),
+                    "reference_name": l.get(r_n),
+                    "start": int(l.get(s_t)),
+                    "value": float(l.get(v_a))
+                })
 
-        p_lines, fieldnames = read_tsv_to_dictlist(self.filepath, max_count=0)
+        return self.probedata
 
-        p_o = {
-            "probe_id": False,
-            "reference_name": False,
-            "start": False,
-            "value": False
-        }
 
-        p_f_d = {
-            "probe_id": {"type": "string", "key": fieldnames[0]},
-            "reference_name": {"type": "string", "key": fieldnames[1]},
-            "start": {"type": "integer", "key": fieldnames[2]},
-            "value": {"type": "number", "key": fieldnames[3]}
-        }
+    #--------------------------------------------------------------------------#
 
-        for l in p_lines:
-            p = deepcopy(p_o)
-            for pk, pv in p_f_d.items():
-                l_k = pv["key"]
-                p.update({ pk: l.get(l_k) })
-                if "int" in pv["type"]:
-                    p.update({ pk: int(p[pk]) })
-                elif "num" in pv["type"]:
-                    p.update({ pk: float(p[pk]) })
-            self.probedata.append(p)
+    def read_probedata_columns(self, filepath):
+        """
+        Returns the probes of the file as `ProbeData` columns (chromosome code,
+        position, value), sorted by chromosome and position and w/o probes on
+        unknown chromosomes.
+        """
+        self.filepath = filepath
 
-        return self.probedata
+        return ProbeData().readProbeFile(self.filepath)
+
+
+    #--------------------------------------------------------------------------#
+
+    def probefile_to_plotbundle(self, filepath):
+        """
+        Plot data bundle for the `probesplot` plot type, with the probes of the
+        file as `ProbeData` columns.
+        """
+        return {
+            "analyses_probes_bundles": [{
+                "id": path.splitext(path.basename(str(filepath)))[0],
+                "cn_probes": self.read_probedata_columns(filepath)
+            }]
+        }
 
 
     #--------------------------------------------------------------------------#
 
     def pgxseg_to_keyed_bundle(self, filepath):
-        self.read_pgx_file(filepath)
+        # the header has been read with the first chunk of variant lines
+        v_chunks = self.pgx_file_chunks(filepath)
+        v_first = next(v_chunks, [])
         if not "biosample_id" in self.fieldnames:
             self.errors.append("¡¡¡ The `biosample_id` parameter is required for variant assignment !!!")
             return
         self.__deparse_pgxseg_samples_header()
-        self.__keyed_bundle_add_variants_from_lines()
+        self.__keyed_bundle_add_variants_from_lines(chain([v_first], v_chunks))
 
         return self.keyedBundle
 
@@ -186,9 +225,9 @@ class ByconBundler:
     #--------------------------------------------------------------------------#
 
     def resultsets_frequencies_bundles(self, datasets_results={}):
+        # datasets covered by a statusmap store don't need the analyses' retrieval
         self.datasets_results = datasets_results
-        self.__callsets_bundle_from_result_set()
-        self.__callsetBundleCreateIsets()
+        self.__isets_from_statusmaps()
         return {"interval_frequencies_bundles": self.intervalFrequenciesBundles}
 
 
@@ -214,6 +253,16 @@ class ByconBundler:
     #----------------------------- private ------------------------------------#
     #--------------------------------------------------------------------------#
 
+    def __pgx_data_lines(self, file):
+        for line in file:
+            if line.startswith("#"):
+                self.header.append(line.strip())
+                continue
+            yield line
+
+
+    #--------------------------------------------------------------------------#
+
     def __deparse_pgxseg_samples_header(self):
         b_k_b = self.keyedBundle
         h_l = self.header
@@ -270,7 +319,7 @@ class ByconBundler:
             if bundle_type == "biosamples":
                 analysis_key = "analysis_id"
 
-            mongo_client = MongoClient(host=DB_MONGOHOST)
+            mongo_client = get_mongo_client()
             sample_coll = mongo_client[ds_id][bundle_type]
             s_r = ds_res[res_k]
             s_ids = s_r["target_values"]
@@ -280,9 +329,7 @@ class ByconBundler:
             prdbug(f'...... __callsets_bundle_from_result_set limit: {self.limit}')
             s_ids = return_paginated_list(s_ids, self.skip, self.limit)
             prdbug(f'...... __callsets_bundle_from_result_set after: {len(s_ids)}')
-            for s_id in s_ids:
-                s = sample_coll.find_one({"id": s_id })
-
+            for s in mongo_records_by_values(sample_coll, s_ids):
                 cnv_chro_stats = s.get("cnv_chro_stats", False)
                 cnv_statusmaps = s.get("cnv_statusmaps", False)
 
@@ -313,7 +360,7 @@ class ByconBundler:
         bb = self.bundle
         c_p_l = []
 
-        mongo_client = MongoClient(host=DB_MONGOHOST)
+        mongo_client = get_mongo_client()
         for p_o in bb.get("analyses", []):
             ds_id = p_o.get("dataset_id", "___none___")
             var_coll = mongo_client[ds_id]["variants"]
@@ -328,9 +375,9 @@ class ByconBundler:
 
     #--------------------------------------------------------------------------#
 
-    def __keyed_bundle_add_variants_from_lines(self):
+    def __keyed_bundle_add_variants_from_lines(self, var_chunks=[]):
         fieldnames = self.fieldnames
-        varlines = self.data
+        varlines = chain.from_iterable(var_chunks)
 
         b_k_b = self.keyedBundle
         inds_ided = b_k_b.get("individuals_by_id", {})
@@ -339,6 +386,7 @@ class ByconBundler:
         vars_ided = b_k_b.get("variants_by_callset_id", {})
 
         GB = GenomeBins()
+        BV = ByconVariant()
 
         for v in varlines:
             # prdbug(f'... __keyed_bundle_add_variants_from_lines variant {self.data}')
@@ -370,7 +418,7 @@ class ByconBundler:
             }
 
             update_v = import_datatable_dict_line(update_v, fieldnames, v, "genomicVariant")
-            update_v = ByconVariant().pgxVariant(update_v)
+            update_v = BV.pgxVariant(update_v)
             update_v.update({
                 "updated": datetime.datetime.now().isoformat()
             })
@@ -408,6 +456,108 @@ class ByconBundler:
         })
 
 
+    #--------------------------------------------------------------------------#
+
+    def __isets_from_statusmaps(self):
+        """
+        Interval frequencies for the matched analyses of each dataset (in the
+        order of the datasets' results), from the (optional) `StatusmapStore`
+        if all matched analyses are indexed there or else from the streamed
+        statusmaps.
+        """
+        GB = GenomeBins()
+        for ds_id, ds_res in self.datasets_results.items():
+            if not ds_res:
+                continue
+            if not "analyses.id" in ds_res:
+                continue
+            if (iset := self.__iset_from_statusmap_store(GB, ds_id, ds_res)) is False:
+                iset = self.__iset_from_streamed_statusmaps(GB, ds_id, ds_res)
+            if not iset:
+                continue
+            self.intervalFrequenciesBundles.append(iset)
+
+
+    #--------------------------------------------------------------------------#
+
+    def __iset_from_statusmap_store(self, GB, ds_id, ds_res):
+        """
+        Creates the interval frequencies for a dataset where all matched analyses
+        are indexed in the `StatusmapStore` (refreshed at the current data
+        version of the dataset); returns `False` if the standard processing is
+        needed and `None` if the dataset has no (or not enough) matched CNV
+        analyses.
+        """
+        SMS = StatusmapStore(ds_id, GB.get_genome_binning(), GB.get_genome_bin_count())
+        if not SMS.isConfigured():
+            return False
+        if SMS.dataVersion() != dataset_data_version(ds_id):
+            prdbug(f'... statusmap store of {ds_id} is outdated')
+            return False
+        min_f = BYC["interval_definitions"]["interval_min_fraction"].get("value", 0.001)
+        p_s = BYC.get("PAGINATED_STATUS", False)
+        s_ids = ds_res["analyses.id"]["target_values"]
+        if len(s_ids) < 1:
+            return None
+        s_ids = return_paginated_list(s_ids, self.skip, self.limit)
+        counts, cnv_ana_count = SMS.intervalCounts(s_ids, min_f)
+        if counts is None:
+            # the pagination is left to the standard processing
+            BYC.update({"PAGINATED_STATUS": p_s})
+            return False
+        prdbug(f'... __iset_from_statusmap_store {ds_id} => sample_count {cnv_ana_count} ...')
+        if cnv_ana_count < 1 or cnv_ana_count < self.min_number:
+            return None
+        intervals, cnv_ana_count = GB.intervalFrequencyMapsFromCounts(counts, cnv_ana_count)
+        return {
+            "dataset_id": ds_id,
+            "group_id": ds_id,
+            "label": "",
+            "sample_count": cnv_ana_count,
+            "interval_frequencies": [intv.copy() for intv in intervals]
+        }
+
+
+    #--------------------------------------------------------------------------#
+
+    def __iset_from_streamed_statusmaps(self, GB, ds_id, ds_res):
+        """
+        Interval frequencies for the matched analyses of a dataset, with the
+        statusmaps streamed from the database (projection only on the maps)
+        instead of collecting the complete analyses into the bundle first.
+        """
+        s_ids = ds_res["analyses.id"]["target_values"]
+        if len(s_ids) < 1:
+            return None
+        s_ids = return_paginated_list(s_ids, self.skip, self.limit)
+        ana_coll = get_mongo_client()[ds_id]["analyses"]
+        intervals, cnv_ana_count = GB.intervalFrequencyMaps(
+            self.__statusmap_analyses_stream(ana_coll, s_ids)
+        )
+        prdbug(f'... __iset_from_streamed_statusmaps {ds_id} => sample_count {cnv_ana_count} ...')
+        if cnv_ana_count < 1 or cnv_ana_count < self.min_number:
+            return None
+        return {
+            "dataset_id": ds_id,
+            "group_id": ds_id,
+            "label": "",
+            "sample_count": cnv_ana_count,
+            "interval_frequencies": [intv.copy() for intv in intervals]
+        }
+
+
+    #--------------------------------------------------------------------------#
+
+    def __statusmap_analyses_stream(self, ana_coll, ana_ids):
+        for c_i in range(0, len(ana_ids), DB_IN_QUERY_CHUNK_SIZE):
+            query = {
+                "id": {"$in": ana_ids[c_i:c_i + DB_IN_QUERY_CHUNK_SIZE]},
+                "cnv_statusmaps": {"$exists": True},
+                "cnv_chro_stats": {"$exists": True}
+            }
+            yield from ana_coll.find(query, STATUSMAPS_PROJECTION)
+
+
     #--------------------------------------------------------------------------#
 
     def __callsetBundleCreateIsets(self, label=""):
@@ -443,7 +593,7 @@ class ByconBundler:
  
         prdbug(f'... __isetBundlesFromCollationParameters query {query}')
 
-        mongo_client = MongoClient(host=DB_MONGOHOST)
+        mongo_client = get_mongo_client()
         for ds_id in self.datset_ids:
             coll_db = mongo_client[ds_id]
 
@@ -462,10 +612,10 @@ class ByconBundler:
                     "label": re.sub(r';', ',', collation_f.get("label", "")),
                     "sample_count": fmap_count,
                     "frequencymap_samples": fmap.get("frequencymap_samples", fmap_count),
-                    "interval_frequencies": fmap.get("intervals", [])
+                    "interval_frequencies": fmap.get("intervals", []),
+                    "updated": collation_f.get("updated")
                 }                    
                 self.intervalFrequenciesBundles.append(r_o)
-        mongo_client.close( )
 
 
 ################################################################################
@@ -1,4 +1,6 @@
-import base64, inspect, io, math, re, sys
+import base64, inspect, io, json, math, re, sys
+import numpy as np
+from collections import OrderedDict
 from datetime import datetime, date
 from humps import decamelize
 from os import environ, path
@@ -10,6 +12,7 @@ from bycon import (
     ENV,
     GeneInfo,
     Cytobands,
+    genome_assembly_id,
     test_truthy,
     prdbug
 )
@@ -17,6 +20,13 @@ from bycon import (
 services_lib_path = path.join( path.dirname( path.abspath(__file__) ) )
 sys.path.append( services_lib_path )
 from clustering_utils import cluster_frequencies, cluster_samples
+from probe_data import ProbeData
+from plot_cache import ByconPlotCache
+
+# rendered plot layers (e.g. the cytobands) which only depend on the plot
+# geometry & genome assembly are kept per process; see `ByconPlot.__plot_layer`
+PLOT_LAYERS = OrderedDict()
+PLOT_LAYERS_MAX = 64
 
 # http://progenetix.org/services/sampleplots?&filters=pgx:icdom-85003&plotType=histoplot&skip=0&limit=100&plotPars=plot_chros=8,9,17::labels=8:120000000-123000000:Some+Interesting+Region::plot_gene_symbols=MYCN,REL,TP53,MTAP,CDKN2A,MYC,ERBB2,CDK1::plot_width=800&filters=pgx:icdom-85003&plotType=histoplot
 # http://progenetix.org/services/samplesplot?datasetIds=progenetix&referenceName=9&variantType=DEL&start=21500000&start=21975098&end=21967753&end=22500000&filters=NCIT:C3058&plotType=histoplot&plotPars=plot_gene_symbols=CDKN2A,MTAP,EGFR,BCL6
@@ -30,7 +40,7 @@ class ByconPlotPars:
     def __init__(self):
         self.plot_type = BYC_PARS.get("plot_type", "histoplot")
         self.plot_defaults = BYC.get("plot_defaults", {})
-        self.plot_variant_types = self.plot_defaults.get("plot_variant_types", {})
+        self.plot_variant_types = self.plot_defaults.get("plot_variant_types", {}).get("default", {})
         p_t_s = self.plot_defaults.get("plot_type_defs", {})
         p_d_p = self.plot_defaults.get("plot_parameters", {})
         self.plv = {}
@@ -173,7 +183,13 @@ class ByconPlot:
         self.svg = None
         self.plot_time_init = datetime.now()
 
+        # an identical plot is served from the optional plot cache
+        PC = ByconPlotCache(self.plot_type, ByconPlotPars().plotParameters(), plot_data_bundle)
+        if (svg := PC.cachedSVG()) is not None:
+            self.svg = svg
+            return
         self.__plot_pipeline()
+        PC.storeSVG(self.svg)
 
 
     # -------------------------------------------------------------------------#
@@ -469,8 +485,31 @@ class ByconPlot:
         if self.plv["plot_chro_height"] < 1:
             return
 
+        l_k = ["cytobands_circle", genome_assembly_id()] + [self.plv.get(k) for k in [
+            "plot_chros",
+            "plot_genome_size",
+            "circ_genome_with_gaps",
+            "start_f",
+            "circ_gap_fraction",
+            "circ_center_x",
+            "circ_center_y",
+            "circ_radius_label",
+            "circ_radius_chro_o",
+            "circ_radius_chro_i",
+            "plot_font_size",
+            "cytoband_colors"
+        ]]
+        self.plv["pls"] += self.__plot_layer(l_k, self.__cytobands_circle_layer)
+        self.plv["Y"] += self.plv["plot_area_width"]
+
+
+    # -------------------------------------------------------------------------#
+
+    def __cytobands_circle_layer(self):
         g_w_gaps = self.plv["circ_genome_with_gaps"]
         area_f_0 = self.plv["start_f"]
+        chro_cbs = self.__chromosome_cytobands()
+        pls = []
 
         chrotextstyle = f'text-anchor: middle; font-size: {self.plv["plot_font_size"]}px'
 
@@ -479,12 +518,10 @@ class ByconPlot:
             chr_f = c_l["size"] / g_w_gaps
             lab_f = area_f_0 + chr_f / 2
             chro_lab = self.BCT.svg_text(self.plv["circ_radius_label"], lab_f, chro, chrotextstyle)
-            self.plv["pls"].append(chro_lab)
+            pls.append(chro_lab)
 
             # bands
-            chr_cb_s = list(filter(lambda d: d["chro"] == chro, self.cytobands.copy()))
-
-            for cb in chr_cb_s:
+            for cb in chro_cbs.get(chro, []):
                 s_b = cb["start"]
                 e_b = cb["end"]
                 c = cb["staining"]
@@ -503,12 +540,12 @@ class ByconPlot:
                     rgb
                 )
 
-                self.plv["pls"].append(pieSVG)
+                pls.append(pieSVG)
                 area_f_0 = cbPlotStopF
 
             area_f_0 += self.plv["circ_gap_fraction"]
 
-        self.plv["Y"] += self.plv["plot_area_width"]
+        return pls
 
 
     # -------------------------------------------------------------------------#
@@ -649,35 +686,63 @@ class ByconPlot:
 
         self.__plot_add_cytoband_svg_gradients()
 
+        self.plv["Y"] += self.plv["plot_title_font_size"]
+
+        l_k = ["cytobands", genome_assembly_id()] + [self.plv.get(k) for k in [
+            "plot_chros",
+            "plot_genome_size",
+            "plot_b2pf",
+            "plot_area_x0",
+            "Y",
+            "plot_chro_height",
+            "plot_region_gap_width",
+            "plot_font_size",
+            "plot_id"
+        ]]
+        self.plv["pls"] += self.__plot_layer(l_k, self.__cytobands_layer)
+
+        self.plv["Y"] += prg_w
+        self.plv.update({"plot_chromosomes_y0": self.plv["Y"]})
+        self.plv["Y"] += chr_h
+        self.plv["Y"] += prg_w
+
+
+    # -------------------------------------------------------------------------#
+
+    def __cytobands_layer(self):
+        chr_h = self.plv.get("plot_chro_height", 12)
+        prg_w = self.plv.get("plot_region_gap_width", 2)
+        chro_cbs = self.__chromosome_cytobands()
+        Y = self.plv["Y"]
+        pls = []
+
         # ------------------------- chromosome labels --------------------------#
 
         x = self.plv["plot_area_x0"]
-        self.plv["Y"] += self.plv["plot_title_font_size"]
 
         for chro in self.plv["plot_chros"]:
             c_l = self.cytolimits.get(str(chro), {})
             chr_w = c_l["size"] * self.plv["plot_b2pf"]
             chr_c = x + chr_w / 2
 
-            self.plv["pls"].append(
-                f'<text x="{chr_c}" y="{self.plv["Y"]}" style="text-anchor: middle; font-size: {self.plv["plot_font_size"]}px">{chro}</text>')
+            pls.append(
+                f'<text x="{chr_c}" y="{Y}" style="text-anchor: middle; font-size: {self.plv["plot_font_size"]}px">{chro}</text>')
 
             x += chr_w
             x += prg_w
 
-        self.plv["Y"] += prg_w
+        Y += prg_w
 
         # ---------------------------- chromosomes ----------------------------#
 
         x = self.plv["plot_area_x0"]
-        self.plv.update({"plot_chromosomes_y0": self.plv["Y"]})
 
         for chro in self.plv["plot_chros"]:
 
             c_l = self.cytolimits.get(str(chro), {})
             chr_w = c_l["size"] * self.plv["plot_b2pf"]
 
-            chr_cb_s = list(filter(lambda d: d["chro"] == chro, self.cytobands.copy()))
+            chr_cb_s = chro_cbs.get(chro, [])
 
             last = len(chr_cb_s) - 1
             this_n = 0
@@ -692,7 +757,7 @@ class ByconPlot:
                 cb_l = int(e_b) - int(s_b)
                 l_px = cb_l * self.plv["plot_b2pf"]
 
-                by = self.plv["Y"]
+                by = Y
                 bh = chr_h
 
                 if "cen" in c:
@@ -705,7 +770,7 @@ class ByconPlot:
                     by += 0.1 * chr_h
                     bh -= 0.2 * chr_h
 
-                self.plv["pls"].append(
+                pls.append(
                     f'<rect x="{round(x, 1)}" y="{round(by, 1)}" width="{round(l_px, 1)}" height="{round(bh, 1)}" style="fill: url(#{self.plv["plot_id"]}{c}); " />')
 
                 x += l_px
@@ -714,8 +779,37 @@ class ByconPlot:
 
         # -------------------------- / chromosomes -----------------------------#
 
-        self.plv["Y"] += chr_h
-        self.plv["Y"] += prg_w
+        return pls
+
+
+    # -------------------------------------------------------------------------#
+
+    def __chromosome_cytobands(self):
+        chro_cbs = {}
+        for cb in self.cytobands:
+            chro_cbs.setdefault(cb["chro"], []).append(cb)
+        return chro_cbs
+
+
+    # -------------------------------------------------------------------------#
+
+    def __plot_layer(self, l_k, layer_f):
+        """
+        Returns the SVG elements of a layer which only depends on the plot
+        geometry and genome assembly in `l_k` - from the process cache, the optional on-disk plot
+        cache or by calling `layer_f`.
+        """
+        l_k = json.dumps(l_k, default=str)
+        if (pls := PLOT_LAYERS.get(l_k)) is None:
+            PC = ByconPlotCache()
+            if (pls := PC.cachedLayer(l_k)) is None:
+                pls = layer_f()
+                PC.storeLayer(l_k, pls)
+            PLOT_LAYERS.update({l_k: pls})
+            while len(PLOT_LAYERS) > PLOT_LAYERS_MAX:
+                PLOT_LAYERS.popitem(last=False)
+        PLOT_LAYERS.move_to_end(l_k)
+        return pls
 
 
     # -------------------------------------------------------------------------#
@@ -723,7 +817,13 @@ class ByconPlot:
 
     def __plot_add_cytoband_svg_gradients(self):
         prdbug(f'{inspect.stack()[1][3]} from {inspect.stack()[2][3]}')
+        l_k = ["cytoband_gradients", self.plv.get("plot_id", ""), self.plv["cytoband_shades"]]
+        self.plv["pls"][0:0] = self.__plot_layer(l_k, self.__cytoband_gradients_layer)
 
+
+    # -------------------------------------------------------------------------#
+
+    def __cytoband_gradients_layer(self):
         c_defs = ""
         for cs_k, cs_c in self.plv["cytoband_shades"].items():
             p_id = self.plv.get("plot_id", "")
@@ -731,8 +831,7 @@ class ByconPlot:
             for k, v in cs_c.items():
                 c_defs += f'\n  <stop offset="{k}" stop-color="{v}" />'
             c_defs += f'\n</linearGradient>'
-
-        self.plv["pls"].insert(0, c_defs)
+        return [c_defs]
 
 
     # -------------------------------------------------------------------------#
@@ -759,11 +858,26 @@ class ByconPlot:
 
         if len(self.plv["results"]) > 0:
             self.__plot_order_samples()
+            col_c = {}
+            for vt, cd in self.plot_variant_types.items():
+                ck = cd.get("color_key", "___none___")
+                col_c.update({vt: self.plv.get(ck, "rgb(111,111,111)")})
+            # many samples are drawn into a bitmap instead of SVG elements
+            draw = None
+            if 0 < (r_m := self.plv.get("plot_samplestrip_raster_min", 0)) < len(self.plv["results"]):
+                image = Image.new(
+                    'RGBA',
+                    (self.plv["plot_area_width"], len(self.plv["results"]) * self.plv["plot_samplestrip_height"]),
+                    color=(0, 0, 0, 0)
+                )
+                draw = ImageDraw.Draw(image)
             for s in self.plv["results"]:
-                self.__plot_add_one_samplestrip(s)
+                self.__plot_add_one_samplestrip(s, col_c, draw)
                 if self.plv["plot_labelcol_font_size"] > 5 and len(self.plv["results"]) > 1:
                     g_lab = self.__samplestrip_create_label(s)
                     self.__strip_add_left_label(g_lab)
+            if draw:
+                self.__plot_add_image(image, self.plv["plot_first_area_y0"])
 
         self.plv["plot_last_area_ye"] = self.plv["Y"]
 
@@ -802,7 +916,6 @@ class ByconPlot:
     # -------------------------------------------------------------------------#
 
     def __strip_add_left_label(self, label):
-        prdbug(f'{inspect.stack()[1][3]} from {inspect.stack()[2][3]}')
         lab_x_e = self.plv["plot_area_x0"] - self.plv["plot_region_gap_width"] * 2
         self.plv["pls"].append(
             f'<text x="{lab_x_e}" y="{self.plv["Y"] - round(self.plv["plot_samplestrip_height"] * 0.2, 1)}" class="title-left">{label}</text>'
@@ -826,22 +939,47 @@ class ByconPlot:
     # -------------------------------------------------------------------------#
     # -------------------------------------------------------------------------#
 
-    def __plot_add_one_samplestrip(self, s):
-        x = self.plv["plot_area_x0"]
+    def __plot_add_one_samplestrip(self, s, col_c, draw=None):
+        """
+        Adds the segments of one sample as SVG rects or - if an image `draw`
+        object is provided - into the sample strips bitmap.
+        """
         h = self.plv["plot_samplestrip_height"]
-        pvts = self.plot_variant_types
 
-        col_c = {}
-        for vt, cd in pvts.items():
-            ck = cd.get("color_key", "___none___")
-            col_c.update({vt: self.plv.get(ck, "rgb(111,111,111)")})
+        if draw:
+            d_y = self.plv["Y"] - self.plv["plot_first_area_y0"]
+            for s_x, l, c in self.__samplestrip_segments(s, col_c):
+                x_0 = round(s_x - self.plv["plot_area_x0"])
+                draw.rectangle([x_0, d_y, max(x_0, round(s_x + l - self.plv["plot_area_x0"]) - 1), d_y + h - 1], fill=c)
+        else:
+            for s_x, l, c in self.__samplestrip_segments(s, col_c):
+                self.plv["pls"].append(
+                    f'<rect x="{round(s_x, 1)}" y="{self.plv["Y"]}" width="{l}" height="{h}" style="fill: {c} " />')
+
+        self.plv["Y"] += h
+
 
-        v_s = s.get("variants", [])
+    # -------------------------------------------------------------------------#
+
+    def __samplestrip_segments(self, s, col_c):
+        """
+        Returns the `(x, width, color)` segments of a sample strip. The variants
+        are grouped by chromosome once; consecutive segments of the same color
+        with gaps below `plot_samplestrip_merge_gap` (px) are merged into one.
+        """
+        b2pf = self.plv["plot_b2pf"]
+        m_g = self.plv.get("plot_samplestrip_merge_gap", 0)
+
+        chro_vs = {}
+        for p_v in s.get("variants", []):
+            chro_vs.setdefault(p_v["location"]["chromosome"], []).append(p_v)
+
+        segs = []
+        x = self.plv["plot_area_x0"]
         for chro in self.plv["plot_chros"]:
             c_l = self.cytolimits.get(str(chro), {})
-            chr_w = c_l["size"] * self.plv["plot_b2pf"]
-            c_v_s = list(filter(lambda d: d["location"]["chromosome"] == chro, v_s.copy()))
-            for p_v in c_v_s:
+            chr_w = c_l["size"] * b2pf
+            for p_v in chro_vs.get(chro, []):
                 if "variant_state" in p_v:
                     t = p_v["variant_state"].get("id", "___none___")
                 else:
@@ -854,18 +992,52 @@ class ByconPlot:
                 else:
                     s_v = int(p_v.get("start", 0))
                     e_v = int(p_v.get("end", s_v + 1))
-                l = round((e_v - s_v) * self.plv["plot_b2pf"], 1)
-                if l < 0.5:
-                    l = 0.5
-                s = round(x + s_v * self.plv["plot_b2pf"], 1)           
-
-                self.plv["pls"].append(
-                    f'<rect x="{s}" y="{self.plv["Y"]}" width="{l}" height="{h}" style="fill: {c} " />')
+                s_x = x + s_v * b2pf
+                e_x = x + e_v * b2pf
+                if m_g > 0 and len(segs) > 0:
+                    p_s = segs[-1]
+                    if p_s[2] == c and p_s[3] == chro and p_s[0] <= s_x <= p_s[1] + m_g:
+                        p_s[1] = max(p_s[1], e_x)
+                        continue
+                segs.append([s_x, e_x, c, chro])
 
             x += chr_w
             x += self.plv["plot_region_gap_width"]
 
-        self.plv["Y"] += h
+        for s_x, e_x, c, chro in segs:
+            l = round(e_x - s_x, 1)
+            if l < 0.5:
+                l = 0.5
+            yield s_x, l, c
+
+
+    # -------------------------------------------------------------------------#
+
+    def __plot_add_image(self, image, y):
+        """
+        Adds a bitmap image as embedded PNG over the plot area width.
+        """
+        in_mem_file = io.BytesIO()
+        image.save(in_mem_file, format = "PNG")
+        in_mem_file.seek(0)
+        img_bytes = in_mem_file.read()
+        base64_encoded_result_bytes = base64.b64encode(img_bytes)
+        base64_encoded_result_str = base64_encoded_result_bytes.decode('ascii')
+
+        self.plv["pls"].append("""
+<image
+  x="{}"
+  y="{}"
+  width="{}"
+  height="{}"
+  xlink:href="data:image/png;base64,{}"
+/>""".format(
+            self.plv["plot_area_x0"],
+            y,
+            image.size[0],
+            image.size[1],
+            base64_encoded_result_str
+        ))
 
 
     # -------------------------------------------------------------------------#
@@ -967,8 +1139,6 @@ class ByconPlot:
     # -------------------------------------------------------------------------#
 
     def __plot_add_one_histogram(self, f_set):
-        prdbug(f'{inspect.stack()[1][3]} from {inspect.stack()[2][3]}')
-
         self.__plot_add_one_histogram_canvas(f_set)
 
         i_f = f_set.get("interval_frequencies", [])
@@ -1039,8 +1209,6 @@ class ByconPlot:
     # -------------------------------------------------------------------------#
 
     def __plot_draw_one_heatstrip(self, f_set):
-        prdbug(f'{inspect.stack()[1][3]} from {inspect.stack()[2][3]}')
-
         i_f = f_set.get("interval_frequencies", [])
 
         x = 0
@@ -1141,7 +1309,6 @@ class ByconPlot:
     # -------------------------------------------------------------------------#
 
     def __mix_frequencies_2_rgb(self, gain_f, loss_f, max_f=80):
-        prdbug(f'{inspect.stack()[1][3]} from {inspect.stack()[2][3]}')
         rgb = [127, 127, 127]
         h_i = self.plv.get("plot_heat_intensity", 1)
         if h_i < 0.1:
@@ -1164,7 +1331,6 @@ class ByconPlot:
     # -------------------------------------------------------------------------#
 
     def __plot_add_one_histogram_canvas(self, f_set):
-        prdbug(f'{inspect.stack()[1][3]} from {inspect.stack()[2][3]}')
         x_a_0 = self.plv["plot_area_x0"]
         p_a_w = self.plv["plot_area_width"]
         p_a_h = self.plv["plot_area_height"]
@@ -1189,7 +1355,6 @@ class ByconPlot:
     def __histoplot_add_left_label(self, f_set):
         if self.plv["plot_labelcol_width"] < 10:
             return
-        prdbug(f'{inspect.stack()[1][3]} from {inspect.stack()[2][3]}')
         lab_x_e = self.plv["plot_margins"] + self.plv["plot_labelcol_width"]
         h_y_0 = self.plv["Y"] + self.plv["plot_area_height"] * 0.5
         self.plv["styles"].append(
@@ -1267,18 +1432,14 @@ class ByconPlot:
 
     def __plot_add_probesplot(self):
         """
-        Prototyping bitmap drawing for probe plots etc.
+        Bitmap drawing for probe plots etc.
         Invoked w/ &plotType=probesplot
-        https://pillow.readthedocs.io/en/stable/reference/ImageDraw.html
-        
-        #### Draw examples
 
-        * draw.point((50,50), (50,255,0))
-        * draw.line((0, 0) + image.size, fill=128)
-        * draw.line((0, image.size[1], image.size[0], 0), fill=(50,255,0))
-        * draw.rectangle([0, 0, 28, image.size[1]], fill="rgb(255,20,66)")
-        * draw.ellipse([(80,20),(130,50)], fill="#ccccff", outline="red")
-        
+        The pixel positions of all probes are computed on the NumPy columns of
+        the probe data and accumulated into a density image (each probe adding
+        `plot_probedot_opacity`); with `plot_probe_column_minmax` only the value
+        range of the probes in each pixel column is drawn.
+
         #### Input:
         ```
         probes = [
@@ -1290,6 +1451,7 @@ class ByconPlot:
             {...}
         ]
         ```
+        or a `ProbeData` object (e.g. from `ByconBundler.probefile_to_plotbundle`)
         """
 
         if not "probesplot" in self.plot_type:
@@ -1306,6 +1468,8 @@ class ByconPlot:
             return
 
         probes = probebundles[0].get("cn_probes", [])
+        if not isinstance(probes, ProbeData):
+            probes = ProbeData(probes)
         self.plv.update({
             "plot_axis_y_max": 4,
             "plot_y2pf": self.plv["plot_area_height"] * 0.5 / 4 * self.plv["plot_probe_y_factor"],
@@ -1314,74 +1478,53 @@ class ByconPlot:
             "plot_label_y_values": self.plv["plot_probe_label_y_values"]
         })
 
-        x = 0
-        h_y_0 = self.plv["plot_area_height"] * 0.5
-        p_y_f = self.plv["plot_y2pf"]
-        p_half = self.plv["plot_probedot_size"] * 0.5
+        w = self.plv["plot_area_width"]
+        h = self.plv["plot_area_height"]
+        h_y_0 = h * 0.5
         p_dense = self.plv["plot_probedot_opacity"]
-
-        if len(probes) > 500000:
-            p_half *= 0.5
+        if probes.probeCount() > 500000:
             p_dense = p_dense * 0.7
         p_dense = int(round(p_dense, 0))
 
-        image = Image.new(
-                    'RGBA',
-                    (self.plv["plot_area_width"], self.plv["plot_area_height"]),
-                    color=self.plv["plot_area_color"]
-                )
-        draw = ImageDraw.Draw(image)
+        # --------------------------- probe data ------------------------------#
 
+        # x offsets of the plotted chromosomes by chromosome code; probes on
+        # other chromosomes are dropped
+        c_x = np.full(len(probes.chro_names), np.nan)
+        x = 0
         for chro in self.plv["plot_chros"]:
-
-            c_p = list(filter(lambda d: d["reference_name"] == chro, probes.copy()))
+            if str(chro) in probes.chro_names:
+                c_x[probes.chro_names.index(str(chro))] = x
             c_l = self.cytolimits.get(str(chro), {})
-            chr_w = c_l["size"] * self.plv["plot_b2pf"]
-
-            for i_v in c_p:
-                s = x + i_v.get("start", 0) * self.plv["plot_b2pf"]
-                v = i_v.get("value", 0)
-                h = v * p_y_f 
-                if h > h_y_0:
-                    h = h_y_0
-                if h < -h_y_0:
-                    h = -h_y_0
-                h_p = h_y_0 - h
-
-                # draw.ellipse(
-                #     [
-                #         (s-p_half, h_p - p_half),
-                #         (s+p_half, h_p + p_half)
-                #     ],
-                #     fill=(0,0,63,p_dense)
-                # )
-                draw.point((round(s, 2),round(h_p, 2)), (0,0,63,p_dense))
-
-            x += chr_w + self.plv["plot_region_gap_width"]
-
-        # ------------------------ / histogram data ---------------------------#
-
-        in_mem_file = io.BytesIO()
-        image.save(in_mem_file, format = "PNG")
-        in_mem_file.seek(0)
-        img_bytes = in_mem_file.read()
-        base64_encoded_result_bytes = base64.b64encode(img_bytes)
-        base64_encoded_result_str = base64_encoded_result_bytes.decode('ascii')
-
-        self.plv["pls"].append("""
-<image
-  x="{}"
-  y="{}"
-  width="{}"
-  height="{}"
-  xlink:href="data:image/png;base64,{}"
-/>""".format(
-            self.plv["plot_area_x0"],
-            self.plv["Y"],
-            self.plv["plot_area_width"],
-            self.plv["plot_area_height"],
-            base64_encoded_result_str
-        ))
+            x += c_l["size"] * self.plv["plot_b2pf"] + self.plv["plot_region_gap_width"]
+
+        p_x = c_x[probes.chro_codes] + probes.positions * self.plv["plot_b2pf"]
+        p_y = h_y_0 - np.clip(probes.values * self.plv["plot_y2pf"], -h_y_0, h_y_0)
+        shown = ~np.isnan(p_x)
+        p_x = np.clip(np.round(p_x[shown], 2), 0, w - 1).astype(np.int64)
+        p_y = np.clip(np.round(p_y[shown], 2), 0, h - 1).astype(np.int64)
+
+        # probe density per pixel; each probe adds `plot_probedot_opacity`
+        p_c = np.bincount(p_y * w + p_x, minlength=w * h).reshape(h, w)
+        if test_truthy(self.plv.get("plot_probe_column_minmax", False)) and len(p_x) > 0:
+            # downsampling to the value range per pixel column
+            y_min = np.full(w, h)
+            y_max = np.full(w, -1)
+            np.minimum.at(y_min, p_x, p_y)
+            np.maximum.at(y_max, p_x, p_y)
+            rows = np.arange(h)[:, None]
+            p_c = ((rows >= y_min[None, :]) & (rows <= y_max[None, :])).astype(np.int64)
+
+        p_a = 1 - (1 - p_dense / 255) ** p_c
+
+        # ------------------------- / probe data ------------------------------#
+
+        pixels = np.empty((h, w, 4), dtype=np.uint8)
+        pixels[:, :] = ImageColor.getcolor(self.plv["plot_area_color"], "RGBA")
+        p_i = p_c > 0
+        pixels[p_i] = (0, 0, 63, 0)
+        pixels[p_i, 3] = np.round(p_a[p_i] * 255).astype(np.uint8)
+        self.__plot_add_image(Image.fromarray(pixels, "RGBA"), self.plv["Y"])
 
         self.__plot_area_add_grid()
         self.plv["Y"] += self.plv["plot_area_height"]
@@ -1,28 +1,162 @@
+import hashlib, json
+import numpy as np
 import scipy.cluster
+from datetime import datetime
+from pymongo.errors import PyMongoError
+
+from bycon import get_mongo_client, prdbug
+
+################################################################################
+
+"""
+The clustering of the collation frequency sets (e.g. for histogram or heatstrip
+plots of all groups of a collation type) can use precomputed linkages. These are
+stored in the `frequencymaps_linkages` collection of the dataset database next
+to the `frequencymaps`. The cache key is built from the set of the groups' ids
+(with their frequencymap `updated` stamps) and the cluster metric, i.e. linkages
+of outdated frequencymaps are never used.
+
+Linkages are only stored by the `frequencymapsCreator` housekeeper, for all
+groups per collation type (`frequencymaps_linkages_refresh`); plot requests
+only read them (for sets of at least `LINKAGE_CACHE_MIN_GROUPS` frequency sets,
+smaller sets are always clustered directly) and cluster other group subsets
+(e.g. filtered collation plots) w/o storing their linkages.
+"""
+
+LINKAGES_COLL = "frequencymaps_linkages"
+LINKAGE_CACHE_MIN_GROUPS = 20
 
 ################################################################################
 
 def cluster_frequencies(plv):
     m = plv.get("plot_cluster_metric", "complete")
-    matrix = __matrix_from_interval_frequencies(plv)
-    linkage = scipy.cluster.hierarchy.linkage(matrix, method=m)
+    linkage, order = frequencies_linkage(plv["results"], m)
     dendrogram = scipy.cluster.hierarchy.dendrogram(linkage, no_plot=True, orientation="right")
-    
+    # the linkage rows may be in the (sorted) order of the cached group set
+    dendrogram.update({
+        "leaves": [order[i] for i in dendrogram["leaves"]],
+        "ivl": [str(order[i]) for i in dendrogram["leaves"]]
+    })
+
     return dendrogram
 
 
 ################################################################################
 
-def __matrix_from_interval_frequencies(plv):
-    matrix = []
-    for f_set in plv["results"]:
-        i_f = f_set.get("interval_frequencies", [])
-        if_line = []
-        for i_f in f_set.get("interval_frequencies", []):
-            if_line.append( i_f.get("gain_frequency", 0) )
-        for i_f in f_set.get("interval_frequencies", []):
-            if_line.append( i_f.get("loss_frequency", 0) )
-        matrix.append(if_line)
+def frequencies_linkage(f_sets, metric="complete", store=False):
+    """
+    Returns the linkage matrix for the frequency sets and the indexes of the
+    sets in the order of the linkage rows; a stored linkage is used for sets of
+    collation frequencymaps (i.e. with `group_id` and `updated`). New linkages
+    are only stored with `store=True`.
+    """
+    order = list(range(len(f_sets)))
+    if len(f_sets) < LINKAGE_CACHE_MIN_GROUPS or not (l_k := __frequencies_linkage_key(f_sets, metric)):
+        return __frequencies_linkage(f_sets, metric), order
+
+    order.sort(key=lambda i: __group_key(f_sets[i]))
+    ds_id = __group_key(f_sets[order[0]])[0]
+    l_coll = get_mongo_client()[ds_id][LINKAGES_COLL]
+    try:
+        if not store and (l_s := l_coll.find_one({"id": l_k}, {"_id": 0, "linkage": 1})):
+            prdbug(f'... using stored linkage {l_k} for {len(f_sets)} frequency sets')
+            return np.array(l_s["linkage"], dtype=np.float64), order
+    except PyMongoError as e:
+        prdbug(f'... stored linkage could not be read: {e}')
+
+    linkage = __frequencies_linkage([f_sets[i] for i in order], metric)
+    if not store:
+        return linkage, order
+    try:
+        l_coll.replace_one({"id": l_k}, {
+            "id": l_k,
+            "metric": metric,
+            "group_ids": [__group_key(f_sets[i])[1] for i in order],
+            "linkage": linkage.tolist(),
+            "updated": datetime.now().isoformat()
+        }, upsert=True)
+    except PyMongoError as e:
+        prdbug(f'... linkage could not be stored: {e}')
+
+    return linkage, order
+
+
+################################################################################
+
+def frequencymaps_linkages_refresh(ds_id, metric="complete", min_number=0):
+    """
+    Replaces the stored linkages of the dataset with new ones for the
+    frequencymaps of each collation type (with at least `min_number` CNV
+    analyses). Returns the number of stored linkages.
+    """
+    ds_db = get_mongo_client()[ds_id]
+    f_coll = ds_db["frequencymaps"]
+    ds_db[LINKAGES_COLL].delete_many({})
+    ds_db[LINKAGES_COLL].create_index("id")
+
+    l_no = 0
+    for c_t in f_coll.distinct("collation_type"):
+        f_sets = []
+        for f_m in f_coll.find({"collation_type": c_t}, {"_id": 0, "id": 1, "updated": 1, "frequencymap": 1}):
+            fmap = f_m.get("frequencymap", {})
+            if fmap.get("cnv_analyses", 0) < min_number:
+                continue
+            f_sets.append({
+                "dataset_id": ds_id,
+                "group_id": f_m.get("id", ""),
+                "updated": f_m.get("updated"),
+                "interval_frequencies": fmap.get("intervals", [])
+            })
+        if len(f_sets) < LINKAGE_CACHE_MIN_GROUPS:
+            continue
+        frequencies_linkage(f_sets, metric, store=True)
+        l_no += 1
+
+    return l_no
+
+
+################################################################################
+
+def __frequencies_linkage(f_sets, metric):
+    matrix = __matrix_from_interval_frequencies(f_sets)
+    return scipy.cluster.hierarchy.linkage(matrix, method=metric)
+
+
+################################################################################
+
+def __frequencies_linkage_key(f_sets, metric):
+    g_ks = [__group_key(f_set) for f_set in f_sets]
+    if not all(all(g_k) for g_k in g_ks):
+        return None
+    if len(set(g_ks)) < len(g_ks):
+        return None
+    k_s = json.dumps({"metric": metric, "groups": sorted(g_ks)}, separators=(",", ":"))
+    return hashlib.sha256(k_s.encode("utf-8")).hexdigest()
+
+
+################################################################################
+
+def __group_key(f_set):
+    return (
+        str(f_set.get("dataset_id", "")),
+        str(f_set.get("group_id", "")),
+        str(f_set.get("updated") or "")
+    )
+
+
+################################################################################
+
+def __matrix_from_interval_frequencies(f_sets):
+    """
+    Gain frequencies followed by the loss frequencies of each set as NumPy
+    matrix row.
+    """
+    i_c = max([len(f_set.get("interval_frequencies", [])) for f_set in f_sets] + [0])
+    matrix = np.zeros((len(f_sets), 2 * i_c), dtype=np.float64)
+    for i, f_set in enumerate(f_sets):
+        i_fs = f_set.get("interval_frequencies", [])
+        matrix[i, :len(i_fs)] = [i_f.get("gain_frequency", 0) for i_f in i_fs]
+        matrix[i, i_c:i_c + len(i_fs)] = [i_f.get("loss_frequency", 0) for i_f in i_fs]
 
     return matrix
 
@@ -31,27 +165,35 @@ def __matrix_from_interval_frequencies(plv):
 
 def cluster_samples(plv):
     m = plv.get("plot_cluster_metric", "complete")
-    matrix = []
-    for s in plv["results"]:
-        s_line = []
-        if "intcoverage" in plv.get("plot_samples_cluster_type", ""):
+    matrix = __matrix_from_samples(plv["results"], plv.get("plot_samples_cluster_type", ""))
+    linkage = scipy.cluster.hierarchy.linkage(matrix, method=m)
+    dendrogram = scipy.cluster.hierarchy.dendrogram(linkage, no_plot=True, orientation="right")
+    return dendrogram
+
+
+################################################################################
+
+def __matrix_from_samples(samples, cluster_type):
+    """
+    Either the interval coverage (`dup` then `del` statusmaps) or the gain and
+    loss fractions per chromosome (arm) of each sample as NumPy matrix row.
+    """
+    s_lines = []
+    for s in samples:
+        if "intcoverage" in cluster_type:
             c_m = s.get("cnv_statusmaps", {})
-            dup_l = c_m.get("dup", [])
-            del_l = c_m.get("del", [])
-            for i_dup in dup_l:
-                s_line.append(i_dup)
-            for i_del in del_l:
-                s_line.append(i_del)
+            s_lines.append((c_m.get("dup", []), c_m.get("del", [])))
         else:
             c_s = s.get("cnv_chro_stats", {})
-            for c_a, c_s_v in c_s.items():
-                s_line.append(c_s_v.get("dupfraction", 0))
-            for c_a, c_s_v in c_s.items():
-                s_line.append(c_s_v.get("delfraction", 0))
-        matrix.append(s_line)
+            s_lines.append((
+                [c_s_v.get("dupfraction", 0) for c_s_v in c_s.values()],
+                [c_s_v.get("delfraction", 0) for c_s_v in c_s.values()]
+            ))
 
-    linkage = scipy.cluster.hierarchy.linkage(matrix, method=m)
-    reorder = scipy.cluster.hierarchy.leaves_list(linkage)
-    dendrogram = scipy.cluster.hierarchy.dendrogram(linkage, no_plot=True, orientation="right")
-    return dendrogram
-    
+    v_c = max([len(dup_l) for dup_l, del_l in s_lines] + [len(del_l) for dup_l, del_l in s_lines] + [0])
+    matrix = np.zeros((len(s_lines), 2 * v_c), dtype=np.float64)
+    for i, (dup_l, del_l) in enumerate(s_lines):
+        matrix[i, :len(dup_l)] = dup_l
+        matrix[i, v_c:v_c + len(del_l)] = del_l
+
+    return matrix
@@ -18,6 +18,7 @@ def variants_from_revish(bs_id, cs_id, technique, iscn):
     # the id here is a placeholder since we now use a stringified version of the
     # MongoDB ObjectId w/ `pgxvar-` prepend
     BID = ByconID()
+    BV = ByconVariant()
     for v in v_s:
         v.update({
             "id": BID.makeID("pgxvar"),
@@ -25,7 +26,7 @@ def variants_from_revish(bs_id, cs_id, technique, iscn):
             "analysis_id": cs_id,
             "updated": datetime.datetime.now().isoformat()
         })
-        variants.append(ByconVariant().byconVariant(v))
+        variants.append(BV.byconVariant(v))
 
     return variants, v_e
 
@@ -1,12 +1,12 @@
 import sys, re
 
 from os import path, environ
-from pymongo import MongoClient
 
 from bycon import (
     BYC,
     BYC_PARS,
-    DB_MONGOHOST,
+    get_mongo_client,
+    mongo_records_by_values,
     ByconVariant,
     prdbug,
     return_paginated_list,
@@ -28,7 +28,7 @@ def stream_pgx_meta_header(ds_id, ds_results):
     ds_d = BYC.get("dataset_definitions", {})
     ds_ds_d = ds_d.get(ds_id, {})
 
-    mongo_client = MongoClient(host=DB_MONGOHOST)
+    mongo_client = get_mongo_client()
     bs_coll = mongo_client[ds_id]["biosamples"]
 
     open_text_streaming()
@@ -41,10 +41,7 @@ def stream_pgx_meta_header(ds_id, ds_results):
             
     print_filters_meta_line()
 
-    for bs_id in ds_results["biosamples.id"][ "target_values" ]:
-        bs = bs_coll.find_one( { "id": bs_id } )
-        if not bs:
-            continue
+    for bs in mongo_records_by_values(bs_coll, ds_results["biosamples.id"][ "target_values" ]):
         h_line = pgxseg_biosample_meta_line(bs, "histological_diagnosis_id")
         print(h_line)
 
@@ -110,7 +107,7 @@ def print_filters_meta_line():
 def export_pgxseg_download(datasets_results, ds_id):
     skip = BYC_PARS.get("skip", 0)
     limit = BYC_PARS.get("limit", 0)
-    data_client = MongoClient(host=DB_MONGOHOST)
+    data_client = get_mongo_client()
     v_coll = data_client[ ds_id ][ "variants" ]
     ds_results = datasets_results.get(ds_id, {})
     if not "variants.id" in ds_results:
@@ -123,10 +120,7 @@ def export_pgxseg_download(datasets_results, ds_id):
     stream_pgx_meta_header(ds_id, ds_results)
     print_pgxseg_header_line()
 
-    v_instances = []
-    for v_id in v_ids:
-        v_s = v_coll.find_one( { "id": v_id }, { "_id": 0 } )
-        v_instances.append(ByconVariant().byconVariant(v_s))
+    v_instances = list(ByconVariant().byconVariants(mongo_records_by_values(v_coll, v_ids, fields={ "_id": 0 })))
 
     v_instances = list(sorted(v_instances, key=lambda x: (f'{x["location"]["chromosome"].replace("X", "XX").replace("Y", "YY").zfill(2)}', x["location"]['start'])))
     for v in v_instances:
@@ -176,7 +170,7 @@ def write_variants_bedfile(datasets_results, ds_id):
         "plot_SNV_color": (255, 51, 204)
     }
 
-    data_client = MongoClient(host=DB_MONGOHOST)
+    data_client = get_mongo_client()
     v_coll = data_client[ ds_id ][ "variants" ]
     ds_results = datasets_results.get(ds_id, {})
 
@@ -196,9 +190,7 @@ def write_variants_bedfile(datasets_results, ds_id):
     bed_file_name = f'{accessid}.bed'
     bed_file = path.join( tmp_path, bed_file_name )
 
-    for v_id in v_ids:
-        v = v_coll.find_one( { "id": v_id }, { "_id": 0 } )
-        pv = ByconVariant().byconVariant(v)
+    for pv in ByconVariant().byconVariants(mongo_records_by_values(v_coll, v_ids, fields={ "_id": 0 })):
         if (pvt := pv.get("variant_dupdel", "___none___")) not in vs.keys():
             continue
         pv.update({"variant_length": int(pv["location"].get("end", 1)) - int(pv["location"].get("start", 0))})
@@ -283,7 +275,7 @@ def export_callsets_matrix(datasets_results, ds_id):
 
     if not (cs_r := datasets_results[ds_id].get("analyses.id")):
         return
-    mongo_client = MongoClient(host=DB_MONGOHOST)
+    mongo_client = get_mongo_client()
     bs_coll = mongo_client[ ds_id ][ "biosamples" ]
     cs_coll = mongo_client[ ds_id ][ "analyses" ]
 
@@ -441,7 +433,7 @@ def export_vcf_download(datasets_results, ds_id):
         "INFO": ""
     }
 
-    data_client = MongoClient(host=DB_MONGOHOST)
+    data_client = get_mongo_client()
     v_coll = data_client[ ds_id ][ "variants" ]
     ds_results = datasets_results.get(ds_id, {})
     if not "variants.id" in ds_results:
@@ -451,10 +443,7 @@ def export_vcf_download(datasets_results, ds_id):
     if test_truthy( BYC_PARS.get("paginate_results", True) ):
         v_ids = return_paginated_list(v_ids, skip, limit)
 
-    v_instances = []
-    for v_id in v_ids:
-        v = v_coll.find_one( { "id": v_id }, { "_id": 0 } )
-        v_instances.append(ByconVariant().byconVariant(v))
+    v_instances = list(ByconVariant().byconVariants(mongo_records_by_values(v_coll, v_ids, fields={ "_id": 0 })))
 
 
     v_instances = list(sorted(v_instances, key=lambda x: (f'{x["location"]["chromosome"].replace("X", "XX").replace("Y", "YY").zfill(2)}', x["location"]['start'])))
@@ -2,7 +2,6 @@ import csv, datetime, re, requests
 
 from pathlib import Path
 from os import environ, path
-from pymongo import MongoClient
 from copy import deepcopy
 from random import sample as random_samples
 
@@ -1,11 +1,13 @@
-import datetime, sys
+import datetime, sys, time
+from bson import ObjectId
+from itertools import chain
 from os import path
 from progress.bar import Bar
-from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
 from random import sample as random_samples
 
 # bycon
-from bycon import BYC, BYC_PARS, ByconVariant, DB_MONGOHOST, prjsonnice, prdbug
+from bycon import BYC, BYC_PARS, ByconVariant, database_names, dataset_data_version_update, get_mongo_client, mongo_existing_values, prjsonnice, prdbug
 
 services_lib_path = path.join( path.dirname( path.abspath(__file__) ) )
 sys.path.append( services_lib_path )
@@ -24,6 +26,9 @@ class ByconautImporter():
         self.entity = None
         self.dataset_id = BYC["BYC_DATASET_IDS"][0]
         self.limit = BYC_PARS.get("limit", 0)
+        self.batch_size = max(1, BYC_PARS.get("batch_size", 1000))
+        self.use_transactions = BYC_PARS.get("transactions", False)
+        self.transaction_size = max(1, BYC_PARS.get("transaction_size", 10000))
         self.input_file = None
         self.import_collname = None
         self.import_entity = None
@@ -32,14 +37,18 @@ class ByconautImporter():
         self.input_file = None
         self.output_dir = None
         self.upstream = ["individuals", "biosamples", "analyses"]
+        # upstream collection => {id: exists} for the ids checked in this import
+        self.upstream_checked = {}
         self.downstream = []
         self.downstream_only = False
-        self.mongo_client = MongoClient(host=DB_MONGOHOST)
+        self.mongo_client = get_mongo_client()
         self.ind_coll = self.mongo_client[ self.dataset_id ]["individuals"]
         self.bios_coll = self.mongo_client[ self.dataset_id ]["biosamples"]
         self.ana_coll = self.mongo_client[ self.dataset_id ]["analyses"]
         self.target_db = "___none___"
         self.allow_duplicates = False
+        self.stream_data = False
+        self.data_in = None
 
         self.__initialize_importer()
 
@@ -167,32 +176,24 @@ class ByconautImporter():
         # self.__prepare_variants()
 
         bb = ByconBundler()
-        data = bb.read_pgx_file(self.input_file)
-        variants = data.data
-        v_i_c = len(variants)
-        print(f'=> The file contains {v_i_c} variants')
-
-        bar = Bar("Checking ", max = v_i_c, suffix='%(percent)d%%'+f' of {str(v_i_c)} variants' )
-
+        v_i_c = 0
         a_id_s = {}
-        for v in variants:
-            bar.next()
-            a_id = v.get("analysis_id", "___none___")
-            a_id_s.update({a_id: "{}\t{}\t{}\t{}".format(
-                a_id,
-                v.get("biosample_id"),
-                v.get("individual_id"),
-                v.get("sample_id", "")
-            )})
-        bar.finish()
+        for variants in bb.pgx_file_chunks(self.input_file, self.batch_size):
+            for v in variants:
+                v_i_c += 1
+                a_id = v.get("analysis_id", "___none___")
+                a_id_s.update({a_id: "{}\t{}\t{}\t{}".format(
+                    a_id,
+                    v.get("biosample_id"),
+                    v.get("individual_id"),
+                    v.get("sample_id", "")
+                )})
 
+        print(f'=> The file contains {v_i_c} variants')
         print(f'=> The file contains {len(a_id_s)} analysis_id values')
 
-        missing_analyses = []
-        for a_id, ids in a_id_s.items():
-            ana_id = v.get("analysis_id", "___none___")
-            if not self.ana_coll.find_one({"id": ana_id}):
-                missing_analyses.append(ids)
+        e_ids = mongo_existing_values(self.ana_coll, a_id_s.keys())
+        missing_analyses = [ids for a_id, ids in a_id_s.items() if a_id not in e_ids]
 
         print(f'=> {len(missing_analyses)} analysis_id values were missing')
 
@@ -245,7 +246,7 @@ class ByconautImporter():
         self.target_db = BYC_PARS.get("output", f'tmpdb_{datetime.datetime.now().isoformat()}')
         self.downstream = ["biosamples", "analyses", "variants"]
 
-        if self.target_db in BYC["DATABASE_NAMES"]:
+        if self.target_db in database_names():
             print(f'¡¡¡ You cannot export using an existing database name !!!')
             exit()
 
@@ -326,6 +327,8 @@ class ByconautImporter():
         self.import_id = "analysis_id"
         self.upstream = ["individuals", "biosamples", "analyses"]
         self.allow_duplicates = True
+        # variant files are streamed in chunks during the import
+        self.stream_data = True
         self.__check_dataset()
         self.__read_data_file()
 
@@ -335,7 +338,7 @@ class ByconautImporter():
 
     def __check_dataset(self):
         # done after assignment of import_collname
-        if self.dataset_id not in BYC.get("DATABASE_NAMES",[]):
+        if self.dataset_id not in database_names():
             print(f'Dataset {self.dataset_id} does not exist. You have to create it first.')
             if "individuals" in str(self.import_collname):
                 proceed = input(f'Please type the name of the dataset and hit Enter: ')
@@ -351,26 +354,44 @@ class ByconautImporter():
     def __read_data_file(self):
         if not self.use_file:
             return
-        iid = self.import_id
 
-        bb = ByconBundler()
-        self.data_in = bb.read_pgx_file(self.input_file)
-        print(f'=> The input file contains {len(self.data_in.data)} items')
+        self.data_in = ByconBundler()
+        self.upstream_checked = {}
+        if self.stream_data:
+            return
 
         self.import_docs = []
-        self.import_ids = []
-        l_no = 0
-        for new_doc in self.data_in.data:
-            l_no += 1
-            if not (import_id_v := new_doc.get(iid)):
-                self.log.append(f'¡¡¡ no {iid} value in entry {l_no} => skipping !!!')
-                continue
-            if import_id_v in self.import_ids and not self.allow_duplicates:
-                self.log.append(f'¡¡¡ duplicated {iid} value in entry {l_no} => skipping !!!')
-                continue
+        for docs in self.__import_doc_chunks():
+            self.import_docs.extend(docs)
+        print(f'=> The input file contains {self.import_lines_count} items')
+
+
+    #--------------------------------------------------------------------------#
+    #--------------------------------------------------------------------------#
 
-            self.import_ids.append(import_id_v)          
-            self.import_docs.append(dict(new_doc))
+    def __import_doc_chunks(self):
+        """
+        Generator for the checked import documents from the input file, in
+        chunks of up to `batch_size` (the file is read as stream).
+        """
+        iid = self.import_id
+        import_ids = set()
+        self.import_lines_count = 0
+        for rows in self.data_in.pgx_file_chunks(self.input_file, self.batch_size):
+            docs = []
+            for new_doc in rows:
+                self.import_lines_count += 1
+                l_no = self.import_lines_count
+                if not (import_id_v := new_doc.get(iid)):
+                    self.log.append(f'¡¡¡ no {iid} value in entry {l_no} => skipping !!!')
+                    continue
+                if not self.allow_duplicates:
+                    if import_id_v in import_ids:
+                        self.log.append(f'¡¡¡ duplicated {iid} value in entry {l_no} => skipping !!!')
+                        continue
+                    import_ids.add(import_id_v)
+                docs.append(new_doc)
+            yield docs
 
 
     #--------------------------------------------------------------------------#
@@ -394,10 +415,9 @@ class ByconautImporter():
         tds_id = self.target_db
         icn = self.import_collname
         dcs = self.downstream
-        ucs = self.upstream
         iid = self.import_id
 
-        if tds_id not in BYC["DATABASE_NAMES"]:
+        if tds_id not in database_names():
             print(f'¡¡¡ No existing target database defined using `--output` !!!')
             exit()
 
@@ -406,61 +426,41 @@ class ByconautImporter():
 
         #----------------------- Checking database content --------------------#
 
+        m_ids = list(dict.fromkeys(d[iid] for d in self.import_docs))
+        e_ids = mongo_existing_values(source_coll, m_ids, chunk_size=self.batch_size)
         source_ids = []
-        for test_doc in self.import_docs:
-            s_id_v = test_doc[iid]
-            if not source_coll.find_one({"id": s_id_v}):
+        for s_id_v in m_ids:
+            if s_id_v not in e_ids:
                 self.log.append(f'id {s_id_v} does not exist in {ds_id}.{icn} => maybe deleted already ...')
             else:
                 source_ids.append(s_id_v)
 
         self.__parse_log()
 
+        # records already existing in the target are not moved again (but their
+        # downstream records are replaced)
+        t_ids = mongo_existing_values(target_coll, source_ids, chunk_size=self.batch_size)
+
         #---------------------------- Mover Stage -----------------------------#
 
-        # the `target_coll.insert_one({"id": "___init___"})` serves to initialize
-        # the target collection and to avoid the need for a separate check for
-        # the existence of the target collection
-        mov_nos = {icn: 0}
-        if not BYC["TEST_MODE"]:
-            bar = Bar("Moving ", max = len(source_ids), suffix='%(percent)d%%'+f' of {str(len(source_ids))} {icn}' )
-            target_coll.insert_one({"id": "___init___"})
-        for m_id in source_ids:
-            d_c = source_coll.count_documents({"id": m_id})
-            t_c = target_coll.count_documents({"id": m_id})
-            if d_c > 0 and t_c < 1:
-                mov_nos[icn] += d_c
-                if not BYC["TEST_MODE"]:
-                    s = source_coll.find_one({"id": m_id})
-                    t = target_coll.insert_one(s)
-            if not BYC["TEST_MODE"]:
-                bar.next()
-        if not BYC["TEST_MODE"]:
-            target_coll.delete_one({"id": "___init___"})
+        mov_nos = {c: 0 for c in [icn] + dcs}
+        bar = Bar("Moving ", max = len(source_ids), suffix='%(percent)d%%'+f' of {str(len(source_ids))} {icn}' ) if not BYC["TEST_MODE"] else False
+        for b_i in range(0, len(source_ids), self.batch_size):
+            b_ids = source_ids[b_i:b_i + self.batch_size]
+            for t_b_ids, oversized in self.__transaction_id_batches(ds_id, b_ids):
+                if oversized:
+                    b_nos = self.__move_oversized_record(t_b_ids[0], t_ids)
+                else:
+                    b_nos = self.__in_transaction(self.__move_records_batch, t_b_ids, t_ids)
+                for k, v in b_nos.items():
+                    mov_nos[k] += v
+            if bar:
+                bar.next(len(b_ids))
+        if bar:
             bar.finish()
 
-        for c in dcs:
-            source_coll = self.mongo_client[ds_id][c]
-            target_coll = self.mongo_client[tds_id][c]
-            if not BYC["TEST_MODE"]:
-                target_coll.insert_one({"id": "___init___"})
-                bar = Bar(f'Moving {c} ', max = len(source_ids), suffix='%(percent)d%%'+f' of {str(len(source_ids))} {icn}' )
-            mov_nos.update({c: 0})
-            for m_id in source_ids:
-                d_c = source_coll.count_documents({iid: m_id})
-                if d_c > 0:
-                    mov_nos[c] += d_c
-                    if not BYC["TEST_MODE"]:
-                        target_coll.delete_many({iid: m_id})
-                        for s in source_coll.find({iid: m_id}):
-                            t = target_coll.insert_one(s)
-                if not BYC["TEST_MODE"]:
-                    bar.next()
-            if not BYC["TEST_MODE"]:
-                target_coll.delete_one({"id": "___init___"})
-                bar.finish()
-
         if not BYC["TEST_MODE"]:
+            dataset_data_version_update(tds_id)
             for k, v in mov_nos.items():
                 print(f'==> moved {v} {k} from {ds_id} to {tds_id}')
         else:
@@ -468,63 +468,235 @@ class ByconautImporter():
                 print(f'==> would have moved {v} {k} from {ds_id} to {tds_id}')
 
 
+    #--------------------------------------------------------------------------#
+
+    def __move_records_batch(self, session, b_ids, t_ids, colls=None):
+        """
+        Copies the records of a batch of ids which do not exist in the target
+        and replaces the downstream records of all of them, with `$in` queries
+        and unordered `insert_many` calls; optionally only for the given
+        collections.
+        """
+        ds_id = self.dataset_id
+        tds_id = self.target_db
+        icn = self.import_collname
+        iid = self.import_id
+
+        b_nos = {}
+        m_q = {"id": {"$in": [m_id for m_id in b_ids if m_id not in t_ids]}}
+        for c, q in [(icn, m_q)] + [(c, {iid: {"$in": b_ids}}) for c in self.downstream]:
+            if colls is not None and c not in colls:
+                continue
+            source_coll = self.mongo_client[ds_id][c]
+            target_coll = self.mongo_client[tds_id][c]
+            if BYC["TEST_MODE"]:
+                b_nos.update({c: source_coll.count_documents(q, session=session)})
+                continue
+            if c != icn:
+                # only target records of ids with source records are replaced
+                s_ids = source_coll.distinct(iid, q, session=session)
+                target_coll.delete_many({iid: {"$in": s_ids}}, session=session)
+            b_nos.update({c: 0})
+            batch = []
+            for s in source_coll.find(q, session=session):
+                batch.append(s)
+                if len(batch) >= self.batch_size:
+                    b_nos[c] += self.__insert_batch(target_coll, batch, session)
+                    batch = []
+            if len(batch) > 0:
+                b_nos[c] += self.__insert_batch(target_coll, batch, session)
+
+        return b_nos
+
+
+    #--------------------------------------------------------------------------#
+
+    def __move_oversized_record(self, m_id, t_ids):
+        """
+        Moves a record whose downstream records exceed the transaction size:
+        the record itself is moved in one transaction and the downstream
+        records per collection in transactions of up to `transaction_size`
+        documents (after the removal of the existing target records in the same
+        way). The move of such a record is therefore not atomic, but a repeated
+        run replaces its downstream records.
+        """
+        ds_id = self.dataset_id
+        tds_id = self.target_db
+        iid = self.import_id
+
+        b_nos = self.__in_transaction(self.__move_records_batch, [m_id], t_ids, [self.import_collname])
+        for c in self.downstream:
+            source_coll = self.mongo_client[ds_id][c]
+            target_coll = self.mongo_client[tds_id][c]
+            s_oids = [d["_id"] for d in source_coll.find({iid: m_id}, {"_id": 1})]
+            b_nos.update({c: 0})
+            if len(s_oids) < 1:
+                continue
+            t_oids = [d["_id"] for d in target_coll.find({iid: m_id}, {"_id": 1})]
+            for o_i in range(0, len(t_oids), self.transaction_size):
+                o_ids = t_oids[o_i:o_i + self.transaction_size]
+                self.__in_transaction(lambda session, q: target_coll.delete_many(q, session=session), {"_id": {"$in": o_ids}})
+            for o_i in range(0, len(s_oids), self.transaction_size):
+                o_ids = s_oids[o_i:o_i + self.transaction_size]
+                b_nos[c] += self.__in_transaction(
+                    lambda session, q: self.__insert_batch(target_coll, list(source_coll.find(q, session=session)), session),
+                    {"_id": {"$in": o_ids}}
+                )
+        return b_nos
+
+
     #--------------------------------------------------------------------------#
     #--------------------------------------------------------------------------#
 
     def __delete_database_records(self):
         ds_id = self.dataset_id
         icn = self.import_collname
-        dcs = self.downstream
         iid = self.import_id
-        fn = self.data_in.fieldnames
 
         del_coll = self.mongo_client[ds_id][icn]
 
         #----------------------- Checking database content --------------------#
 
-        del_ids = set()
-        for test_doc in self.import_docs:
-            del_id_v = test_doc[iid]
-            if not del_coll.find_one({"id": del_id_v}):
+        del_ids = list(dict.fromkeys(d[iid] for d in self.import_docs))
+        e_ids = mongo_existing_values(del_coll, del_ids, chunk_size=self.batch_size)
+        for del_id_v in del_ids:
+            if del_id_v not in e_ids:
                 self.log.append(f'id {del_id_v} does not exist in {ds_id}.{icn} => maybe deleted already ...')
-            del_ids.add(del_id_v)
 
         self.__parse_log()
 
         #---------------------------- Delete Stage ----------------------------#
 
-        del_nos = { icn: 0 }
-        if not self.downstream_only:
-            bar = Bar("Deleting ", max = len(del_ids), suffix='%(percent)d%%'+f' of {str(len(del_ids))} {icn}' ) if not BYC["TEST_MODE"] else False
-            for del_id in del_ids:
-                d_c = del_coll.count_documents({"id": del_id})
-                del_nos[icn] += d_c
-                if not BYC["TEST_MODE"]:
-                    del_coll.delete_many({"id": del_id})
-                    bar.next()
-            if not BYC["TEST_MODE"]:
-                bar.finish()
-
-        for c in dcs:
-            bar = Bar(f'Deleting {c} ', max = len(del_ids), suffix='%(percent)d%%'+f' of {str(len(del_ids))} {icn}' ) if not BYC["TEST_MODE"] else False
-            del_coll = self.mongo_client[ds_id][c]
-            del_nos.update({c: 0})
-            for del_id in del_ids:
-                d_c = del_coll.count_documents({iid: del_id})
-                del_nos[c] += d_c
-                if not BYC["TEST_MODE"]:
-                    del_coll.delete_many({iid: del_id})
-                    bar.next()
-            if not BYC["TEST_MODE"]:
-                bar.finish()
+        del_nos = {c: 0 for c in ([] if self.downstream_only else [icn]) + self.downstream}
+        bar = Bar("Deleting ", max = len(del_ids), suffix='%(percent)d%%'+f' of {str(len(del_ids))} {icn}' ) if not BYC["TEST_MODE"] else False
+        for b_i in range(0, len(del_ids), self.batch_size):
+            b_ids = del_ids[b_i:b_i + self.batch_size]
+            for t_b_ids, oversized in self.__transaction_id_batches(ds_id, b_ids):
+                if oversized:
+                    b_nos = self.__delete_oversized_record(t_b_ids[0])
+                else:
+                    b_nos = self.__in_transaction(self.__delete_records_batch, t_b_ids)
+                for k, v in b_nos.items():
+                    del_nos[k] += v
+            if bar:
+                bar.next(len(b_ids))
+        if bar:
+            bar.finish()
 
         if not BYC["TEST_MODE"]:
+            dataset_data_version_update(ds_id)
             for k, v in del_nos.items():
                 print(f'==> deleted {v} {k}')
         else:
             for k, v in del_nos.items():
                 print(f'==> would have deleted {v} {k}')
-               
+
+
+    #--------------------------------------------------------------------------#
+
+    def __delete_records_batch(self, session, b_ids):
+        ds_id = self.dataset_id
+        icn = self.import_collname
+        iid = self.import_id
+
+        d_qs = [] if self.downstream_only else [(icn, {"id": {"$in": b_ids}})]
+        d_qs += [(c, {iid: {"$in": b_ids}}) for c in self.downstream]
+        b_nos = {}
+        for c, q in d_qs:
+            del_coll = self.mongo_client[ds_id][c]
+            if BYC["TEST_MODE"]:
+                b_nos.update({c: del_coll.count_documents(q, session=session)})
+            else:
+                b_nos.update({c: del_coll.delete_many(q, session=session).deleted_count})
+        return b_nos
+
+
+    #--------------------------------------------------------------------------#
+
+    def __delete_oversized_record(self, d_id):
+        """
+        Deletes a record whose downstream records exceed the transaction size:
+        the downstream records are deleted per collection in transactions of up
+        to `transaction_size` documents before the record itself, so that an
+        interrupted deletion can be repeated.
+        """
+        ds_id = self.dataset_id
+        iid = self.import_id
+
+        b_nos = {}
+        for c in self.downstream:
+            del_coll = self.mongo_client[ds_id][c]
+            d_oids = [d["_id"] for d in del_coll.find({iid: d_id}, {"_id": 1})]
+            b_nos.update({c: 0})
+            for o_i in range(0, len(d_oids), self.transaction_size):
+                o_ids = d_oids[o_i:o_i + self.transaction_size]
+                b_nos[c] += self.__in_transaction(
+                    lambda session, q: del_coll.delete_many(q, session=session).deleted_count,
+                    {"_id": {"$in": o_ids}}
+                )
+        if not self.downstream_only:
+            icn = self.import_collname
+            b_nos.update({icn: self.__in_transaction(
+                lambda session, q: self.mongo_client[ds_id][icn].delete_many(q, session=session).deleted_count,
+                {"id": d_id}
+            )})
+        return b_nos
+
+
+    #--------------------------------------------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def __transaction_id_batches(self, ds_id, b_ids):
+        """
+        With `--transactions true` a batch of ids is split into sub-batches of
+        ids with together no more than `--transactionSize` records (the record
+        and its downstream records), to stay within the run time (60s) and size
+        limits of MongoDB transactions. Ids with more records than that are
+        returned as single, `oversized` sub-batches for chunked processing.
+        W/o transactions (or in test mode) the batch is returned as is.
+        """
+        if not self.use_transactions or BYC["TEST_MODE"]:
+            yield b_ids, False
+            return
+        iid = self.import_id
+        r_nos = {b_id: 1 for b_id in b_ids}
+        for c in self.downstream:
+            c_p = [
+                {"$match": {iid: {"$in": b_ids}}},
+                {"$group": {"_id": f'${iid}', "n": {"$sum": 1}}}
+            ]
+            for r in self.mongo_client[ds_id][c].aggregate(c_p):
+                if r["_id"] in r_nos:
+                    r_nos[r["_id"]] += r["n"]
+        t_b_ids = []
+        t_b_no = 0
+        for b_id in b_ids:
+            if (r_no := r_nos[b_id]) > self.transaction_size:
+                yield [b_id], True
+                continue
+            if t_b_no + r_no > self.transaction_size:
+                yield t_b_ids, False
+                t_b_ids = []
+                t_b_no = 0
+            t_b_ids.append(b_id)
+            t_b_no += r_no
+        if len(t_b_ids) > 0:
+            yield t_b_ids, False
+
+
+    #--------------------------------------------------------------------------#
+
+    def __in_transaction(self, batch_f, *args):
+        """
+        Runs the batch function with a session in a multi-document transaction
+        if `--transactions true` is set (MongoDB replica set or sharded cluster
+        required); otherwise w/o session.
+        """
+        if not self.use_transactions:
+            return batch_f(None, *args)
+        with self.mongo_client.start_session() as session:
+            return session.with_transaction(lambda s: batch_f(s, *args))
+
 
     #--------------------------------------------------------------------------#
     #--------------------------------------------------------------------------#
@@ -540,11 +712,12 @@ class ByconautImporter():
 
         #----------------------- Checking database content --------------------# 
 
+        self.__check_upstream_ids(self.import_docs)
+        e_ids = mongo_existing_values(import_coll, [d[iid] for d in self.import_docs])
         checked_docs = []
         for test_doc in self.import_docs:
             import_id_v = test_doc[iid]
-            self.__check_upstream_ids(test_doc)
-            if not import_coll.find_one({"id": import_id_v}):
+            if import_id_v not in e_ids:
                 self.log.append(f'id {import_id_v} does not exist in {ds_id}.{icn} => you might need to run an importer ...')
                 continue
             checked_docs.append(test_doc)
@@ -575,6 +748,7 @@ class ByconautImporter():
 
         if not BYC["TEST_MODE"]:
             bar.finish()
+            dataset_data_version_update(ds_id)
             print(f'==> updated {i_no} {ien}')
         else:
             print(f'==> tested {i_no} {ien}')
@@ -594,11 +768,12 @@ class ByconautImporter():
 
         #----------------------- Checking database content --------------------# 
 
+        self.__check_upstream_ids(self.import_docs)
+        e_ids = mongo_existing_values(import_coll, [d[iid] for d in self.import_docs])
         checked_docs = []
         for test_doc in self.import_docs:
             import_id_v = test_doc[iid]
-            self.__check_upstream_ids(test_doc)
-            if import_coll.find_one({"id": import_id_v}):
+            if import_id_v in e_ids:
                 self.log.append(f'existing id {import_id_v} in {ds_id}.{icn} => please check or remove')
                 continue
             checked_docs.append(test_doc)
@@ -621,6 +796,8 @@ class ByconautImporter():
 
         #-------------------------------- Summary -----------------------------#
 
+        if not BYC["TEST_MODE"]:
+            dataset_data_version_update(ds_id)
         print(f'=> {i_no} records were inserted into {ds_id}.{icn}')
 
     #--------------------------------------------------------------------------#
@@ -631,7 +808,6 @@ class ByconautImporter():
         icn = self.import_collname 
         ien = self.import_entity
         iid = self.import_id
-        fn = self.data_in.fieldnames
 
         import_coll = self.mongo_client[ ds_id ][icn]
 
@@ -641,70 +817,133 @@ class ByconautImporter():
 
         #----------------------- Checking database content --------------------# 
 
-        for test_doc in self.import_docs:
-            self.__check_upstream_ids(test_doc)
+        # The input file is streamed twice - first for checking all variants
+        # and collecting the analysis ids, then for the import - so that
+        # the memory use does not depend on the file size and no data is
+        # changed in case of errors.
+
+        ana_del_ids = set()
+        v_no = 0
+        c = 0
+        for docs in self.__import_doc_chunks():
+            self.__check_upstream_ids(docs)
+            for v in docs:
+                c += 1
+                if not (vs_id := v.get("variant_state_id")):
+                    print(f"¡¡¡ The `variant_state_id` parameter is required for variant assignment  line {c}!!!")
+                    exit()
+                if not (ana_id := v.get("analysis_id")):
+                    print(f"¡¡¡ The `analysis_id` parameter is required for variant assignment  line {c}!!!")
+                    exit()
+                if not "n" in delMatchedVars.lower():
+                    ana_del_ids.add(ana_id)
+                if not "delete" in vs_id.lower():
+                    v_no += 1
+        print(f'=> The input file contains {self.import_lines_count} items')
         self.__parse_log()
+        fn = self.data_in.fieldnames
 
         #---------------------------- Delete Stage ----------------------------#
 
-        ana_del_ids = set()
-        import_vars = []
-        for v in self.import_docs:
-            if not (vs_id := v.get("variant_state_id")):
-                print(f"¡¡¡ The `variant_state_id` parameter is required for variant assignment  line {c}!!!")
-                exit()
-            if not (ana_id := v.get("analysis_id")):
-                print(f"¡¡¡ The `analysis_id` parameter is required for variant assignment  line {c}!!!")
-                exit()
-            if not "n" in delMatchedVars.lower():
-                ana_del_ids.add(ana_id)
-            if not "delete" in vs_id.lower():
-                import_vars.append(v)
-
-        for ana_id in ana_del_ids:
-            v_dels = import_coll.delete_many({"analysis_id": ana_id})
-            print(f'==>> deleted {v_dels.deleted_count} variants from {ana_id}')
+        # deletions are grouped into `$in` queries over `batch_size` analyses
+        ana_del_ids = sorted(ana_del_ids)
+        d_no = 0
+        for b_i in range(0, len(ana_del_ids), self.batch_size):
+            d_q = {"analysis_id": {"$in": ana_del_ids[b_i:b_i + self.batch_size]}}
+            if not BYC["TEST_MODE"]:
+                d_no += import_coll.delete_many(d_q).deleted_count
+            else:
+                d_no += import_coll.count_documents(d_q)
+        if len(ana_del_ids) > 0:
+            d_w = "deleted" if not BYC["TEST_MODE"] else "would have deleted"
+            print(f'==>> {d_w} {d_no} variants from {len(ana_del_ids)} analyses')
 
         #---------------------------- Import Stage ----------------------------# 
 
+        # the `id` values are generated client side from new ObjectIds so that
+        # the records can be written with unordered `insert_many` calls w/o
+        # a subsequent update
         i_no = 0
-        for new_doc in import_vars:
+        BV = ByconVariant()
+        bar = Bar("Inserting ", max = v_no, suffix='%(percent)d%%'+f' of {v_no} variants' ) if not BYC["TEST_MODE"] else False
+        start_t = time.time()
+        batch = []
+        for new_doc in chain.from_iterable(self.__import_doc_chunks()):
+            if "delete" in new_doc["variant_state_id"].lower():
+                continue
             insert_v = import_datatable_dict_line({}, fn, new_doc, ien)
-            insert_v = ByconVariant().pgxVariant(insert_v)
+            insert_v = BV.pgxVariant(insert_v)
             insert_v.update({"updated": datetime.datetime.now().isoformat()})
 
             if not BYC["TEST_MODE"]:
-                vid = import_coll.insert_one(insert_v).inserted_id
-                vstr = f'pgxvar-{vid}'
-                import_coll.update_one({'_id': vid}, {'$set': {'id': vstr}})
-                i_no += 1
+                vid = ObjectId()
+                insert_v.update({"_id": vid, "id": f'pgxvar-{vid}'})
+                batch.append(insert_v)
+                if len(batch) >= self.batch_size:
+                    i_no += self.__insert_batch(import_coll, batch)
+                    bar.next(len(batch))
+                    batch = []
             else:
                 prjsonnice(insert_v)
+        if len(batch) > 0:
+            i_no += self.__insert_batch(import_coll, batch)
+            bar.next(len(batch))
+        if bar:
+            bar.finish()
 
         #-------------------------------- Summary -----------------------------#
 
-        print(f'=> {i_no} records were inserted into {ds_id}.{icn}')
+        if not BYC["TEST_MODE"]:
+            dataset_data_version_update(ds_id)
+        d_t = max(time.time() - start_t, 0.001)
+        print(f'=> {i_no} records were inserted into {ds_id}.{icn} in {round(d_t, 1)}s ({round(i_no / d_t)} records/s)')
+
+
+    #--------------------------------------------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def __insert_batch(self, import_coll, batch, session=None):
+        try:
+            return len(import_coll.insert_many(batch, ordered=False, session=session).inserted_ids)
+        except BulkWriteError as e:
+            # write errors abort a transaction
+            if session:
+                raise
+            w_es = e.details.get("writeErrors", [])
+            print(f'¡¡¡ {len(w_es)} records of the batch could not be inserted, e.g. {w_es[0].get("errmsg") if w_es else ""} !!!')
+            return e.details.get("nInserted", 0)
 
 
     #--------------------------------------------------------------------------#
     #--------------------------------------------------------------------------#
 
-    def __check_upstream_ids(self, new_doc):
-        ind_id = new_doc.get("individual_id", "___none___")
-        bios_id = new_doc.get("biosample_id", "___none___")
-        ana_id = new_doc.get("analysis_id", "___none___")
+    def __check_upstream_ids(self, new_docs):
+        """
+        The upstream ids of all documents are checked with one set of `$in`
+        lookups per collection instead of single queries per document. The
+        results are kept for the import, so for chunked input (e.g. many
+        variants of the same analysis) each id is only looked up once.
+        """
         ien = self.import_entity
         iid = self.import_id
-        import_id_v = new_doc[iid]
-        if "individuals" in self.upstream:
-            if not self.ind_coll.find_one({"id": ind_id}):
-                self.log.append(f'individual {ind_id} for {ien} {import_id_v} should exist before {ien} import')
-        if "biosamples" in self.upstream:
-            if not self.bios_coll.find_one({"id": bios_id}):
-                self.log.append(f'biosample {bios_id} for {ien} {import_id_v} should exist before {ien} import')
-        if "analyses" in self.upstream:
-            if not self.ana_coll.find_one({"id": ana_id}):
-                self.log.append(f'analysis {ana_id} for {ien} {import_id_v} should exist before {ien} import')
+        u_defs = [
+            ("individuals", "individual", "individual_id", self.ind_coll),
+            ("biosamples", "biosample", "biosample_id", self.bios_coll),
+            ("analyses", "analysis", "analysis_id", self.ana_coll)
+        ]
+        u_defs = [u for u in u_defs if u[0] in self.upstream]
+        for u_c, u_e, u_k, u_coll in u_defs:
+            u_ch = self.upstream_checked.setdefault(u_c, {})
+            u_ids = {d.get(u_k, "___none___") for d in new_docs} - u_ch.keys()
+            if len(u_ids) > 0:
+                e_ids = mongo_existing_values(u_coll, u_ids)
+                u_ch.update({u_id: u_id in e_ids for u_id in u_ids})
+        for new_doc in new_docs:
+            import_id_v = new_doc[iid]
+            for u_c, u_e, u_k, u_coll in u_defs:
+                u_id = new_doc.get(u_k, "___none___")
+                if not self.upstream_checked[u_c][u_id]:
+                    self.log.append(f'{u_e} {u_id} for {ien} {import_id_v} should exist before {ien} import')
 
 
     #--------------------------------------------------------------------------#
@@ -1,6 +1,7 @@
-import re, sys
+import hashlib, json, re, sys
 import numpy as np
 from copy import deepcopy
+from itertools import groupby
 from os import path, pardir
 
 from bycon import Cytobands, cytobands_label_from_positions, prdbug, BYC, BYC_PARS, ENV
@@ -61,24 +62,46 @@ end:
 ################################################################################
 ################################################################################
 
+# projection for analyses used in interval frequency calculations
+STATUSMAPS_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "cnv_statusmaps.dup": 1,
+    "cnv_statusmaps.del": 1,
+    "cnv_statusmaps.hldup": 1,
+    "cnv_statusmaps.hldel": 1
+}
+
+# The (static) interval data is generated only once per process for each
+# `(assembly_id, genome_binning)` combination (and version of the interval
+# definitions it is built from) and shared by all `GenomeBins` instances.
+GENOME_BIN_INDEXES = {}
+GENOME_BIN_INDEX_DEFINITIONS = ["genome_bin_sizes", "terminal_intervals_soft_expansion_fraction"]
+
+################################################################################
+
 class GenomeBins:
     def __init__(self):
         self.interval_definitions = BYC.get("interval_definitions", {})
         self.variant_type_definitions = BYC.get("variant_type_definitions", {})
 
-        CB = Cytobands()
-        self.cytobands = CB.get_all_cytobands()
-        self.cytolimits = CB.get_all_cytolimits()
-        self.genome_size = CB.get_genome_size()
-
         self.binning = BYC_PARS.get("genome_binning", "1Mb")
-        self.genomic_intervals = []
-        self.cytoband_intervals = []
-
         self.interval_definitions.update({"genome_binning": self.binning})
 
-        self.__generate_cytoband_intervals()
-        self.__generate_genomic_intervals()
+        i_d_h = json.dumps({k: self.interval_definitions.get(k) for k in GENOME_BIN_INDEX_DEFINITIONS}, sort_keys=True, default=str)
+        i_d_h = hashlib.sha1(i_d_h.encode("utf-8")).hexdigest()
+        g_b_k = (BYC_PARS.get("assembly_id", "GRCh38").lower(), self.binning, i_d_h)
+        if (GBI := GENOME_BIN_INDEXES.get(g_b_k)) is None:
+            GBI = GenomeBinIndex(self.binning, self.interval_definitions)
+            GENOME_BIN_INDEXES.update({g_b_k: GBI})
+
+        self.bin_index = GBI
+        self.cytolimits = GBI.cytolimits
+        self.genome_size = GBI.genome_size
+        self.interval_count = GBI.count
+        self.interval_starts = GBI.starts
+        self.interval_ends = GBI.ends
+        self.interval_index = GBI.chro_index
 
 
     #--------------------------------------------------------------------------#
@@ -93,14 +116,18 @@ class GenomeBins:
     #--------------------------------------------------------------------------#
 
     def get_genome_bins(self):
-        return self.genomic_intervals
+        """
+        Returns the list of interval objects (see schema above). The list is
+        shared between instances and should not be modified.
+        """
+        return self.bin_index.intervals()
 
 
     #--------------------------------------------------------------------------#
     #--------------------------------------------------------------------------#
 
     def get_genome_bin_count(self):
-        return len(self.genomic_intervals)
+        return self.interval_count
 
 
     #--------------------------------------------------------------------------#
@@ -138,6 +165,22 @@ class GenomeBins:
     #--------------------------------------------------------------------------#
     #--------------------------------------------------------------------------#
 
+    def analysesFracMapsAndStats(self, variants=[]):
+        """
+        Batch version of `getAnalysisFracMapsAndStats` for a stream of variants
+        from multiple analyses, e.g. a single cursor from
+        `find({"analysis_id": {"$in": ana_ids}}).sort("analysis_id", 1)`.
+        The variants have to be sorted (or at least grouped) by `analysis_id`.
+        Yields `analysis_id, fraction_maps, cnv_stats, chro_stats, duplicates`
+        for each analysis with variants in the stream.
+        """
+        for ana_id, ana_vars in groupby(variants, key=lambda v: v.get("analysis_id")):
+            yield ana_id, *self.getAnalysisFracMapsAndStats(list(ana_vars))
+
+
+    #--------------------------------------------------------------------------#
+    #--------------------------------------------------------------------------#
+
     def genomeCNVstats(self, analysis_variants=[]):
         self.__prepare_analysis_intervals()
         self.analysis_variants = analysis_variants
@@ -155,6 +198,19 @@ class GenomeBins:
         return self.interval_frequencies, self.analyses_count
 
 
+    #--------------------------------------------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def intervalFrequencyMapsFromCounts(self, counts, analyses_count=0):
+        """
+        Interval frequencies from precomputed per interval analysis counts
+        (e.g. from a `StatusmapStore`), with the count rows in `dup`, `del`,
+        `hldup`, `hldel` order.
+        """
+        self.__interval_frequencies_from_counts(counts, analyses_count)
+        return self.interval_frequencies, self.analyses_count
+
+
     #--------------------------------------------------------------------------#
     #--------------------------------------------------------------------------#
 
@@ -169,85 +225,6 @@ class GenomeBins:
     #---------------------------- private -------------------------------------#
     #--------------------------------------------------------------------------#
 
-    def __generate_cytoband_intervals(self):
-        for cb in self.cytobands:
-            self.cytoband_intervals.append({
-                "no": int(cb["i"]),
-                "id": f'{cb["chro"]}:{cb["start"]}-{cb["end"]}',
-                "reference_name": cb["chro"],
-                "cytobands": cb["cytoband"],
-                "start": int(cb["start"]),
-                "end": int(cb["end"]),
-                "size": int(cb["end"]) - int(cb["start"])
-            })
-
-
-    #--------------------------------------------------------------------------#
-    #--------------------------------------------------------------------------#
-
-    def __generate_genomic_intervals(self):
-        i_d = self.interval_definitions
-        c_l = self.cytolimits
-
-        # cytobands ################################################################
-        if self.binning == "cytobands":
-            self.genomic_intervals = deepcopy(self.cytoband_intervals)
-            return
-
-        # otherwise intervals ######################################################
-
-        assert self.binning in i_d["genome_bin_sizes"]["values"].keys(), f'¡¡ Binning value "{self.binning}" not in list !!'
-
-        int_b = i_d["genome_bin_sizes"]["values"][self.binning]
-        e_p_f = i_d["terminal_intervals_soft_expansion_fraction"].get("value", 0.1)
-        e_p = int_b * e_p_f
-
-        i = 1
-        for chro in c_l.keys():
-            p_max = c_l[chro]["p"][-1]
-            q_max = c_l[chro]["size"]
-            arm = "p"
-            start = 0
-
-            # calculate first interval to end p-arm with a full sized one
-            p_first = p_max
-            while p_first >= int_b + e_p:
-                p_first -= int_b
-
-            end = start + p_first
-            while start < q_max:
-                int_p = int_b
-                if end > q_max:
-                    end = q_max
-                elif q_max < end + e_p:
-                    end = q_max
-                    int_p += e_p
-                if end >= p_max:
-                    arm = "q"
-                size = end - start
-                cbs = cytobands_label_from_positions(chro, start, end)
-
-                self.genomic_intervals.append({
-                    "no": i,
-                    "id": f'{chro}{arm}:{start:09}-{end:09}',
-                    "reference_name": chro,
-                    "arm": arm,
-                    "cytobands": f'{chro}{cbs}',
-                    "start": start,
-                    "end": end,
-                    "size": size
-                })
-
-                start = end
-                end += int_p
-                i += 1
-
-        self.interval_count = len(self.genomic_intervals)
-
-
-    #--------------------------------------------------------------------------#
-    #--------------------------------------------------------------------------#
-
     def __prepare_analysis_intervals(self):
         self.cov_labs = {"DUP": 'dup', "DEL": 'del'}
         self.hl_labs = {"HLDUP": "hldup", "HLDEL": "hldel"}
@@ -263,6 +240,7 @@ class GenomeBins:
 
     def __interval_cnv_coverage_arrays(self):
         self.coverage_maps = self.maps.copy()
+        self.duplicates = set()
         for cov_lab in self.cov_labs.values():
             self.coverage_maps.update({cov_lab: [0 for i in range(self.interval_count)]})
         for hl_lab in self.hl_labs.values():
@@ -270,17 +248,20 @@ class GenomeBins:
 
         if type(self.analysis_variants).__name__ == "Cursor":
             self.analysis_variants.rewind()
+        analysis_variants = list(self.analysis_variants)
 
-        if (v_no := len(list(self.analysis_variants))) < 1:
+        if (v_no := len(analysis_variants)) < 1:
             return
 
         self.coverage_maps.update({"variant_count": v_no})
 
+        # the coverage labels are mapped to rows of the coverage matrix
+        c_labs = [*self.cov_labs.values(), *self.hl_labs.values()]
+        c_rows = {lab: i for i, lab in enumerate(c_labs)}
+        c_vars = {}
+
         digests = set()
-        self.duplicates = set()
-        if type(self.analysis_variants).__name__ == "Cursor":
-            self.analysis_variants.rewind()
-        for v in self.analysis_variants:
+        for v in analysis_variants:
             v_t_c = v.get("variant_state", {}).get("id", "__NA__")
             if v_t_c not in self.variant_type_definitions.keys():
                 continue
@@ -303,14 +284,62 @@ class GenomeBins:
             else:
                 digests.add(v_i_id)
 
-            for i, intv in enumerate(self.genomic_intervals):
-                if self.__has_overlap(intv, v):
-                    ov_end = min(intv["end"], v["location"]["end"])
-                    ov_start = max(intv["start"], v["location"]["start"])
-                    ov = ov_end - ov_start
-                    self.coverage_maps[cov_lab][i] += ov
-                    if hl_lab:
-                        self.coverage_maps[hl_lab][i] += ov
+            if not (chro := v["location"].get("chromosome")):
+                prdbug(f'!!! no chromosome in variant !!!\n{v}')
+                continue
+            if chro not in self.interval_index:
+                continue
+
+            c_v = c_vars.setdefault(chro, {"start": [], "end": [], "rows": []})
+            c_v["start"].append(v["location"]["start"])
+            c_v["end"].append(v["location"]["end"])
+            c_v["rows"].append((c_rows[cov_lab], c_rows.get(hl_lab, -1)))
+
+        coverages = np.zeros((len(c_labs), self.interval_count), dtype=np.int64)
+        for chro, c_v in c_vars.items():
+            self.__accumulate_chromosome_coverage(coverages, chro, c_v)
+
+        for lab, i in c_rows.items():
+            self.coverage_maps.update({lab: coverages[i].tolist()})
+
+
+    #--------------------------------------------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def __accumulate_chromosome_coverage(self, coverages, chro, c_v):
+        """
+        For all variants of one chromosome the first and last overlapping
+        interval are determined by binary search; then the (variant, interval)
+        pairs are expanded into flat arrays and the overlaps are added up per
+        coverage row.
+        """
+        i_f, i_l = self.interval_index[chro]
+        c_starts = self.interval_starts[i_f:i_l]
+        c_ends = self.interval_ends[i_f:i_l]
+
+        v_starts = np.array(c_v["start"], dtype=np.int64)
+        v_ends = np.array(c_v["end"], dtype=np.int64)
+        v_rows = np.array(c_v["rows"], dtype=np.int64)
+
+        # first interval ending after the variant start, first one starting
+        # at or after the variant end
+        firsts = np.searchsorted(c_ends, v_starts, side="right")
+        lasts = np.searchsorted(c_starts, v_ends, side="left")
+        counts = np.clip(lasts - firsts, 0, None)
+        if (p_no := int(counts.sum())) < 1:
+            return
+
+        v_i = np.repeat(np.arange(len(v_starts)), counts)
+        offsets = np.repeat(np.cumsum(counts) - counts, counts)
+        c_i = firsts[v_i] + np.arange(p_no) - offsets
+
+        overlaps = np.minimum(c_ends[c_i], v_ends[v_i]) - np.maximum(c_starts[c_i], v_starts[v_i])
+        c_i += i_f
+
+        for r_i in range(v_rows.shape[1]):
+            rows = v_rows[v_i, r_i]
+            has_row = rows >= 0
+            np.add.at(coverages, (rows[has_row], c_i[has_row]), overlaps[has_row])
 
 
     #--------------------------------------------------------------------------#
@@ -324,16 +353,11 @@ class GenomeBins:
         if (self.coverage_maps.get("variant_count", 0)) < 1:
             return
 
-        for cov_lab in self.cov_labs.values():
-            for i, intv in enumerate(self.genomic_intervals):
-                if (cov := self.fraction_maps[cov_lab][i]) > 0:
-                    # correct fraction (since some intervals have a different size)
-                    self.fraction_maps[cov_lab][i] = round(cov / intv["size"], 3)
-        for hl_lab in self.hl_labs.values():
-            for i, intv in enumerate(self.genomic_intervals):
-                if (cov := self.fraction_maps[hl_lab][i]) > 0:
-                    # correct fraction (since some intervals have a different size)
-                    self.fraction_maps[hl_lab][i] = round(cov / intv["size"], 3)
+        for lab in [*self.cov_labs.values(), *self.hl_labs.values()]:
+            f_m = self.fraction_maps[lab]
+            for i in np.flatnonzero(np.array(f_m) > 0).tolist():
+                # correct fraction (since some intervals have a different size)
+                f_m[i] = round(f_m[i] / int(self.bin_index.sizes[i]), 3)
 
 
     #--------------------------------------------------------------------------#
@@ -362,17 +386,18 @@ class GenomeBins:
             return
 
         for cov_lab in self.cov_labs.values():
-            for i, intv in enumerate(self.genomic_intervals):
-                if (cov := self.coverage_maps[cov_lab][i]) > 0:
-                    lab = f'{cov_lab}coverage'
-                    chro = intv["reference_name"]
-                    c_a = f'{chro}{intv["arm"]}'
-                    self.cnv_stats[lab] += cov
-                    self.chro_stats[chro][lab] += cov
-                    self.chro_stats[c_a][lab] += cov
-                    self.cnv_stats["cnvcoverage"] += cov
-                    self.chro_stats[chro]["cnvcoverage"] += cov
-                    self.chro_stats[c_a]["cnvcoverage"] += cov
+            c_m = self.coverage_maps[cov_lab]
+            for i in np.flatnonzero(np.array(c_m) > 0).tolist():
+                cov = c_m[i]
+                lab = f'{cov_lab}coverage'
+                chro = str(self.bin_index.reference_names[i])
+                c_a = f'{chro}{self.bin_index.arms[i]}'
+                self.cnv_stats[lab] += cov
+                self.chro_stats[chro][lab] += cov
+                self.chro_stats[c_a][lab] += cov
+                self.cnv_stats["cnvcoverage"] += cov
+                self.chro_stats[chro]["cnvcoverage"] += cov
+                self.chro_stats[c_a]["cnvcoverage"] += cov
 
         for s_k in self.cnv_stats.keys():
             if "coverage" in s_k:
@@ -393,22 +418,6 @@ class GenomeBins:
                             {f_k: self.__round_frac(self.chro_stats[c_a][s_k], s_a, 3)})
 
 
-    #--------------------------------------------------------------------------#
-    #--------------------------------------------------------------------------#
-
-    def __has_overlap(self, interval, v):
-        if not (chro := v["location"].get("chromosome")):
-            prdbug(f'!!! no chromosome in variant !!!\n{v}')
-            return False
-        if interval["reference_name"] != chro:
-            return False
-        if v["location"]["start"] >= interval["end"]:
-            return False
-        if v["location"]["end"] <= interval["start"]:
-            return False
-        return True
-
-
     #--------------------------------------------------------------------------#
     #--------------------------------------------------------------------------#
 
@@ -422,52 +431,199 @@ class GenomeBins:
 
     def __interval_counts_from_analyses(self):
         """
-        This method will analyze a set (either list or MongoDB Cursor) of Progenetix
-        analyses with CNV statusmaps and return a list of standard genomic interval
-        objects with added per-interval quantitative data.
+        This method will analyze a set (either list, generator or MongoDB Cursor)
+        of Progenetix analyses with CNV statusmaps and return a list of standard
+        genomic interval objects with added per-interval quantitative data.
+        The analyses are consumed in a single pass, only keeping per-interval
+        `uint32` counts; therefore only their `cnv_statusmaps` have to be
+        retrieved (see `STATUSMAPS_PROJECTION`).
         """
         min_f = self.interval_definitions["interval_min_fraction"].get("value", 0.001)
-        self.interval_frequencies = deepcopy(self.genomic_intervals)
         int_no = self.interval_count
-        self.analyses_count = 0
+        s_labs = ["dup", "del", "hldup", "hldel"]
+        counts = np.zeros((len(s_labs), int_no), dtype=np.uint32)
+        a_no = 0
 
-        # analyses can be either a list or a MongoDB Cursor (which has to be re-set)
+        # a MongoDB Cursor may have been consumed before
         if type(self.analyses).__name__ == "Cursor":
             self.analyses.rewind()
 
-        f_factor = 0
-        if (a_no := len(list(self.analyses))) > 0:
-            f_factor = 100 / a_no
-            self.analyses_count = a_no
-        pars = {
-            "gain": {"cov_l": "dup", "hl_l": "hldup"},
-            "loss": {"cov_l": "del", "hl_l": "hldel"}
-        }
+        for analysis in self.analyses:
+            a_no += 1
+            s_m = analysis.get("cnv_statusmaps", {})
+            for i, lab in enumerate(s_labs):
+                # missing maps are equivalent to zeroed arrays
+                if (v_s := s_m.get(lab)):
+                    counts[i] += np.asarray(v_s) >= min_f
 
-        for t in pars.keys():
-            covs = np.zeros((self.analyses_count, int_no))
-            hls = np.zeros((self.analyses_count, int_no))
-            # MongoDB specific
-            if type(self.analyses).__name__ == "Cursor":
-                self.analyses.rewind()
-            cov_l = pars[t].get("cov_l")
-            hl_l = pars[t].get("hl_l", cov_l)
-            for i, analysis in enumerate(self.analyses):
-                # the fallback is also a zeroed array ...
-                covs[i] = analysis["cnv_statusmaps"].get(cov_l, [0] * int_no)
-                hls[i] = analysis["cnv_statusmaps"].get(hl_l, [0] * int_no)
-
-            # counting all occurrences of an interval for the current type > interval_min_fraction
-            counts = np.count_nonzero(covs >= min_f, axis=0)
-            frequencies = np.around(counts * f_factor, 3)
-            hlcounts = np.count_nonzero(hls >= min_f, axis=0)
-            hlfrequencies = np.around(hlcounts * f_factor, 3)
+        if type(self.analyses).__name__ == "Cursor":
+            self.analyses.close()
+
+        self.__interval_frequencies_from_counts(counts, a_no)
+
+
+    #--------------------------------------------------------------------------#
+    #--------------------------------------------------------------------------#
 
+    def __interval_frequencies_from_counts(self, counts, analyses_count):
+        self.interval_frequencies = deepcopy(self.get_genome_bins())
+        self.analyses_count = analyses_count
+        f_factor = 100 / analyses_count if analyses_count > 0 else 0
+        for t, c_i, hl_i in [("gain", 0, 2), ("loss", 1, 3)]:
+            frequencies = np.around(counts[c_i] * f_factor, 3)
+            hlfrequencies = np.around(counts[hl_i] * f_factor, 3)
             for i, interval in enumerate(self.interval_frequencies):
-                self.interval_frequencies[i].update({
+                interval.update({
                     f"{t}_frequency": frequencies[i],
                     f"{t}_hlfrequency": hlfrequencies[i]
                 })
 
-        if type(self.analyses).__name__ == "Cursor":
-            analyses.close()
+
+################################################################################
+################################################################################
+################################################################################
+
+class GenomeBinIndex:
+    """
+    Compact representation of the genomic intervals for a binning, with the
+    interval properties stored as parallel NumPy arrays (in interval order;
+    chromosomes are contiguous). The interval objects are only created on the
+    first call of `intervals()`.
+    """
+    __slots__ = (
+        "binning",
+        "cytolimits",
+        "genome_size",
+        "count",
+        "nos",
+        "ids",
+        "reference_names",
+        "arms",
+        "cytobands",
+        "starts",
+        "ends",
+        "sizes",
+        "chro_index",
+        "_intervals"
+    )
+
+    def __init__(self, binning, interval_definitions):
+        CB = Cytobands()
+        self.binning = binning
+        self.cytolimits = CB.get_all_cytolimits()
+        self.genome_size = CB.get_genome_size()
+        self._intervals = None
+
+        if binning == "cytobands":
+            cols = self.__cytoband_interval_columns(CB.get_all_cytobands())
+        else:
+            cols = self.__genomic_interval_columns(interval_definitions)
+
+        self.count = len(cols["start"])
+        self.nos = np.array(cols["no"], dtype=np.int64)
+        self.ids = np.array(cols["id"], dtype=str)
+        self.reference_names = np.array(cols["reference_name"], dtype=str)
+        self.arms = np.array(cols["arm"], dtype=str)
+        self.cytobands = np.array(cols["cytobands"], dtype=str)
+        self.starts = np.array(cols["start"], dtype=np.int64)
+        self.ends = np.array(cols["end"], dtype=np.int64)
+        self.sizes = self.ends - self.starts
+
+        # slice positions of each chromosome's intervals
+        self.chro_index = {}
+        for i, chro in enumerate(cols["reference_name"]):
+            if chro not in self.chro_index:
+                self.chro_index.update({chro: [i, i + 1]})
+            else:
+                self.chro_index[chro][-1] = i + 1
+
+
+    #--------------------------------------------------------------------------#
+    #----------------------------- public -------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def intervals(self):
+        if self._intervals is None:
+            self._intervals = [
+                {
+                    "no": int(self.nos[i]),
+                    "id": str(self.ids[i]),
+                    "reference_name": str(self.reference_names[i]),
+                    "arm": str(self.arms[i]),
+                    "cytobands": str(self.cytobands[i]),
+                    "start": int(self.starts[i]),
+                    "end": int(self.ends[i]),
+                    "size": int(self.sizes[i])
+                } for i in range(self.count)
+            ]
+        return self._intervals
+
+
+    #--------------------------------------------------------------------------#
+    #---------------------------- private -------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def __cytoband_interval_columns(self, cytobands):
+        cols = {k: [] for k in ["no", "id", "reference_name", "arm", "cytobands", "start", "end"]}
+        for cb in cytobands:
+            cols["no"].append(int(cb["i"]))
+            cols["id"].append(f'{cb["chro"]}:{cb["start"]}-{cb["end"]}')
+            cols["reference_name"].append(cb["chro"])
+            cols["arm"].append(cb["cytoband"][:1])
+            cols["cytobands"].append(cb["cytoband"])
+            cols["start"].append(int(cb["start"]))
+            cols["end"].append(int(cb["end"]))
+        return cols
+
+
+    #--------------------------------------------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def __genomic_interval_columns(self, i_d):
+        c_l = self.cytolimits
+        cols = {k: [] for k in ["no", "id", "reference_name", "arm", "cytobands", "start", "end"]}
+
+        assert self.binning in i_d["genome_bin_sizes"]["values"].keys(), f'¡¡ Binning value "{self.binning}" not in list !!'
+
+        int_b = i_d["genome_bin_sizes"]["values"][self.binning]
+        e_p_f = i_d["terminal_intervals_soft_expansion_fraction"].get("value", 0.1)
+        e_p = int_b * e_p_f
+
+        i = 1
+        for chro in c_l.keys():
+            p_max = c_l[chro]["p"][-1]
+            q_max = c_l[chro]["size"]
+            arm = "p"
+            start = 0
+
+            # calculate first interval to end p-arm with a full sized one
+            p_first = p_max
+            while p_first >= int_b + e_p:
+                p_first -= int_b
+
+            end = start + p_first
+            while start < q_max:
+                int_p = int_b
+                if end > q_max:
+                    end = q_max
+                elif q_max < end + e_p:
+                    end = q_max
+                    int_p += e_p
+                if end >= p_max:
+                    arm = "q"
+                cbs = cytobands_label_from_positions(chro, start, end)
+
+                cols["no"].append(i)
+                cols["id"].append(f'{chro}{arm}:{start:09}-{end:09}')
+                cols["reference_name"].append(chro)
+                cols["arm"].append(arm)
+                cols["cytobands"].append(f'{chro}{cbs}')
+                cols["start"].append(start)
+                cols["end"].append(end)
+
+                start = end
+                end += int_p
+                i += 1
+
+        return cols
+
@@ -2,12 +2,11 @@ import re
 from random import sample as random_samples
 from progress.bar import Bar
 
-from pymongo import MongoClient
 
 from bycon import (
     BYC,
     BYC_PARS,
-    DB_MONGOHOST,
+    get_mongo_client,
     mongo_and_or_query_from_list,
     prdbug,
     prjsonnice,
@@ -35,8 +34,8 @@ class OntologyMaps:
         self.filter_id_matches = ["NCIT", "pgx:icdom", "pgx:icdot", "UBERON"]
         self.ds_id = BYC["BYC_DATASET_IDS"][0]
 
-        self.ontologymaps_coll = MongoClient(host=DB_MONGOHOST)["_byconServicesDB"]["ontologymaps"]
-        self.bios_coll = MongoClient(host=DB_MONGOHOST)[self.ds_id]["biosamples"]
+        self.ontologymaps_coll = get_mongo_client()["_byconServicesDB"]["ontologymaps"]
+        self.bios_coll = get_mongo_client()[self.ds_id]["biosamples"]
 
         self.combos = [
             {
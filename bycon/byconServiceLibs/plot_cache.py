@@ -0,0 +1,226 @@
+import hashlib, json
+from datetime import date
+from os import environ, listdir, makedirs, path, remove, replace, utime
+
+from bycon import BYC, prdbug
+from probe_data import ProbeData
+
+################################################################################
+
+"""
+The optional plot cache keeps rendered SVGs on the local disk, e.g. for the
+static collation histograms which only change when the frequencymaps are
+re-generated. The cache is only used if a `plot_cache_dir_loc` path is defined
+in `local_paths.yaml`.
+
+An SVG is stored under a content address (SHA-256) from
+
+* the plot type and the (parsed) plot parameters
+* for each input bundle its `id`/`group_id` and `updated` stamp (e.g. the
+  collation frequencymaps) or - for bundles w/o `updated` or with variants - a
+  hash of its content (e.g. frequencies or samples from a query)
+
+Additionally plot layers which only depend on the plot geometry (i.e. the
+cytoband ideograms) are stored as JSON lists of SVG elements in `layers`.
+
+Files are touched on use; if the cache (SVGs and layers together) exceeds
+`BYCON_PLOT_CACHE_MAX_MB` (default 500) the least recently used files are
+removed. The housekeepers which re-generate frequencymaps clear the cache.
+"""
+
+PLOT_CACHE_MAX_BYTES = int(environ.get("BYCON_PLOT_CACHE_MAX_MB", 500)) * 1024 * 1024
+
+################################################################################
+################################################################################
+################################################################################
+
+class ByconPlotCache:
+    def __init__(self, plot_type="", plot_pars={}, plot_data_bundle={}):
+        self.cache_dir = None
+        self.cache_file = None
+        if (c_d := BYC.get("local_paths", {}).get("plot_cache_dir_loc")):
+            self.cache_dir = path.join(*c_d)
+            if plot_type:
+                c_k = self.__cache_key(plot_type, plot_pars, plot_data_bundle)
+                self.cache_file = path.join(self.cache_dir, f'{c_k}.svg')
+
+
+    #--------------------------------------------------------------------------#
+    #----------------------------- public -------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def isConfigured(self):
+        return self.cache_dir is not None
+
+
+    #--------------------------------------------------------------------------#
+
+    def cachedSVG(self):
+        if not self.cache_file or not path.isfile(self.cache_file):
+            return None
+        try:
+            with open(self.cache_file) as s_f:
+                svg = s_f.read()
+            utime(self.cache_file)
+        except OSError:
+            return None
+        prdbug(f'... using cached plot {self.cache_file}')
+        return svg
+
+
+    #--------------------------------------------------------------------------#
+
+    def storeSVG(self, svg):
+        if not self.cache_file or not svg:
+            return
+        try:
+            makedirs(self.cache_dir, exist_ok=True)
+            tmp_file = f'{self.cache_file}.tmp'
+            with open(tmp_file, "w") as s_f:
+                s_f.write(svg)
+            replace(tmp_file, self.cache_file)
+            self.__evict()
+        except OSError as e:
+            prdbug(f'... plot could not be cached: {e}')
+
+
+    #--------------------------------------------------------------------------#
+
+    def cachedLayer(self, layer_key):
+        """
+        Returns the list of SVG elements of a plot layer (e.g. the cytobands)
+        stored for the layer key (i.e. its geometry parameters) or `None`.
+        """
+        if not (l_f := self.__layer_file(layer_key)) or not path.isfile(l_f):
+            return None
+        try:
+            with open(l_f) as l_fh:
+                elements = json.load(l_fh)
+            utime(l_f)
+        except (OSError, ValueError):
+            return None
+        return elements
+
+
+    #--------------------------------------------------------------------------#
+
+    def storeLayer(self, layer_key, elements):
+        if not (l_f := self.__layer_file(layer_key)):
+            return
+        try:
+            makedirs(path.dirname(l_f), exist_ok=True)
+            tmp_file = f'{l_f}.tmp'
+            with open(tmp_file, "w") as l_fh:
+                json.dump(elements, l_fh)
+            replace(tmp_file, l_f)
+            self.__evict()
+        except OSError as e:
+            prdbug(f'... plot layer could not be cached: {e}')
+
+
+    #--------------------------------------------------------------------------#
+
+    def clear(self):
+        if not self.isConfigured() or not path.isdir(self.cache_dir):
+            return 0
+        c_no = 0
+        for f_p in self.__cache_files():
+            try:
+                remove(f_p)
+            except OSError:
+                continue
+            c_no += 1
+        return c_no
+
+
+    #--------------------------------------------------------------------------#
+    #---------------------------- private -------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def __cache_key(self, plot_type, plot_pars, plot_data_bundle):
+        b_s = {}
+        for d_k, bundles in plot_data_bundle.items():
+            if type(bundles) is not list:
+                continue
+            b_s.update({d_k: [self.__bundle_signature(b) for b in bundles]})
+        k_o = {
+            "plot_type": plot_type,
+            "plot_pars": plot_pars,
+            "bundles": b_s,
+            # the footer contains the current year
+            "year": date.today().year
+        }
+        k_s = json.dumps(k_o, sort_keys=True, default=str, separators=(",", ":"))
+        return hashlib.sha256(k_s.encode("utf-8")).hexdigest()
+
+
+    #--------------------------------------------------------------------------#
+
+    def __layer_file(self, layer_key):
+        if not self.isConfigured():
+            return None
+        l_k = hashlib.sha256(str(layer_key).encode("utf-8")).hexdigest()
+        return path.join(self.cache_dir, "layers", f'{l_k}.json')
+
+
+    #--------------------------------------------------------------------------#
+
+    def __bundle_signature(self, bundle):
+        if type(bundle) is dict and bundle.get("updated") and not "variants" in bundle:
+            return [
+                bundle.get("dataset_id"),
+                bundle.get("id", bundle.get("group_id")),
+                bundle.get("label"),
+                bundle.get("sample_count"),
+                bundle.get("updated")
+            ]
+        b_s = json.dumps(bundle, sort_keys=True, default=self.__json_default, separators=(",", ":"))
+        return hashlib.sha256(b_s.encode("utf-8")).hexdigest()
+
+
+    #--------------------------------------------------------------------------#
+
+    def __json_default(self, obj):
+        # e.g. probe data columns are represented by their content hash
+        if isinstance(obj, ProbeData):
+            return obj.contentHash()
+        return str(obj)
+
+
+    #--------------------------------------------------------------------------#
+
+    def __cache_files(self):
+        """
+        Paths of the cached SVGs and of the plot layer files.
+        """
+        c_fs = []
+        for d_p, f_x in [(self.cache_dir, ".svg"), (path.join(self.cache_dir, "layers"), ".json")]:
+            if not path.isdir(d_p):
+                continue
+            c_fs += [path.join(d_p, f_n) for f_n in listdir(d_p) if f_n.endswith(f_x)]
+        return c_fs
+
+
+    #--------------------------------------------------------------------------#
+
+    def __evict(self):
+        c_fs = []
+        c_size = 0
+        for f_p in self.__cache_files():
+            try:
+                f_s = path.getsize(f_p)
+                c_fs.append((path.getmtime(f_p), f_s, f_p))
+            except OSError:
+                continue
+            c_size += f_s
+        if c_size <= PLOT_CACHE_MAX_BYTES:
+            return
+        # removal down to 90% of the maximum, oldest (least recently used) first
+        for m_t, f_s, f_p in sorted(c_fs):
+            if c_size <= PLOT_CACHE_MAX_BYTES * 0.9:
+                break
+            try:
+                remove(f_p)
+            except OSError:
+                pass
+            c_size -= f_s
@@ -0,0 +1,137 @@
+import csv, hashlib
+import numpy as np
+
+from bycon import Cytobands
+
+################################################################################
+################################################################################
+################################################################################
+
+class ProbeData:
+    """
+    Copy number probe data (e.g. from array or coverage files) stored as typed,
+    parallel NumPy columns sorted by chromosome and position:
+
+    * `chro_codes` - index of the chromosome in `chro_names` (the cytoband
+      chromosome order)
+    * `positions`
+    * `values`
+    * `probe_ids`
+
+    Probes on chromosomes not in the cytobands are dropped. The position range
+    of each chromosome in the columns is kept in `chro_index`.
+
+    Probes can be provided as a list of probe objects
+    (`{"probe_id": ..., "reference_name": "17", "start": 13663925, "value": 2.5}`)
+    or read from a probe file through `readProbeFile`.
+    """
+    __slots__ = (
+        "chro_names",
+        "chro_codes",
+        "positions",
+        "values",
+        "probe_ids",
+        "chro_index"
+    )
+
+    def __init__(self, probes=[]):
+        self.chro_names = list(Cytobands().get_all_cytolimits().keys())
+        self.__set_columns(
+            [p.get("probe_id", "") for p in probes],
+            [p.get("reference_name", "") for p in probes],
+            [p.get("start", 0) for p in probes],
+            [p.get("value", 0) for p in probes]
+        )
+
+
+    #--------------------------------------------------------------------------#
+    #----------------------------- public -------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def readProbeFile(self, filepath):
+        """
+        Reads a tab-delimited probe file with the columns (by position) probe id,
+        reference name, position and value after a header line; `#` prefixed
+        lines are skipped.
+        """
+        cols = [[], [], [], []]
+        with open(filepath, newline='') as p_f:
+            data = csv.reader(filter(lambda row: row.startswith('#') is False, p_f), delimiter="\t", quotechar='"')
+            next(data, None)
+            for l in data:
+                if len(l) < 4:
+                    continue
+                for i in range(4):
+                    cols[i].append(l[i])
+        self.__set_columns(*cols)
+        return self
+
+
+    #--------------------------------------------------------------------------#
+
+    def probeCount(self):
+        return len(self.positions)
+
+
+    #--------------------------------------------------------------------------#
+
+    def contentHash(self):
+        c_h = hashlib.sha256()
+        for col in [self.chro_codes, self.positions, self.values, self.probe_ids]:
+            c_h.update(np.ascontiguousarray(col).tobytes())
+        return c_h.hexdigest()
+
+
+    #--------------------------------------------------------------------------#
+
+    def chromosomeRange(self, chro):
+        """
+        Returns the `[start, end)` column indexes of the chromosome's probes.
+        """
+        return self.chro_index.get(str(chro), (0, 0))
+
+
+    #--------------------------------------------------------------------------#
+
+    def probeList(self):
+        """
+        Returns the probes as list of probe objects.
+        """
+        return [
+            {
+                "probe_id": str(self.probe_ids[i]),
+                "reference_name": self.chro_names[self.chro_codes[i]],
+                "start": int(self.positions[i]),
+                "value": float(self.values[i])
+            } for i in range(self.probeCount())
+        ]
+
+
+    #--------------------------------------------------------------------------#
+    #---------------------------- private -------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def __set_columns(self, probe_ids, reference_names, positions, values):
+        c_i = {c: i for i, c in enumerate(self.chro_names)}
+        p_no = len(positions)
+        codes = np.fromiter((c_i.get(str(r_n), -1) for r_n in reference_names), dtype=np.int16, count=p_no)
+        positions = np.fromiter(map(int, positions), dtype=np.int64, count=p_no)
+        values = np.fromiter(map(float, values), dtype=np.float32, count=p_no)
+        probe_ids = np.array(probe_ids, dtype=str)
+
+        keep = codes >= 0
+        codes, positions, values, probe_ids = codes[keep], positions[keep], values[keep], probe_ids[keep]
+        # probe files are usually sorted already
+        if np.any(np.diff(codes) < 0) or np.any((np.diff(positions) < 0) & (np.diff(codes) == 0)):
+            order = np.lexsort((positions, codes))
+            codes, positions, values, probe_ids = codes[order], positions[order], values[order], probe_ids[order]
+        self.chro_codes = codes
+        self.positions = positions
+        self.values = values
+        self.probe_ids = probe_ids
+
+        self.chro_index = {}
+        bounds = np.searchsorted(self.chro_codes, np.arange(len(self.chro_names) + 1))
+        for i, chro in enumerate(self.chro_names):
+            if bounds[i] < bounds[i + 1]:
+                self.chro_index.update({chro: (int(bounds[i]), int(bounds[i + 1]))})
@@ -1,4 +1,4 @@
-import re, time, base36, datetime
+import re, sys, time, base36, datetime
 from humps import decamelize
 from os import path
 from pathlib import Path
@@ -39,6 +39,20 @@ def ask_limit_reset():
             print(f'... now using {proceed} items')
 
 
+################################################################################
+
+def interactive_mode():
+    """
+    For command line apps which can be run unattended (e.g. the statusmaps
+    refresher w/ `--workers` from cron): confirmations should only be prompted
+    for if attached to a terminal and `--force true` wasn't used. Other apps
+    (and `ask_limit_reset`) always prompt.
+    """
+    if BYC_PARS.get("force", False) is True:
+        return False
+    return sys.stdin.isatty()
+
+
 ################################################################################
 
 def read_service_prefs(service, service_pref_path):
@@ -0,0 +1,215 @@
+import json
+import numpy as np
+from os import makedirs, path, replace
+
+from bycon import BYC, prdbug
+
+################################################################################
+
+"""
+The optional statusmap store keeps a binary copy of the analyses' CNV
+statusmaps for fast interval frequency calculations, e.g. for collations with
+many thousands of analyses where reading the `cnv_statusmaps` lists from the
+database dominates the processing time.
+
+For each dataset and genome binning the store consists of
+
+* a raw `float32` matrix file with the `dup`, `del`, `hldup` and `hldel`
+  fraction values (`STATUSMAP_LABELS` order) of each analysis as one row of
+  `4 x interval_count` values
+* a JSON index with the `analysis_id => row` mapping; analyses without CNV
+  statusmap (e.g. SNV analyses) are indexed with row `-1`
+
+Rows reserved for a refresh are only added to the index once their statusmaps
+have been written (`setWrittenRows`), so that an ongoing or interrupted refresh
+never exposes zero-filled rows as (CNV-free) analyses.
+
+The index also records the dataset's data version (see `dataset_data_version`)
+of the refresh; readers ignore the store if the dataset has been modified
+since then (e.g. by an import) until it has been refreshed again.
+
+The store is only used if a `statusmaps_store_dir_loc` path is defined in
+`local_paths.yaml`; it is written by `housekeepers/analysesStatusmapsRefresher.py`.
+"""
+
+STATUSMAP_LABELS = ["dup", "del", "hldup", "hldel"]
+
+################################################################################
+################################################################################
+################################################################################
+
+class StatusmapStore:
+    def __init__(self, ds_id, binning, interval_count):
+        self.dataset_id = ds_id
+        self.binning = binning
+        self.interval_count = interval_count
+        self.row_size = len(STATUSMAP_LABELS) * interval_count
+        self.row_bytes = self.row_size * np.dtype(np.float32).itemsize
+        self.rows = {}
+        self.reserved = {}
+        self.row_count = 0
+        self.data_version = None
+        self.store_dir = None
+        self.matrix_file = None
+        self.index_file = None
+
+        if (s_d := BYC.get("local_paths", {}).get("statusmaps_store_dir_loc")):
+            self.store_dir = path.join(*s_d)
+            s_n = f'{ds_id}__{binning}'
+            self.matrix_file = path.join(self.store_dir, f'{s_n}.statusmaps')
+            self.index_file = path.join(self.store_dir, f'{s_n}.index.json')
+            self.__read_index()
+
+
+    #--------------------------------------------------------------------------#
+    #----------------------------- public -------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def isConfigured(self):
+        return self.store_dir is not None
+
+
+    #--------------------------------------------------------------------------#
+
+    def dataVersion(self):
+        return self.data_version
+
+
+    #--------------------------------------------------------------------------#
+
+    def setDataVersion(self, data_version):
+        self.data_version = data_version
+
+
+    #--------------------------------------------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def intervalCounts(self, ana_ids=[], min_f=0.001, chunk_size=1000):
+        """
+        Returns the per interval counts of analyses with values >= `min_f` as
+        `uint32` matrix (rows in `STATUSMAP_LABELS` order) and the number of
+        analyses with statusmap - or `None, 0` if any of the analyses is not
+        indexed in the store (e.g. not refreshed since the store was set up).
+        """
+        if not self.isConfigured() or self.row_count < 1:
+            return None, 0
+        rows = []
+        for ana_id in ana_ids:
+            if (r := self.rows.get(ana_id)) is None:
+                return None, 0
+            if r >= 0:
+                rows.append(r)
+
+        counts = np.zeros((len(STATUSMAP_LABELS), self.interval_count), dtype=np.uint32)
+        if len(rows) < 1:
+            return counts, 0
+
+        m = np.memmap(self.matrix_file, dtype=np.float32, mode="r", shape=(self.row_count, len(STATUSMAP_LABELS), self.interval_count))
+        rows = np.sort(np.array(rows, dtype=np.int64))
+        # the threshold has to be compared at the stored precision
+        min_f = np.float32(min_f)
+        for c_i in range(0, len(rows), chunk_size):
+            counts += np.count_nonzero(m[rows[c_i:c_i + chunk_size]] >= min_f, axis=0).astype(np.uint32)
+        del m
+
+        return counts, len(rows)
+
+
+    #--------------------------------------------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def reserveRows(self, ana_ids=[]):
+        """
+        Assigns matrix rows to the analyses (re-using existing ones) and extends
+        the matrix file accordingly; returns the `analysis_id => row` mapping
+        which is used by `writeStatusmaps`, possibly from other processes. New
+        rows are only indexed after `setWrittenRows`.
+        """
+        makedirs(self.store_dir, exist_ok=True)
+        r_rows = {}
+        for ana_id in ana_ids:
+            if (r := self.rows.get(ana_id, -1)) < 0:
+                r = self.row_count
+                self.row_count += 1
+                self.reserved.update({ana_id: r})
+            r_rows.update({ana_id: r})
+        with open(self.matrix_file, "ab") as m_f:
+            m_f.truncate(self.row_count * self.row_bytes)
+        return r_rows
+
+
+    #--------------------------------------------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def writeStatusmaps(self, row_maps={}):
+        """
+        Writes `row => cnv_statusmaps` into the reserved matrix rows.
+        """
+        with open(self.matrix_file, "r+b") as m_f:
+            for r, maps in sorted(row_maps.items()):
+                v_s = np.zeros((len(STATUSMAP_LABELS), self.interval_count), dtype=np.float32)
+                for i, lab in enumerate(STATUSMAP_LABELS):
+                    if (l_v_s := maps.get(lab)):
+                        v_s[i] = l_v_s
+                m_f.seek(r * self.row_bytes)
+                m_f.write(v_s.tobytes())
+
+
+    #--------------------------------------------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def setWrittenRows(self, ana_ids=[]):
+        """
+        Adds the reserved rows of the analyses to the index after their
+        statusmaps have been written.
+        """
+        for ana_id in ana_ids:
+            if (r := self.reserved.pop(ana_id, None)) is not None:
+                self.rows.update({ana_id: r})
+
+
+    #--------------------------------------------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def setNoStatusmaps(self, ana_ids=[]):
+        for ana_id in ana_ids:
+            self.reserved.pop(ana_id, None)
+            self.rows.update({ana_id: -1})
+
+
+    #--------------------------------------------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def saveIndex(self):
+        makedirs(self.store_dir, exist_ok=True)
+        tmp_file = f'{self.index_file}.tmp'
+        with open(tmp_file, "w") as i_f:
+            json.dump({
+                "dataset_id": self.dataset_id,
+                "binning": self.binning,
+                "interval_count": self.interval_count,
+                "labels": STATUSMAP_LABELS,
+                "row_count": self.row_count,
+                "data_version": self.data_version,
+                "rows": self.rows
+            }, i_f)
+        replace(tmp_file, self.index_file)
+
+
+    #--------------------------------------------------------------------------#
+    #---------------------------- private -------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def __read_index(self):
+        if not path.isfile(self.index_file) or not path.isfile(self.matrix_file):
+            return
+        with open(self.index_file) as i_f:
+            s_i = json.load(i_f)
+        # a store for a different interval set is ignored (and rebuilt on refresh)
+        if s_i.get("interval_count") != self.interval_count:
+            prdbug(f'... ignoring statusmap store {self.index_file} for {s_i.get("interval_count")} intervals')
+            return
+        r_c = min(s_i.get("row_count", 0), path.getsize(self.matrix_file) // self.row_bytes)
+        self.rows = {k: v for k, v in s_i.get("rows", {}).items() if v < r_c}
+        self.row_count = r_c
+        self.data_version = s_i.get("data_version")
@@ -1,5 +1,5 @@
-import inspect
-from os import environ, path, pardir
+import atexit, inspect, threading, yaml
+from os import environ, getpid, path, pardir
 from pymongo import MongoClient
 import sys
 
@@ -21,6 +21,13 @@ LOC_PATH = path.join(CALLER_PATH, pardir, "local")
 
 REQUEST_PATH_ROOT = "beacon"
 
+# in the application mode (see `bycon_app.py`) importing `bycon` only loads the
+# configuration; requests are then initialized per call
+APP_MODE = environ.get("BYCON_APP_MODE", "").lower() in ["1", "true", "yes"]
+
+# the C (libyaml based) loader is used if PyYAML has been built with it
+YAML_LOADER = getattr(yaml, "CFullLoader", yaml.FullLoader)
+
 if "services" in LOC_PATH or "byconaut" in LOC_PATH:
     REQUEST_PATH_ROOT = "services"
 
@@ -30,28 +37,127 @@ if "services" in LOC_PATH or "byconaut" in LOC_PATH:
 
 DB_MONGOHOST = environ.get("BYCON_MONGO_HOST", "localhost")
 
+# optional connection pool settings for the shared client, as `MongoClient`
+# option => environment variable (only used if set; values in ms for timeouts)
+DB_MONGO_CLIENT_OPTIONS = {
+  "maxPoolSize": "BYCON_MONGO_MAX_POOL_SIZE",
+  "minPoolSize": "BYCON_MONGO_MIN_POOL_SIZE",
+  "connectTimeoutMS": "BYCON_MONGO_CONNECT_TIMEOUT_MS",
+  "socketTimeoutMS": "BYCON_MONGO_SOCKET_TIMEOUT_MS",
+  "serverSelectionTimeoutMS": "BYCON_MONGO_SERVER_SELECTION_TIMEOUT_MS"
+}
+
+# opt-in maximum number of threads for concurrent dataset queries (and the
+# independent prefetch queries inside a dataset); 1 => sequential execution
+DB_QUERY_WORKERS = max(1, int(environ.get("BYCON_QUERY_WORKERS", 1)))
+
 # TODO: wrap them into object to make them mutable for local changes
 # or through environment variables like the host
 
 HOUSEKEEPING_DB = "_byconHousekeepingDB"
 HOUSEKEEPING_INFO_COLL = "beaconinfo"
 HOUSEKEEPING_HO_COLL = "querybuffer"
+HOUSEKEEPING_HO_PAGES_COLL = "querybuffer_pages"
+
+# handover `target_values` are stored in pages of this many values (each page
+# one document, i.e. independent of the 16MB document limit); stored handovers
+# expire after `HANDOVER_TTL_SECONDS` (MongoDB TTL index)
+HANDOVER_PAGE_SIZE = int(environ.get("BYCON_HANDOVER_PAGE_SIZE", 100000))
+HANDOVER_TTL_SECONDS = int(environ.get("BYCON_HANDOVER_TTL_SECONDS", 7 * 24 * 3600))
+HANDOVER_COMPRESSION = environ.get("BYCON_HANDOVER_COMPRESSION", "true").lower() in ["1", "true", "yes"]
+
+# opt-in cache for the dataset query results (see `query_cache.py`); the
+# entries are bound to the dataset data versions which are updated by the
+# importers & housekeepers
+HOUSEKEEPING_QUERY_CACHE_COLL = "querycache"
+HOUSEKEEPING_DATA_VERSIONS_COLL = "dataversions"
+QUERY_CACHE_ENABLED = environ.get("BYCON_QUERY_CACHE", "").lower() in ["1", "true", "yes"]
+QUERY_CACHE_TTL_SECONDS = int(environ.get("BYCON_QUERY_CACHE_TTL_SECONDS", 24 * 3600))
+QUERY_CACHE_MAX_ENTRIES = int(environ.get("BYCON_QUERY_CACHE_MAX_ENTRIES", 1000))
+QUERY_CACHE_MEMORY_ENTRIES = int(environ.get("BYCON_QUERY_CACHE_MEMORY_ENTRIES", 64))
+# the data versions are re-read from the database after this many seconds
+DATA_VERSION_TTL_SECONDS = int(environ.get("BYCON_DATA_VERSION_TTL_SECONDS", 30))
 
 SERVICES_DB = "_byconServicesDB"
 GENES_COLL = "genes"
 GEOLOCS_COLL = "geolocs"
 
+# maximum number of values per `$in` query for batched record retrieval
+DB_IN_QUERY_CHUNK_SIZE = 1000
+
+#------------------------------------------------------------------------------#
+# Shared database client
+#------------------------------------------------------------------------------#
+
+# one client (with its connection pool & monitor threads) per process id, so that
+# forked worker processes don't re-use the connections of their parent
+MONGO_CLIENTS = {}
+MONGO_CLIENTS_LOCK = threading.Lock()
+
+def get_mongo_client():
+    """
+    Returns the lazily created, process-wide `MongoClient` which should be used
+    for all database access instead of creating new clients.
+    """
+    pid = getpid()
+    if (client := MONGO_CLIENTS.get(pid)) is not None:
+        return client
+    with MONGO_CLIENTS_LOCK:
+        if (client := MONGO_CLIENTS.get(pid)) is None:
+            c_o = {}
+            for o, e in DB_MONGO_CLIENT_OPTIONS.items():
+                if (v := environ.get(e)):
+                    c_o.update({o: int(v)})
+            client = MongoClient(host=DB_MONGOHOST, **c_o)
+            MONGO_CLIENTS.update({pid: client})
+    return client
+
+
+def close_mongo_client():
+    """
+    Closes the shared client of the current process; registered to run at
+    process end but can be called explicitly.
+    """
+    if (client := MONGO_CLIENTS.pop(getpid(), None)) is not None:
+        client.close()
+
+
+atexit.register(close_mongo_client)
+
+#------------------------------------------------------------------------------#
+# Dataset database names
+#------------------------------------------------------------------------------#
+
+# the names of the dataset databases, loaded on the first `database_names()` call
+_DATABASE_NAMES = None
+_DATABASE_NAMES_LOCK = threading.Lock()
+
+def database_names():
+    """
+    Returns the names of the dataset databases, from the `DATABASE_NAMES`
+    environment variable (space separated) or from the MongoDB server; these
+    are only loaded on the first call, so that importing `bycon` doesn't need
+    a database round trip.
+    """
+    global _DATABASE_NAMES
+    if _DATABASE_NAMES is not None:
+        return _DATABASE_NAMES
+    with _DATABASE_NAMES_LOCK:
+        if _DATABASE_NAMES is not None:
+            return _DATABASE_NAMES
+        if "DATABASE_NAMES" in environ:
+            db_names = environ["DATABASE_NAMES"].split()
+        else:
+            db_names = get_mongo_client().list_database_names()
+            db_names = [x for x in db_names if x not in [HOUSEKEEPING_DB, SERVICES_DB, "admin", "config", "local"]]
+        _DATABASE_NAMES = db_names
+    return _DATABASE_NAMES
+
+
 ################################################################################
 # to be modified during execution ##############################################
 ################################################################################
 
-if "DATABASE_NAMES" in environ:
-    db_names = environ["DATABASE_NAMES"].split()
-else:
-    mongo_client = MongoClient(host=DB_MONGOHOST)
-    db_names = list(mongo_client.list_database_names())
-    db_names = [x for x in db_names if x not in [HOUSEKEEPING_DB, SERVICES_DB, "admin", "config", "local"]]
-
 BYC = {
   "DEBUG_MODE": False,
   "TEST_MODE": False,
@@ -60,7 +166,6 @@ BYC = {
   "USER": "anonymous",
 
   "BYC_DATASET_IDS": [],
-  "DATABASE_NAMES": db_names,
   "BYC_FILTERS": [],
 
   "beacon_defaults": {
@@ -1,4 +1,5 @@
-import json, requests, sys
+import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from deepmerge import always_merger
 from os import environ
@@ -7,6 +8,7 @@ from config import *
 
 from bycon_helpers import *
 from handover_generation import dataset_response_add_handovers
+from handover_storage import handover_save
 from query_execution import ByconDatasetResults # execute_bycon_queries
 from query_generation import ByconQuery
 from response_remapping import *
@@ -614,7 +616,7 @@ class ByconCollections:
         results = []
         stat = []
 
-        stats = MongoClient(host=DB_MONGOHOST)[HOUSEKEEPING_DB][HOUSEKEEPING_INFO_COLL].find( { }, { "_id": 0 } ).sort( {"date": -1} ).limit( 1 )
+        stats = get_mongo_client()[HOUSEKEEPING_DB][HOUSEKEEPING_INFO_COLL].find( { }, { "_id": 0 } ).sort( {"date": -1} ).limit( 1 )
         stats = list(stats)
 
         if len(stats) > 0:
@@ -663,7 +665,7 @@ class ByconCollections:
                     ]
                 }
 
-        mongo_client = MongoClient(host=DB_MONGOHOST)
+        mongo_client = get_mongo_client()
         for ds_id in BYC["BYC_DATASET_IDS"]:
             mongo_db = mongo_client[ ds_id ]        
             mongo_coll = mongo_db[ "collations" ]
@@ -762,22 +764,17 @@ class ByconResultSets:
     # -------------------------------------------------------------------------#
 
     def __result_sets_save_handovers(self):
-        ho_client = MongoClient(host=DB_MONGOHOST)
-        ho_coll = ho_client[HOUSEKEEPING_DB][HOUSEKEEPING_HO_COLL]
+        # the values are stored in pages, i.e. w/o size limit
         for ds_id, d_s in self.datasets_results.items():
             if not d_s:
                 continue
-            info = {"counts": {}}
             for h_o_k, h_o in d_s.items():
                 if not "target_values" in h_o:
                     continue
-                h_o_size = sys.getsizeof(h_o["target_values"])        
-                dbm = f'Storage size for {ds_id}.{h_o_k}: {h_o_size / 1000}kb'
-                prdbug(dbm)
-                # TODO: warning/error for exclusion due to size (breaking the MongoDB storage...)
-                if h_o_size < 15000000:
-                    ho_coll.update_one( { "id": h_o["id"] }, { '$set': h_o }, upsert=True )
-        ho_client.close()
+                # handovers of the query cache are already stored
+                if "page_version" in h_o:
+                    continue
+                handover_save(h_o)
 
 
     # -------------------------------------------------------------------------#
@@ -803,11 +800,21 @@ class ByconResultSets:
 
     def __retrieve_datasets_results(self):
         ds_r_start = datetime.datetime.now()
-        for i, r_set in enumerate(self.result_sets):
-            ds_id = r_set.get("id", "___none___")
-            DR = ByconDatasetResults(ds_id, self.record_queries)
-            ds_res = DR.retrieveResults()
-            self.datasets_results.update({ds_id: ds_res})            
+        ds_ids = [r_set.get("id", "___none___") for r_set in self.result_sets]
+        # opt-in concurrency; the available threads are shared between the
+        # datasets and the prefetch queries inside each dataset
+        ds_threads = min(DB_QUERY_WORKERS, len(ds_ids))
+        q_threads = max(1, DB_QUERY_WORKERS // max(1, ds_threads))
+        if ds_threads > 1:
+            with ThreadPoolExecutor(max_workers=ds_threads) as executor:
+                ds_res_s = list(executor.map(
+                    lambda ds_id: ByconDatasetResults(ds_id, self.record_queries, q_threads).retrieveResults(),
+                    ds_ids
+                ))
+        else:
+            ds_res_s = [ByconDatasetResults(ds_id, self.record_queries, q_threads).retrieveResults() for ds_id in ds_ids]
+        for ds_id, ds_res in zip(ds_ids, ds_res_s):
+            self.datasets_results.update({ds_id: ds_res})
         ds_r_duration = datetime.datetime.now() - ds_r_start
         
         dbm = f'... datasets results querying needed {ds_r_duration.total_seconds()} seconds'
@@ -836,13 +843,10 @@ class ByconResultSets:
             q_v_s = res.get("target_values", [])
             q_v_s = return_paginated_list(q_v_s, self.skip, self.limit)
 
-            mongo_client = MongoClient(host=DB_MONGOHOST)
+            mongo_client = get_mongo_client()
             data_coll = mongo_client[ q_db ][ q_coll ]
 
-            r_s_res = []
-            for q_v in q_v_s:
-                o = data_coll.find_one({q_k: q_v })
-                r_s_res.append(o)
+            r_s_res = list(mongo_records_by_values(data_coll, q_v_s, q_k))
             self.datasets_data.update({ds_id: r_s_res})
 
         ds_d_duration = datetime.datetime.now() - ds_d_start
@@ -861,18 +865,13 @@ class ByconResultSets:
         ds_v_start = datetime.datetime.now()
         for ds_id, ds_results in self.datasets_results.items():
 
-            mongo_client = MongoClient(host=DB_MONGOHOST)
-            data_db = mongo_client[ ds_id ]
+            mongo_client = get_mongo_client()
             v_coll = mongo_client[ ds_id ][ "variants" ]
 
-            r_s_res = []
-
             if "variants.id" in ds_results:
                 q_v_s = ds_results["variants.id"]["target_values"]
                 q_v_s = return_paginated_list(q_v_s, self.skip, self.limit)
-                for v_id in q_v_s:
-                    v = v_coll.find_one({"id":v_id})
-                    r_s_res.append(v)
+                r_s_res = list(mongo_records_by_values(v_coll, q_v_s))
                 self.datasets_data.update({ds_id: r_s_res})
 
         ds_v_duration = datetime.datetime.now() - ds_v_start
@@ -952,7 +951,7 @@ def print_text_response(this="", status_code=200):
 ################################################################################
 
 def print_html_response(this="", status_code=200):
-    if "server" in ENV:
+    if "server" in environ.get("HTTP_HOST", ENV):
         print(f'status: {status_code}')
         print('Content-Type: text/html')
         print()
@@ -0,0 +1,315 @@
+import io, re, sys, threading, traceback
+from copy import deepcopy
+from http import HTTPStatus
+from importlib import import_module
+from os import environ, path
+
+from config import *
+from parameter_parsing import arguments_set_defaults, parse_arguments, parse_filters, rest_path_elements
+from read_specs import read_local_config, update_rootpars_from_HOST
+from service_utils import initialize_bycon_service, set_beacon_defaults, set_entities
+
+################################################################################
+
+"""
+The `ByconApp` WSGI application keeps a single process alive for many requests,
+so that the configuration, schemas, genome resources and the MongoDB connection
+pool (and all other process-wide caches) are only loaded once per worker
+process instead of once per CGI call.
+
+Scope: one request per process, serialized. The request processing code still
+works on the process-wide `BYC`, `BYC_PARS` and `BYC_VARGS` objects (and on
+`os.environ`, `sys.stdin` & `sys.stdout`); this application does *not* remove
+those globals and does not pass a request context through the parsing and
+response code. Each request gets a `ByconRequestContext` whose state is swapped
+into the globals for the duration of the request, under one process lock, so
+a worker process never handles two requests at the same time. Concurrency has
+to come from multiple single threaded worker processes; with a threaded server
+(`wsgi.multithread`) all requests of a worker wait for the same lock, which is
+reported once to the server's error stream.
+
+The request state is not a full copy of the configuration: the (read-only)
+`..._definitions` / `..._mappings` etc. are shared by reference with the state
+after loading the configuration, and only the `BYC` keys listed in
+`REQUEST_STATE_KEYS` (i.e. those which are modified in place during a request)
+as well as the small `BYC_PARS` & `BYC_VARGS` objects are deep-copied. The
+per-request cost is therefore dominated by copying `entity_defaults` and
+`beacon_defaults` (which are merged in place with instance specific values);
+with the package configuration this is ~0.4ms per request instead of ~4ms for
+a copy of the whole configuration (more with large local configurations).
+
+The application is created through `beaconServer/byconApp.py` which has to be
+loaded before any other `bycon` import since it switches `bycon` to the
+application mode (`BYCON_APP_MODE`) where importing `bycon` does not parse a
+request.
+"""
+
+# request dependent initialization steps (after the host specific config)
+REQUEST_INIT_STEPS = [
+    rest_path_elements,
+    set_beacon_defaults,
+    arguments_set_defaults,
+    parse_arguments,
+    set_entities,
+    initialize_bycon_service,
+    parse_filters
+]
+
+# `BYC` values modified in place during a request (e.g. by the instance specific
+# merge of the defaults or by appending errors); these are copied per request,
+# all other `BYC` values are shared and replaced - not modified - by requests
+REQUEST_STATE_KEYS = [
+    "ERRORS",
+    "WARNINGS",
+    "BYC_DATASET_IDS",
+    "BYC_FILTERS",
+    "authorized_granularities",
+    "beacon_defaults",
+    "entity_defaults",
+    "parsed_config_paths",
+    "query_meta",
+    "service_config"
+]
+
+# CGI environment variables provided per request
+REQUEST_ENVIRON_KEYS = [
+    "HTTP_HOST",
+    "REQUEST_URI",
+    "REQUEST_METHOD",
+    "QUERY_STRING",
+    "CONTENT_TYPE",
+    "CONTENT_LENGTH",
+    "HTTP_COOKIE",
+    "REMOTE_ADDR"
+]
+
+################################################################################
+################################################################################
+################################################################################
+
+class ByconApp:
+    def __init__(self, beacon_path=None, services_path=None):
+        """
+        The application object is called by the WSGI server for each request;
+        requests with a `/services/` root are handed to the `services` script in
+        `services_path`, all others to the `beacon` script in `beacon_path`.
+        """
+        self.beacon_path = beacon_path
+        self.services_path = services_path
+        self.handlers = {}
+        self.lock = threading.Lock()
+        self.thread_warning = False
+
+        self.instance_definitions = read_local_config()
+        BYC["parsed_config_paths"].append(LOC_PATH)
+        self.base_state = {
+            "BYC": dict(BYC),
+            "BYC_PARS": deepcopy(BYC_PARS),
+            "BYC_VARGS": deepcopy(BYC_VARGS)
+        }
+        # the request state keys are copied from here, so the instance merge
+        # of one request can't leak into the base state
+        for k in REQUEST_STATE_KEYS:
+            self.base_state["BYC"].update({k: deepcopy(BYC.get(k))})
+
+
+    #--------------------------------------------------------------------------#
+    #----------------------------- public -------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def __call__(self, wsgi_environ, start_response):
+        if wsgi_environ.get("wsgi.multithread") and not self.thread_warning:
+            self.__warn_threaded(wsgi_environ)
+        with self.lock:
+            ctx = ByconRequestContext(wsgi_environ, self.base_state)
+            with ctx:
+                self.__process_request(ctx)
+        status, headers, body = ctx.response()
+        start_response(status, headers)
+        return [body]
+
+
+    #--------------------------------------------------------------------------#
+    #---------------------------- private -------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def __process_request(self, ctx):
+        try:
+            update_rootpars_from_HOST(self.instance_definitions)
+            for init_f in REQUEST_INIT_STEPS:
+                init_f()
+            self.__handler(ctx.request_path_root)()
+        except SystemExit:
+            pass
+        except Exception:
+            ctx.error(traceback.format_exc())
+
+
+    #--------------------------------------------------------------------------#
+
+    def __warn_threaded(self, wsgi_environ):
+        self.thread_warning = True
+        e_s = wsgi_environ.get("wsgi.errors", sys.stderr)
+        e_s.write(
+            "¡¡¡ ByconApp runs under a multithreaded WSGI worker; requests are "
+            "processed one at a time per process - use multiple single threaded "
+            "worker processes instead !!!\n"
+        )
+
+
+    #--------------------------------------------------------------------------#
+
+    def __handler(self, root):
+        """
+        The `beacon.py` and `services.py` scripts are imported once from their
+        directories, and their main functions are used as request handlers.
+        """
+        if root in self.handlers:
+            return self.handlers[root]
+        if root == "services":
+            s_p, m_n, f_n = self.services_path, "services", "services"
+        else:
+            s_p, m_n, f_n = self.beacon_path, "beacon", "main"
+        if s_p and s_p not in sys.path:
+            sys.path.append(s_p)
+        h = getattr(import_module(m_n), f_n)
+        self.handlers.update({root: h})
+        return h
+
+
+################################################################################
+################################################################################
+################################################################################
+
+class ByconRequestContext:
+    def __init__(self, wsgi_environ, base_state):
+        """
+        Request scoped state: the global configuration objects (with copies of
+        the `REQUEST_STATE_KEYS` values and shared read-only values), the CGI
+        style environment, the request body as `stdin` and the captured
+        response output; installed into the process globals while the context
+        is active.
+        """
+        self.wsgi_environ = wsgi_environ
+        self.state = {
+            "BYC": dict(base_state["BYC"]),
+            "BYC_PARS": deepcopy(base_state["BYC_PARS"]),
+            "BYC_VARGS": deepcopy(base_state["BYC_VARGS"])
+        }
+        for k in REQUEST_STATE_KEYS:
+            self.state["BYC"].update({k: deepcopy(base_state["BYC"].get(k))})
+        self.environ = self.__cgi_environ()
+        self.request_path_root = "beacon"
+        if "services" in re.split('/', self.environ.get("REQUEST_URI", "")):
+            self.request_path_root = "services"
+        self.state["BYC"].update({"request_path_root": self.request_path_root})
+        self.stdin = io.StringIO(self.__request_body())
+        self.stdout = io.StringIO()
+        self.__saved = {}
+
+
+    #--------------------------------------------------------------------------#
+    #----------------------------- public -------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def __enter__(self):
+        self.__saved = {
+            "environ": {k: environ.get(k) for k in REQUEST_ENVIRON_KEYS},
+            "stdin": sys.stdin,
+            "stdout": sys.stdout
+        }
+        for k in REQUEST_ENVIRON_KEYS:
+            environ.pop(k, None)
+        environ.update(self.environ)
+        for g_n, g_o in [("BYC", BYC), ("BYC_PARS", BYC_PARS), ("BYC_VARGS", BYC_VARGS)]:
+            g_o.clear()
+            g_o.update(self.state[g_n])
+        sys.stdin = self.stdin
+        sys.stdout = self.stdout
+        return self
+
+
+    #--------------------------------------------------------------------------#
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        sys.stdin = self.__saved["stdin"]
+        sys.stdout = self.__saved["stdout"]
+        for k, v in self.__saved["environ"].items():
+            environ.pop(k, None)
+            if v is not None:
+                environ.update({k: v})
+        return False
+
+
+    #--------------------------------------------------------------------------#
+
+    def error(self, message=""):
+        # same output as the CGI scripts' error handling
+        self.stdout.seek(0)
+        self.stdout.truncate()
+        self.stdout.write(f'Content-Type: text/plain\nstatus: 302\n\n{message}\n')
+
+
+    #--------------------------------------------------------------------------#
+
+    def response(self):
+        """
+        Splits the CGI style output (headers, empty line, body) into the WSGI
+        status, headers and body.
+        """
+        out = self.stdout.getvalue()
+        head, sep, body = out.partition("\n\n")
+        if not sep:
+            head, body = "", out
+        status = 200
+        headers = []
+        for h_l in head.splitlines():
+            h_k, h_sep, h_v = h_l.partition(":")
+            if not h_sep:
+                continue
+            h_k, h_v = h_k.strip(), h_v.strip()
+            if h_k.lower() == "status":
+                if (s_m := re.match(r'^(\d{3})', h_v)):
+                    status = int(s_m.group(1))
+                continue
+            headers.append((h_k, h_v))
+        body = body.encode("utf-8")
+        headers.append(("Content-Length", str(len(body))))
+        try:
+            s_p = HTTPStatus(status).phrase
+        except ValueError:
+            s_p = ""
+        return f'{status} {s_p}'.strip(), headers, body
+
+
+    #--------------------------------------------------------------------------#
+    #---------------------------- private -------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def __cgi_environ(self):
+        w_e = self.wsgi_environ
+        r_u = f'{w_e.get("SCRIPT_NAME", "")}{w_e.get("PATH_INFO", "")}'
+        if (q_s := w_e.get("QUERY_STRING")):
+            r_u += f'?{q_s}'
+        c_e = {
+            "HTTP_HOST": w_e.get("HTTP_HOST", environ.get("HTTP_HOST", "")),
+            "REQUEST_URI": w_e.get("REQUEST_URI", r_u),
+            "REQUEST_METHOD": w_e.get("REQUEST_METHOD", "GET"),
+            "QUERY_STRING": w_e.get("QUERY_STRING", "")
+        }
+        for k in REQUEST_ENVIRON_KEYS:
+            if k not in c_e and (v := w_e.get(k)):
+                c_e.update({k: str(v)})
+        return c_e
+
+
+    #--------------------------------------------------------------------------#
+
+    def __request_body(self):
+        try:
+            c_l = int(self.wsgi_environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            c_l = 0
+        if c_l < 1 or not (w_i := self.wsgi_environ.get("wsgi.input")):
+            return ""
+        return w_i.read(c_l).decode("utf-8")
@@ -4,7 +4,6 @@ from isodate import parse_duration
 from datetime import datetime
 from os import environ
 from pathlib import Path
-from pymongo import MongoClient
 
 from config import *
 
@@ -133,13 +132,16 @@ def select_this_server() -> str:
     encryption. OTOH for local testing one may need to stick w/ http if no pseudo-
     https scenario had been implemented. Therefore handover addresses etc. will
     always use https _unless_ the request comes from a host listed a test instance.
+    The host is read from the request environment (and not from `ENV` at import
+    time) since in the application mode a process serves requests for several
+    domains.
     """
     s_uri = str(environ.get('SCRIPT_URI'))
     test_sites = BYC["beacon_defaults"].get("test_domains", [])
     https = "https://"
     http = "http://"
 
-    s = f'{https}{ENV}'
+    s = f'{https}{environ.get("HTTP_HOST", ENV)}'
     for site in test_sites:
         if site in s_uri:
             if https in s_uri:
@@ -209,11 +211,24 @@ def return_paginated_list(this, skip, limit):
 
     BYC.update({"PAGINATED_STATUS": True})
 
+    if not (p_range := paginated_range(len(this), skip, limit)):
+        return []
+
+    return this[p_range[0]:p_range[-1]]
+
+
+################################################################################
+
+def paginated_range(t_no, skip, limit):
+    """
+    Returns the `[start, end]` indexes of the `skip`/`limit` page for a list
+    of `t_no` items (or `None` if out of range), e.g. for reading only the
+    needed part of stored handover values.
+    """
     p_range = [
         skip * limit,
         skip * limit + limit,
     ]
-    t_no = len(this)
     r_l_i = t_no - 1
 
     if p_range[0] > r_l_i:
@@ -222,9 +237,9 @@ def return_paginated_list(this, skip, limit):
         p_range[-1] = t_no
 
     if p_range[0] > t_no:
-        return []
+        return None
 
-    return this[p_range[0]:p_range[-1]]
+    return p_range
 
 
 ################################################################################
@@ -232,7 +247,7 @@ def return_paginated_list(this, skip, limit):
 def mongo_result_list(db_name, coll_name, query, fields):
     results = []
 
-    mongo_client = MongoClient(host=DB_MONGOHOST)
+    mongo_client = get_mongo_client()
     db_names = list(mongo_client.list_database_names())
     if db_name not in db_names:
         BYC["ERRORS"].append(f"db `{db_name}` does not exist")
@@ -241,7 +256,6 @@ def mongo_result_list(db_name, coll_name, query, fields):
         results = list(mongo_client[db_name][coll_name].find(query, fields))
     except Exception as e:
         BYC["ERRORS"].append(e)
-    mongo_client.close()
 
     return results
 
@@ -254,7 +268,7 @@ def mongo_test_mode_query(db_name, coll_name):
     ids = []
     t_m_c = BYC_PARS.get("test_mode_count", 5)
 
-    mongo_client = MongoClient(host=DB_MONGOHOST)
+    mongo_client = get_mongo_client()
     db_names = list(mongo_client.list_database_names())
     if db_name not in db_names:
         BYC["ERRORS"].append(f"db `{db_name}` does not exist")
@@ -265,12 +279,70 @@ def mongo_test_mode_query(db_name, coll_name):
     except Exception as e:
         BYC["ERRORS"].append(e)
 
-    mongo_client.close()
     query = {"id": {"$in": ids}}
 
     return query
 
 
+################################################################################
+
+def mongo_records_by_values(coll, values, key="id", fields=None, chunk_size=DB_IN_QUERY_CHUNK_SIZE):
+    """
+    Retrieves the records matching the (top-level) `key` values from the
+    collection through chunked `{key: {"$in": [...]}}` queries instead of single
+    `find_one` calls. Records are yielded in the order of the provided values
+    (e.g. the handover `target_values`); values w/o a record are skipped and
+    only the first record per value is returned.
+    A `fields` projection is supported; the key is added to inclusion
+    projections for the re-ordering and removed again from the records.
+    """
+    values = list(values)
+    if chunk_size < 1:
+        chunk_size = len(values) or 1
+    k_added = False
+    if fields:
+        fields = dict(fields)
+        if any(v for f, v in fields.items() if f != "_id"):
+            if not fields.get(key):
+                fields.update({key: 1})
+                k_added = True
+        elif key in fields:
+            fields.pop(key)
+            k_added = True
+        if len(fields) < 1:
+            fields = None
+
+    for c_i in range(0, len(values), chunk_size):
+        c_v_s = values[c_i:c_i + chunk_size]
+        c_recs = {}
+        for rec in coll.find({key: {"$in": list(set(c_v_s))}}, fields):
+            if (k_v := rec.get(key)) not in c_recs:
+                c_recs.update({k_v: rec})
+        for v in c_v_s:
+            if (rec := c_recs.get(v)) is None:
+                continue
+            if k_added:
+                rec = {r_k: r_v for r_k, r_v in rec.items() if r_k != key}
+            yield rec
+
+
+################################################################################
+
+def mongo_existing_values(coll, values, key="id", chunk_size=DB_IN_QUERY_CHUNK_SIZE):
+    """
+    Returns the set of the provided values which exist as (top-level) `key`
+    values in the collection, from chunked `distinct` queries with `$in`
+    instead of single `find_one` existence checks.
+    """
+    values = list(set(values))
+    if chunk_size < 1:
+        chunk_size = len(values) or 1
+    e_v_s = set()
+    for c_i in range(0, len(values), chunk_size):
+        e_v_s.update(coll.distinct(key, {key: {"$in": values[c_i:c_i + chunk_size]}}))
+    return e_v_s
+
+
 ################################################################################
 
 def test_truthy(this):
@@ -405,5 +477,5 @@ def load_yaml_empty_fallback(yp):
     if not f.is_file():
         return y
     with open( yp ) as yd:
-        y = yaml.load( yd , Loader=yaml.FullLoader)
+        y = yaml.load( yd , Loader=YAML_LOADER)
     return y
@@ -1,9 +1,10 @@
 import csv, re
+from bisect import bisect_left, bisect_right
 from os import path
 
 from bycon_helpers import prdbug
 from config import *
-from genome_utils import ChroNames
+from genome_utils import ChroNames, genome_resource
 
 ################################################################################
 ################################################################################
@@ -26,9 +27,12 @@ class Cytobands():
         self.end = None
         self.ChroNames = ChroNames()
         self.cytoband_response = {}
-        self.sorted_chros = BYC["interval_definitions"]["chromosomes"]
 
-        self.__parse_cytoband_file()
+        # the parsed cytobands are shared process-wide & must not be modified
+        c_b_d = genome_resource("cytobands", _parse_cytoband_file)
+        self.cytobands = c_b_d["cytobands"]
+        self.cytolimits = c_b_d["cytolimits"]
+        self.genome_size = c_b_d["genome_size"]
 
 
     # -------------------------------------------------------------------------#
@@ -132,44 +136,6 @@ class Cytobands():
     # -------------------------------------------------------------------------#
     # -------------------------------------------------------------------------#
 
-    def __parse_cytoband_file(self):
-        g_rsrc_p = self.ChroNames.genomePath()
-        cb_file = path.join(g_rsrc_p, "cytoBandIdeo.txt")
-        cb_keys = [ "chro", "start", "end", "cytoband", "staining" ]
-        i = 0
-        c_bands = [ ]
-        with open(cb_file) as cb_f:                                                                                          
-            for c_band in csv.DictReader(filter(lambda row: row.startswith('#') is False, cb_f), fieldnames=cb_keys, delimiter='\t'):
-                c_bands.append(c_band)
-
-        #--------------------------------------------------------------------------#
-
-        # !!! making sure the chromosomes are sorted !!!
-        # TODO: should be in ChroNames?
-        for chro in self.sorted_chros:
-            chro = str(chro)
-            c_m = f'chr{chro}'
-            chrobands = [ ]
-            for cb in c_bands:
-                if cb["chro"] == c_m:
-                    cb["i"] = i
-                    cb["chro"] = cb["chro"].replace("chr", "")
-                    cb["chroband"] = f'{cb["chro"]}{cb["cytoband"]}'
-                    self.cytobands.append(dict(cb))
-                    chrobands.append(dict(cb))
-                    i += 1
-            self.cytolimits.update({
-                chro: {
-                    "chro": [ int(chrobands[0]["start"]), int(chrobands[-1]["end"]) ],
-                    "size": int(chrobands[-1]["end"]) - int(chrobands[0]["start"]),
-                    "p": arm_base_range("p", chrobands),
-                    "q": arm_base_range("q", chrobands)
-                }
-            })
-            self.genome_size += int(chrobands[-1]["end"])
-
-    #--------------------------------------------------------------------------#
-
     def __bands_from_cytobands(self):
         argdefs = BYC.get("argument_definitions", {})
         cb_pat = re.compile( argdefs["cyto_bands"]["pattern"] )
@@ -286,6 +252,68 @@ class Cytobands():
 
 
 
+################################################################################
+
+def _parse_cytoband_file(g_rsrc_p):
+    """
+    Loader for the `cytobands` genome resource: parses the assembly's
+    `cytoBandIdeo.txt` into the chromosome sorted band list, the chromosome
+    and arm limits and a per chromosome index of band start and end positions
+    for `bisect` based position lookups.
+    """
+    cb_file = path.join(g_rsrc_p, "cytoBandIdeo.txt")
+    cb_keys = [ "chro", "start", "end", "cytoband", "staining" ]
+    i = 0
+    c_bands = [ ]
+    cytobands = [ ]
+    cytolimits = { }
+    band_index = { }
+    genome_size = 0
+    with open(cb_file) as cb_f:
+        for c_band in csv.DictReader(filter(lambda row: row.startswith('#') is False, cb_f), fieldnames=cb_keys, delimiter='\t'):
+            c_bands.append(c_band)
+
+    #--------------------------------------------------------------------------#
+
+    # !!! making sure the chromosomes are sorted !!!
+    # TODO: should be in ChroNames?
+    for chro in BYC["interval_definitions"]["chromosomes"]:
+        chro = str(chro)
+        c_m = f'chr{chro}'
+        chrobands = [ ]
+        for cb in c_bands:
+            if cb["chro"] == c_m:
+                cb["i"] = i
+                cb["chro"] = cb["chro"].replace("chr", "")
+                cb["chroband"] = f'{cb["chro"]}{cb["cytoband"]}'
+                cytobands.append(dict(cb))
+                chrobands.append(dict(cb))
+                i += 1
+        cytolimits.update({
+            chro: {
+                "chro": [ int(chrobands[0]["start"]), int(chrobands[-1]["end"]) ],
+                "size": int(chrobands[-1]["end"]) - int(chrobands[0]["start"]),
+                "p": arm_base_range("p", chrobands),
+                "q": arm_base_range("q", chrobands)
+            }
+        })
+        genome_size += int(chrobands[-1]["end"])
+        band_index.update({
+            chro: {
+                "starts": [int(cb["start"]) for cb in chrobands],
+                "ends": [int(cb["end"]) for cb in chrobands],
+                "bands": cytobands[-len(chrobands):]
+            }
+        })
+
+    return {
+        "cytobands": cytobands,
+        "cytolimits": cytolimits,
+        "genome_size": genome_size,
+        "band_index": band_index
+    }
+
+
 ################################################################################
 
 def match_bands(band, cytobands):
@@ -346,25 +374,29 @@ def bands_from_chrobases(chro_bases):
 ################################################################################
 
 def cytobands_list_from_positions(chro, start=None, end=None):
-    cytobands = Cytobands().get_all_cytobands()
+    """
+    Returns the cytobands overlapping the `start` - `end` range of the
+    chromosome; the bands are found through `bisect` on the sorted band
+    positions of the cached `cytobands` genome resource.
+    """
+    c_b_i = genome_resource("cytobands", _parse_cytoband_file)["band_index"]
     if start:
         start = int(start)
         if not end:
             end = start + 1
         end = int(end)
 
-    cytobands = list(filter(lambda d: d[ "chro" ] == chro, cytobands))
+    if not (c_i := c_b_i.get(chro)):
+        return [], chro, start, end
     if start == None:
         start = 0
     if end == None:
-        end = int( cytoBands[-1]["end"] )
-
-    if isinstance(start, int):
-        cytobands = list(filter(lambda d: int(d[ "end" ]) > start, cytobands))
-    if isinstance(end, int):
-        cytobands = list(filter(lambda d: int(d[ "start" ]) < end, cytobands))
-    else:
-        print(end)
+        end = c_i["ends"][-1]
+
+    # first band ending after start ... last band starting before end
+    b_i = bisect_right(c_i["ends"], int(start))
+    e_i = bisect_left(c_i["starts"], int(end))
+    cytobands = c_i["bands"][b_i:e_i]
 
     return cytobands, chro, start, end
 
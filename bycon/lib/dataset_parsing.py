@@ -1,8 +1,8 @@
 import re
-from pymongo import MongoClient
 from os import environ
 
 from bycon_helpers import prdbug
+from handover_storage import handover_load
 from parameter_parsing import rest_path_value
 from config import *
 
@@ -29,7 +29,7 @@ def ds_id_from_rest_path_value():
 
     ds_ids = []
     for ds_id in ds_p_id.split(","):
-        if ds_id in BYC["DATABASE_NAMES"]:
+        if ds_id in database_names():
             ds_ids.append(ds_id)
 
     if len(ds_ids) < 1:
@@ -64,12 +64,10 @@ def ds_id_from_accessid():
     if not (accessid := BYC_PARS.get("accessid")):
         return False
 
-    ho_client = MongoClient(host=DB_MONGOHOST)
-    h_o = ho_client[HOUSEKEEPING_DB][HOUSEKEEPING_HO_COLL].find_one({"id": accessid})
-    if not h_o:
+    if not (h_o := handover_load(accessid)):
         return False
     ds_id = h_o.get("source_db", False)
-    if (ds_id := str(h_o.get("source_db"))) not in BYC["DATABASE_NAMES"]:
+    if (ds_id := str(h_o.get("source_db"))) not in database_names():
         return False
     BYC.update({"BYC_DATASET_IDS": [ds_id]})
     return True
@@ -80,7 +78,7 @@ def ds_id_from_accessid():
 def ds_ids_from_form():
     if not (f_ds_ids := BYC_PARS.get("dataset_ids")):
         return False
-    ds_ids = [ds for ds in f_ds_ids if ds in BYC.get("DATABASE_NAMES",[])]
+    ds_ids = [ds for ds in f_ds_ids if ds in database_names()]
     if len(ds_ids) > 0:
         BYC.update({"BYC_DATASET_IDS":  ds_ids})
         return True
@@ -91,7 +89,7 @@ def ds_ids_from_form():
 
 def ds_id_from_default():
     defaults: object = BYC["beacon_defaults"].get("defaults", {})  
-    if (ds_id := str(defaults.get("default_dataset_id"))) not in BYC["DATABASE_NAMES"]:
+    if (ds_id := str(defaults.get("default_dataset_id"))) not in database_names():
         return False
     BYC.update({"BYC_DATASET_IDS": [ds_id]})
     return True
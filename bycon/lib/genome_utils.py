@@ -1,6 +1,5 @@
-import csv, datetime, re, yaml
+import csv, datetime, re, threading, yaml
 from os import environ, path, pardir
-from pymongo import MongoClient
 
 # local
 from bycon_helpers import prdbug
@@ -10,14 +9,52 @@ from config import *
 ################################################################################
 ################################################################################
 
+"""
+Process-wide registry of the parsed genome resource files (refseq chromosomes,
+cytobands...), keyed by `(assembly_id, resource name)`. Each resource is parsed
+once on first use by its loader and then shared (read-only!) by all instances
+of e.g. `ChroNames` and `Cytobands`.
+"""
+
+GENOME_RESOURCES = {}
+GENOME_RESOURCES_LOCK = threading.Lock()
+
+def genome_assembly_id():
+    return BYC_PARS.get("assembly_id", "GRCh38").lower()
+
+
+def genome_resource_path(assembly_id=None):
+    # TODO: catch error for missing genome edition
+    if not assembly_id:
+        assembly_id = genome_assembly_id()
+    return path.join( PKG_PATH, "rsrc", "genomes", assembly_id )
+
+
+def genome_resource(name, loader, assembly_id=None):
+    """
+    Returns the cached resource `name` for the assembly, calling
+    `loader(genome_resource_path)` on first access.
+    """
+    if not assembly_id:
+        assembly_id = genome_assembly_id()
+    r_k = (assembly_id, name)
+    if (rsrc := GENOME_RESOURCES.get(r_k)) is None:
+        with GENOME_RESOURCES_LOCK:
+            if (rsrc := GENOME_RESOURCES.get(r_k)) is None:
+                rsrc = loader(genome_resource_path(assembly_id))
+                GENOME_RESOURCES.update({r_k: rsrc})
+    return rsrc
+
+
+################################################################################
+
 class ChroNames:
     def __init__(self):
-        self.refseq_chromosomes = {}
-        self.chro_aliases = {}
-        self.refseq_aliases = {}
-        self.__set_genome_rsrc_path()
-        self.__parse_refseq_file()
-        self.__chro_id_data()
+        self.genome_rsrc_path = genome_resource_path()
+        c_n_d = genome_resource("chro_names", _parse_chro_names)
+        self.refseq_chromosomes = c_n_d["refseq_chromosomes"]
+        self.chro_aliases = c_n_d["chro_aliases"]
+        self.refseq_aliases = c_n_d["refseq_aliases"]
 
 
     # -------------------------------------------------------------------------#
@@ -64,73 +101,60 @@ class ChroNames:
         return self.genome_rsrc_path
 
 
-    # -------------------------------------------------------------------------#
-    # ----------------------------- private -----------------------------------#
-    # -------------------------------------------------------------------------#
-
-    def __set_genome_rsrc_path(self):
-        # TODO: catch error for missing genome edition
-        genome = BYC_PARS.get("assembly_id", "GRCh38").lower()
-        g_rsrc_p = path.join( PKG_PATH, "rsrc", "genomes", genome )
-        self.genome_rsrc_path = g_rsrc_p
-        self.refseq_file = path.join( g_rsrc_p, "refseq_chromosomes.yaml") 
-
-
-    # -------------------------------------------------------------------------#
-
-    def __parse_refseq_file(self):
-        with open(self.refseq_file) as f:
-            self.refseq_chromosomes = yaml.load( f , Loader=yaml.FullLoader)
-
-
-    # -------------------------------------------------------------------------#
-
-    def __chro_id_data(self):
-        """
-        Input: "refseq_chromosomes" object:
-        Example:
-        ```
-          chr3:
-            chr: "3"
-            genbank_id: "CM000665.2"
-            refseq_id: "refseq:NC_000003.12"
-            length: 198295559
-        ```
-        Return:
-          - "refseq_aliases": all alternative names for a refseq id are keys
-              - "15": "refseq:NC_000015.10"
-              - "chr15": "refseq:NC_000015.10"
-              - "refseq:NC_000015.10": "refseq:NC_000015.10"
-              - "NC_000015.10": "refseq:NC_000015.10"
-              - "CM000677.2": "refseq:NC_000015.10"
-            "chro_aliases": all aliases for a stripped chromosome name
-              - "15": "15"
-              - "chr15": "15"
-              - "refseq:NC_000015.10": "15"
-              - "NC_000015.10": "15"
-              - "CM000677.2": "15"
-        """
-
-        v_d_refsc = self.refseq_chromosomes
-        if not v_d_refsc:
-            return
+################################################################################
 
-        for c, c_d in v_d_refsc.items():
-            refseq_stripped = re.sub("refseq:", "", c_d["refseq_id"])
-            self.refseq_aliases.update({
-                c: c_d["refseq_id"],
-                c_d["chr"]: c_d["refseq_id"],
-                c_d["refseq_id"]: c_d["refseq_id"],
-                refseq_stripped: c_d["refseq_id"],
-                c_d["genbank_id"]: c_d["refseq_id"]
-            }),
-            self.chro_aliases.update({
-                c: c_d["chr"],
-                c_d["chr"]: c_d["chr"],
-                c_d["refseq_id"]: c_d["chr"],
-                refseq_stripped: c_d["chr"],
-                c_d["genbank_id"]: c_d["chr"]
-            })
+def _parse_chro_names(g_rsrc_p):
+    """
+    Input: "refseq_chromosomes" object:
+    Example:
+    ```
+      chr3:
+        chr: "3"
+        genbank_id: "CM000665.2"
+        refseq_id: "refseq:NC_000003.12"
+        length: 198295559
+    ```
+    Return:
+      - "refseq_aliases": all alternative names for a refseq id are keys
+          - "15": "refseq:NC_000015.10"
+          - "chr15": "refseq:NC_000015.10"
+          - "refseq:NC_000015.10": "refseq:NC_000015.10"
+          - "NC_000015.10": "refseq:NC_000015.10"
+          - "CM000677.2": "refseq:NC_000015.10"
+        "chro_aliases": all aliases for a stripped chromosome name
+          - "15": "15"
+          - "chr15": "15"
+          - "refseq:NC_000015.10": "15"
+          - "NC_000015.10": "15"
+          - "CM000677.2": "15"
+    """
+    refseq_aliases = {}
+    chro_aliases = {}
+    with open(path.join(g_rsrc_p, "refseq_chromosomes.yaml")) as f:
+        v_d_refsc = yaml.load( f , Loader=YAML_LOADER)
+
+    for c, c_d in (v_d_refsc or {}).items():
+        refseq_stripped = re.sub("refseq:", "", c_d["refseq_id"])
+        refseq_aliases.update({
+            c: c_d["refseq_id"],
+            c_d["chr"]: c_d["refseq_id"],
+            c_d["refseq_id"]: c_d["refseq_id"],
+            refseq_stripped: c_d["refseq_id"],
+            c_d["genbank_id"]: c_d["refseq_id"]
+        })
+        chro_aliases.update({
+            c: c_d["chr"],
+            c_d["chr"]: c_d["chr"],
+            c_d["refseq_id"]: c_d["chr"],
+            refseq_stripped: c_d["chr"],
+            c_d["genbank_id"]: c_d["chr"]
+        })
+
+    return {
+        "refseq_chromosomes": v_d_refsc,
+        "chro_aliases": chro_aliases,
+        "refseq_aliases": refseq_aliases
+    }
 
 
 ################################################################################
@@ -213,7 +237,7 @@ class GeneInfo:
     # -------------------------------------------------------------------------#
 
     def __gene_id_data(self, gene_id, single=True):
-        mongo_client = MongoClient(host=DB_MONGOHOST)
+        mongo_client = get_mongo_client()
         db_names = list(mongo_client.list_database_names())
         if SERVICES_DB not in db_names:
             BYC["ERRORS"].append(f"services db `{SERVICES_DB}` does not exist")
@@ -1,5 +1,4 @@
 import re
-from pymongo import MongoClient
 from pathlib import Path
 from os import environ, pardir, path
 import sys
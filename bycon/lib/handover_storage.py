@@ -0,0 +1,181 @@
+import zlib
+from uuid import uuid4
+from bson import Binary, decode, encode
+from datetime import datetime, timezone
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+from bycon_helpers import prdbug
+from config import *
+
+################################################################################
+
+"""
+Handover objects (the stored results of a query, retrieved through their
+`accessid`) are kept in the housekeeping database as
+
+* one document per handover in `querybuffer` with all handover properties except
+  the `target_values` and the `page_size` and `page_count` of the value pages
+* one document per page of up to `HANDOVER_PAGE_SIZE` `target_values` (in
+  their original order) in `querybuffer_pages`, optionally as zlib compressed
+  BSON array; the pages of a save carry a `page_version` which is referenced
+  by the handover document
+
+so that the size of a handover is not limited by the 16MB document limit and
+the values can be read page by page. Both collections have a TTL index on the
+`stored` timestamp for the expiry of handovers after `HANDOVER_TTL_SECONDS`.
+Handovers stored in the previous single document format (with `target_values`)
+are still read.
+"""
+
+HANDOVER_STORE_STATUS = {"indexed": False}
+
+################################################################################
+
+def handover_save(h_o):
+    """
+    Stores the handover object with its `target_values` in pages; existing
+    pages of the same handover id are replaced. The `page_version` of the
+    stored pages is set in the handover object; returns the number of pages.
+
+    The new pages are written under a new `page_version` before the handover
+    document is switched to it and only then the previous pages are removed,
+    so that concurrent readers always see a complete set of pages.
+    """
+    if not (ho_id := h_o.get("id")):
+        return 0
+    ho_db = get_mongo_client()[HOUSEKEEPING_DB]
+    __handover_store_indexes(ho_db)
+
+    t_v_s = list(h_o.get("target_values", []))
+    p_s = max(1, HANDOVER_PAGE_SIZE)
+    p_v = str(uuid4())
+    stored = datetime.now(timezone.utc)
+
+    p_coll = ho_db[HOUSEKEEPING_HO_PAGES_COLL]
+    pages = []
+    for p_i, v_i in enumerate(range(0, len(t_v_s), p_s)):
+        pages.append({
+            "handover_id": ho_id,
+            "page_version": p_v,
+            "page": p_i,
+            "values": __encode_page(t_v_s[v_i:v_i + p_s]),
+            "stored": stored
+        })
+    if len(pages) > 0:
+        p_coll.insert_many(pages, ordered=False)
+
+    h_o_s = {k: v for k, v in h_o.items() if k not in ["_id", "target_values"]}
+    h_o_s.update({
+        "page_size": p_s,
+        "page_count": len(pages),
+        "page_version": p_v,
+        "stored": stored
+    })
+    ho_db[HOUSEKEEPING_HO_COLL].replace_one({"id": ho_id}, h_o_s, upsert=True)
+    p_coll.delete_many({"handover_id": ho_id, "page_version": {"$ne": p_v}})
+    h_o.update({"page_version": p_v})
+    prdbug(f'... stored handover {ho_id} with {len(t_v_s)} values in {len(pages)} pages')
+
+    return len(pages)
+
+
+################################################################################
+
+def handover_load(accessid):
+    """
+    Returns the stored handover object (w/o its paged `target_values`) or
+    `None`.
+    """
+    if not accessid:
+        return None
+    return get_mongo_client()[HOUSEKEEPING_DB][HOUSEKEEPING_HO_COLL].find_one({"id": accessid}, {"_id": 0})
+
+
+################################################################################
+
+def handover_values(h_o, start=0, end=None):
+    """
+    Returns the `target_values[start:end]` of a stored handover, reading only
+    the pages covering the range.
+    """
+    if "target_values" in h_o:
+        return h_o["target_values"][start:end]
+    t_c = h_o.get("target_count", 0)
+    end = t_c if end is None else min(end, t_c)
+    if (p_s := h_o.get("page_size", 0)) < 1 or start >= end:
+        return []
+    p_f = start // p_s
+    t_v_s = []
+    for vals in handover_value_pages(h_o, p_f, (end - 1) // p_s):
+        t_v_s += vals
+    return t_v_s[start - p_f * p_s:end - p_f * p_s]
+
+
+################################################################################
+
+def handover_value_pages(h_o, first_page=0, last_page=None):
+    """
+    Yields the `target_values` of a stored handover page by page, e.g. for
+    processing large handovers w/o loading all values.
+    """
+    if "target_values" in h_o:
+        yield h_o["target_values"]
+        return
+    if last_page is None:
+        last_page = h_o.get("page_count", 0) - 1
+    if last_page < first_page:
+        return
+    p_q = {"handover_id": h_o.get("id"), "page": {"$gte": first_page, "$lte": last_page}}
+    if (p_v := h_o.get("page_version")):
+        p_q.update({"page_version": p_v})
+    p_coll = get_mongo_client()[HOUSEKEEPING_DB][HOUSEKEEPING_HO_PAGES_COLL]
+    for p in p_coll.find(p_q, {"_id": 0, "values": 1}).sort("page", ASCENDING):
+        yield __decode_page(p["values"])
+
+
+################################################################################
+
+def handover_delete(ho_ids=[]):
+    """
+    Removes the stored handovers with their value pages.
+    """
+    if len(ho_ids := list(ho_ids)) < 1:
+        return 0
+    ho_db = get_mongo_client()[HOUSEKEEPING_DB]
+    ho_db[HOUSEKEEPING_HO_PAGES_COLL].delete_many({"handover_id": {"$in": ho_ids}})
+    return ho_db[HOUSEKEEPING_HO_COLL].delete_many({"id": {"$in": ho_ids}}).deleted_count
+
+
+################################################################################
+
+def __encode_page(values):
+    if HANDOVER_COMPRESSION:
+        return Binary(zlib.compress(encode({"v": values})))
+    return values
+
+
+################################################################################
+
+def __decode_page(values):
+    if isinstance(values, bytes):
+        return decode(zlib.decompress(values))["v"]
+    return values
+
+
+################################################################################
+
+def __handover_store_indexes(ho_db):
+    """
+    The TTL and page indexes are created once per process.
+    """
+    if HANDOVER_STORE_STATUS["indexed"]:
+        return
+    try:
+        for c_n in [HOUSEKEEPING_HO_COLL, HOUSEKEEPING_HO_PAGES_COLL]:
+            ho_db[c_n].create_index("stored", expireAfterSeconds=HANDOVER_TTL_SECONDS)
+        ho_db[HOUSEKEEPING_HO_PAGES_COLL].create_index([("handover_id", ASCENDING), ("page_version", ASCENDING), ("page", ASCENDING)])
+    except OperationFailure as e:
+        # e.g. an existing TTL index with a different expiry time
+        prdbug(f'... handover store index creation: {e}')
+    HANDOVER_STORE_STATUS.update({"indexed": True})
@@ -191,11 +191,13 @@ def rest_path_elements():
     url_p = url_comps.path
     p_items = re.split('/', url_p)
 
-    if not REQUEST_PATH_ROOT in p_items:
+    # the root can be set per request, e.g. in the `ByconApp` application mode
+    r_p_r = BYC.get("request_path_root", REQUEST_PATH_ROOT)
+    if not r_p_r in p_items:
         return
 
     p_items = list(filter(None, p_items))
-    r_i = p_items.index(REQUEST_PATH_ROOT)
+    r_i = p_items.index(r_p_r)
 
     if len(p_items) == r_i + 1:
         BYC.update({"request_entity_path_id": "info"})
@@ -0,0 +1,259 @@
+import hashlib, json, threading, time
+from collections import OrderedDict
+from copy import deepcopy
+from datetime import datetime, timezone
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+from uuid import uuid4
+
+from bycon_helpers import prdbug
+from config import *
+from handover_storage import handover_delete, handover_load, handover_save, handover_values
+
+################################################################################
+
+"""
+The (opt-in, `BYCON_QUERY_CACHE=true`) query cache keeps the handover shaped
+results of `ByconDatasetResults` for identical queries, i.e. the same dataset,
+response entity and (canonically serialized) dataset queries. The cache key also
+contains the data version stamp of the dataset from the `dataversions`
+collection, which is changed (and the dataset's cache entries removed) through
+`dataset_data_version_update` whenever importers or housekeepers modify the
+dataset.
+
+Entries are kept
+
+* in a small in-process LRU cache (e.g. for the persistent application mode)
+* in the `querycache` collection of the housekeeping database, with the result
+  values stored as paged handovers (see `handover_storage.py`), a TTL index for
+  expiry and removal of the least recently used entries beyond
+  `QUERY_CACHE_MAX_ENTRIES`
+
+Removed entries (trimmed or invalidated) are deleted together with their result
+handovers and value pages.
+
+The stored result handovers are also the handovers of the response: results of
+a cache miss are stored once (under their cache handover ids, replacing the
+per-request ids) and cache hits return these ids with their `page_version`, so
+that the response doesn't write the values again.
+
+The data versions are kept in-process for `DATA_VERSION_TTL_SECONDS`, i.e. a
+data modification by another process is seen by the cache with this delay.
+"""
+
+QUERY_CACHE_MEMORY = OrderedDict()
+QUERY_CACHE_LOCK = threading.Lock()
+QUERY_CACHE_STATUS = {"indexed": False}
+# dataset id => (time read, data version)
+DATA_VERSIONS = {}
+
+################################################################################
+################################################################################
+################################################################################
+
+class ByconQueryCache:
+    def __init__(self, ds_id, queries={}):
+        self.dataset_id = ds_id
+        self.queries = queries
+        self.enabled = QUERY_CACHE_ENABLED and len(queries) > 0
+        self.cache_key = None
+        if self.enabled:
+            self.cache_key = self.__cache_key()
+
+
+    #--------------------------------------------------------------------------#
+    #----------------------------- public -------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def cachedResults(self):
+        """
+        Returns a copy of the cached dataset results (with the ids of their
+        stored handovers) or `None`.
+        """
+        if not self.enabled:
+            return None
+        if (d_r := self.__memory_results()) is None:
+            if (d_r := self.__stored_results()) is None:
+                return None
+            self.__memory_add(d_r)
+        prdbug(f'... using cached query results for {self.dataset_id}')
+        d_r = deepcopy(d_r)
+        for h_o in d_r.values():
+            # results which could not be stored get new handover ids
+            if not "page_version" in h_o:
+                h_o.update({"id": str(uuid4())})
+        return d_r
+
+
+    #--------------------------------------------------------------------------#
+
+    def storeResults(self, dataset_results):
+        """
+        Stores the results; on success the handover ids & page versions of
+        `dataset_results` are replaced by those of the stored handovers.
+        """
+        if not self.enabled or not dataset_results:
+            return
+        d_r = deepcopy(dataset_results)
+        try:
+            self.__store(d_r)
+            for r_k, h_o in d_r.items():
+                dataset_results[r_k].update({"id": h_o["id"], "page_version": h_o["page_version"]})
+        except OperationFailure as e:
+            prdbug(f'... query results could not be cached: {e}')
+            d_r = deepcopy(dataset_results)
+        self.__memory_add(d_r)
+
+
+    #--------------------------------------------------------------------------#
+    #---------------------------- private -------------------------------------#
+    #--------------------------------------------------------------------------#
+
+    def __cache_key(self):
+        k_o = {
+            "dataset_id": self.dataset_id,
+            "data_version": dataset_data_version(self.dataset_id),
+            "response_entity_id": BYC.get("response_entity_id", "___none___"),
+            "response_collection": BYC.get("response_entity", {}).get("collection", "___none___"),
+            "queries": self.queries
+        }
+        k_s = json.dumps(k_o, sort_keys=True, default=str, separators=(",", ":"))
+        return hashlib.sha256(k_s.encode("utf-8")).hexdigest()
+
+
+    #--------------------------------------------------------------------------#
+
+    def __memory_results(self):
+        with QUERY_CACHE_LOCK:
+            if not (m_e := QUERY_CACHE_MEMORY.get(self.cache_key)):
+                return None
+            if time.time() - m_e[0] > QUERY_CACHE_TTL_SECONDS:
+                QUERY_CACHE_MEMORY.pop(self.cache_key)
+                return None
+            QUERY_CACHE_MEMORY.move_to_end(self.cache_key)
+            return m_e[1]
+
+
+    #--------------------------------------------------------------------------#
+
+    def __memory_add(self, d_r):
+        with QUERY_CACHE_LOCK:
+            QUERY_CACHE_MEMORY.update({self.cache_key: (time.time(), d_r)})
+            QUERY_CACHE_MEMORY.move_to_end(self.cache_key)
+            while len(QUERY_CACHE_MEMORY) > max(0, QUERY_CACHE_MEMORY_ENTRIES):
+                QUERY_CACHE_MEMORY.popitem(last=False)
+
+
+    #--------------------------------------------------------------------------#
+
+    def __stored_results(self):
+        c_coll = get_mongo_client()[HOUSEKEEPING_DB][HOUSEKEEPING_QUERY_CACHE_COLL]
+        if not (c_e := c_coll.find_one({"id": self.cache_key})):
+            return None
+        d_r = {}
+        for r_k, ho_id in c_e.get("results", {}).items():
+            # the handover may have expired before the cache entry
+            if not (h_o := handover_load(ho_id)):
+                return None
+            h_o.update({"target_values": handover_values(h_o)})
+            for k in ["page_size", "page_count", "stored"]:
+                h_o.pop(k, None)
+            d_r.update({r_k: h_o})
+        c_coll.update_one({"id": self.cache_key}, {"$set": {"accessed": datetime.now(timezone.utc)}})
+        return d_r
+
+
+    #--------------------------------------------------------------------------#
+
+    def __store(self, d_r):
+        h_db = get_mongo_client()[HOUSEKEEPING_DB]
+        c_coll = h_db[HOUSEKEEPING_QUERY_CACHE_COLL]
+        self.__cache_indexes(c_coll)
+        r_ids = {}
+        for r_k, h_o in d_r.items():
+            ho_id = f'querycache-{self.cache_key}-{r_k}'
+            h_o.update({"id": ho_id})
+            handover_save(h_o)
+            r_ids.update({r_k: ho_id})
+        now = datetime.now(timezone.utc)
+        c_coll.replace_one({"id": self.cache_key}, {
+            "id": self.cache_key,
+            "dataset_id": self.dataset_id,
+            "data_version": dataset_data_version(self.dataset_id),
+            "results": r_ids,
+            "stored": now,
+            "accessed": now
+        }, upsert=True)
+
+        # least recently used entries beyond the maximum are removed
+        if (c_no := c_coll.estimated_document_count()) > QUERY_CACHE_MAX_ENTRIES:
+            old = c_coll.find({}, {"id": 1, "results": 1}).sort("accessed", ASCENDING).limit(c_no - QUERY_CACHE_MAX_ENTRIES)
+            query_cache_entries_delete(c_coll, list(old))
+
+
+    #--------------------------------------------------------------------------#
+
+    def __cache_indexes(self, c_coll):
+        if QUERY_CACHE_STATUS["indexed"]:
+            return
+        try:
+            c_coll.create_index("id")
+            c_coll.create_index("accessed")
+            c_coll.create_index("stored", expireAfterSeconds=QUERY_CACHE_TTL_SECONDS)
+        except OperationFailure as e:
+            prdbug(f'... query cache index creation: {e}')
+        QUERY_CACHE_STATUS.update({"indexed": True})
+
+
+################################################################################
+################################################################################
+################################################################################
+
+def dataset_data_version(ds_id):
+    """
+    Returns the current data version stamp of the dataset (`"0"` if the dataset
+    has not been modified since versions are tracked); read from the database
+    at most every `DATA_VERSION_TTL_SECONDS`.
+    """
+    if (d_v := DATA_VERSIONS.get(ds_id)) and time.time() - d_v[0] < DATA_VERSION_TTL_SECONDS:
+        return d_v[1]
+    v_coll = get_mongo_client()[HOUSEKEEPING_DB][HOUSEKEEPING_DATA_VERSIONS_COLL]
+    d_v = v_coll.find_one({"id": ds_id}) or {}
+    d_v = str(d_v.get("data_version", "0"))
+    DATA_VERSIONS.update({ds_id: (time.time(), d_v)})
+    return d_v
+
+
+################################################################################
+
+def dataset_data_version_update(ds_id):
+    """
+    Sets a new data version stamp for the dataset and removes its query cache
+    entries; to be called after any modification of the dataset's records.
+    """
+    h_db = get_mongo_client()[HOUSEKEEPING_DB]
+    d_v = str(uuid4())
+    h_db[HOUSEKEEPING_DATA_VERSIONS_COLL].update_one(
+        {"id": ds_id},
+        {"$set": {"data_version": d_v, "updated": datetime.now(timezone.utc).isoformat()}},
+        upsert=True
+    )
+    DATA_VERSIONS.update({ds_id: (time.time(), d_v)})
+    c_coll = h_db[HOUSEKEEPING_QUERY_CACHE_COLL]
+    query_cache_entries_delete(c_coll, list(c_coll.find({"dataset_id": ds_id}, {"id": 1, "results": 1})))
+    with QUERY_CACHE_LOCK:
+        QUERY_CACHE_MEMORY.clear()
+    return d_v
+
+
+################################################################################
+
+def query_cache_entries_delete(c_coll, c_entries=[]):
+    """
+    Removes the query cache entries together with their result handovers.
+    """
+    ho_ids = []
+    for c_e in c_entries:
+        ho_ids += list(c_e.get("results", {}).values())
+    handover_delete(ho_ids)
+    c_coll.delete_many({"id": {"$in": [c_e["id"] for c_e in c_entries]}})
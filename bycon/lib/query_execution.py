@@ -1,22 +1,29 @@
 import random
 
+from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4
-from pymongo import MongoClient
 from os import environ
+from pymongo.errors import OperationFailure
 
 from config import *
 from bycon_helpers import mongo_and_or_query_from_list, prdbug, prjsonnice, test_truthy
+from query_cache import ByconQueryCache
 
 
+# source keys with (usually) one value per document, for which the grouped
+# distinct values would exceed the size limit of a single `$facet` result
+PREFETCH_CURSOR_KEYS = ["id"]
+
 ################################################################################
 
 class ByconDatasetResults():
-    def __init__(self, ds_id, BQ):
+    def __init__(self, ds_id, BQ, workers=1):
         self.dataset_results = {}
         self.dataset_id = ds_id
+        self.workers = max(1, workers)
         self.res_obj_defs = BYC["handover_definitions"]["h->o_methods"]
         self.res_ent_id = r_e_id = str(BYC.get("response_entity_id", "___none___"))
-        self.data_db = MongoClient(host=environ.get("BYCON_MONGO_HOST", "localhost"))[ds_id]
+        self.data_db = get_mongo_client()[ds_id]
 
         self.__generate_queries(BQ)
         
@@ -26,7 +33,12 @@ class ByconDatasetResults():
     # -------------------------------------------------------------------------#
 
     def retrieveResults(self):
+        QC = ByconQueryCache(self.dataset_id, self.queries)
+        if (d_r := QC.cachedResults()) is not None:
+            self.dataset_results = d_r
+            return self.dataset_results
         self.__run_stacked_queries()
+        QC.storeResults(self.dataset_results)
         return self.dataset_results
 
 
@@ -50,12 +62,13 @@ class ByconDatasetResults():
         if not (q_e_s := self.queries.keys()):
             return
 
+        prefetches = []
         for e in q_e_s:
             if "variants" in e:
                 continue
             query = self.queries.get(e)
-            ent_resp_def = self.res_obj_defs.get(f'{e}.id')
-            self.__prefetch_entity_response(ent_resp_def, query)
+            prefetches.append((self.res_obj_defs.get(f'{e}.id'), query))
+        self.__prefetch_entity_responses(prefetches)
 
         analysis_q_l = []
         if (pre := self.dataset_results.get("analyses.id")):
@@ -69,12 +82,11 @@ class ByconDatasetResults():
             query = mongo_and_or_query_from_list(analysis_q_l)
             # CAVE: This would remove biosamples & individuals from the response
             #       if they don't have any associated analysis...
-            ent_resp_def = self.res_obj_defs.get("analyses.id")
-            self.__prefetch_entity_response(ent_resp_def, query)
-            ent_resp_def = self.res_obj_defs.get("analyses.biosample_id->biosamples.id")
-            self.__prefetch_entity_response(ent_resp_def, query)
-            ent_resp_def = self.res_obj_defs.get("analyses.individual_id->individuals.id")
-            self.__prefetch_entity_response(ent_resp_def, query)
+            self.__prefetch_entity_responses([
+                (self.res_obj_defs.get("analyses.id"), query),
+                (self.res_obj_defs.get("analyses.biosample_id->biosamples.id"), query),
+                (self.res_obj_defs.get("analyses.individual_id->individuals.id"), query)
+            ])
 
         self.__run_variants_query()
         self.__run_multi_variants_query()
@@ -158,25 +170,137 @@ class ByconDatasetResults():
     # -------------------------------------------------------------------------#
 
     def __update_dataset_results_from_variants(self, query):
-        ent_resp_def = self.res_obj_defs.get("variants.id")
-        self.__prefetch_entity_response(ent_resp_def, query)
-        ent_resp_def = self.res_obj_defs.get("variants.analysis_id->analyses.id")
-        self.__prefetch_entity_response(ent_resp_def, query)
-        ent_resp_def = self.res_obj_defs.get("variants.biosample_id->biosamples.id")
-        self.__prefetch_entity_response(ent_resp_def, query)
-        ent_resp_def = self.res_obj_defs.get("variants.individual_id->individuals.id")
-        self.__prefetch_entity_response(ent_resp_def, query)
+        self.__prefetch_grouped_entity_responses([
+            self.res_obj_defs.get("variants.id"),
+            self.res_obj_defs.get("variants.analysis_id->analyses.id"),
+            self.res_obj_defs.get("variants.biosample_id->biosamples.id"),
+            self.res_obj_defs.get("variants.individual_id->individuals.id")
+        ], query)
+
+
+    # -------------------------------------------------------------------------#
+
+    def __prefetch_grouped_entity_responses(self, h_o_defs, query):
+        """
+        Retrieves the distinct values for several source keys of the same
+        source collection with a minimum of scans instead of one `distinct`
+        call per key. Keys with one value per document (`PREFETCH_CURSOR_KEYS`,
+        i.e. the `id`) are grouped in their own aggregation which is read as a
+        batched cursor. The other keys share a single `$facet` aggregation on
+        the projected documents; if its result document exceeds the BSON size
+        limit the values are collected from a projected cursor instead.
+        As with `distinct`, array values are flattened (`$unwind`) and the
+        values are returned sorted (so paginated responses are stable).
+        """
+        s_c = h_o_defs[0].get("source_collection")
+        s_k_s = list(dict.fromkeys(h_o_def.get("source_key") for h_o_def in h_o_defs))
+        coll = self.data_db[s_c]
+
+        dists = {}
+        for s_k in [s_k for s_k in s_k_s if s_k in PREFETCH_CURSOR_KEYS]:
+            dists.update({s_k: self.__grouped_distinct_values(coll, query, s_k)})
+        if len(f_k_s := [s_k for s_k in s_k_s if s_k not in dists]) > 0:
+            dists.update(self.__faceted_distinct_values(coll, query, f_k_s))
+        dists = {s_k: sorted(d_v, key=_distinct_sort_key) for s_k, d_v in dists.items()}
+
+        for h_o_def in h_o_defs:
+            r_k, e_r = self.__entity_response_object(h_o_def, dists[h_o_def.get("source_key")])
+            self.dataset_results.update({r_k: e_r})
+        return
+
+
+    # -------------------------------------------------------------------------#
+
+    def __grouped_distinct_values(self, coll, query, s_k):
+        pipeline = [
+            {"$match": query},
+            {"$project": {"_id": 0, s_k: 1}},
+            {"$unwind": f'${s_k}'},
+            {"$group": {"_id": f'${s_k}'}}
+        ]
+        return [g["_id"] for g in coll.aggregate(pipeline, allowDiskUse=True, batchSize=10000)]
+
+
+    # -------------------------------------------------------------------------#
+
+    def __faceted_distinct_values(self, coll, query, s_k_s):
+        fields = {s_k: 1 for s_k in s_k_s}
+        fields.update({"_id": 0})
+        pipeline = [
+            {"$match": query},
+            {"$project": fields},
+            {"$facet": {
+                f'f{i}': [
+                    {"$unwind": f'${s_k}'},
+                    {"$group": {"_id": None, "v": {"$addToSet": f'${s_k}'}}}
+                ] for i, s_k in enumerate(s_k_s)
+            }}
+        ]
+        try:
+            f_r = list(coll.aggregate(pipeline, allowDiskUse=True))
+            f_r = f_r[0] if len(f_r) > 0 else {}
+            dists = {}
+            for i, s_k in enumerate(s_k_s):
+                g = f_r.get(f'f{i}', [])
+                dists.update({s_k: g[0].get("v", []) if len(g) > 0 else []})
+            return dists
+        except OperationFailure as e:
+            prdbug(f'... falling back to cursor based id retrieval: {e}')
+        dists = {s_k: {} for s_k in s_k_s}
+        for doc in coll.find(query, fields, batch_size=10000):
+            for s_k in s_k_s:
+                if (v := doc.get(s_k)) is None:
+                    continue
+                if type(v) is list:
+                    dists[s_k].update({v_v: None for v_v in v if v_v is not None})
+                else:
+                    dists[s_k].update({v: None})
+        return dists
+
+
+    # -------------------------------------------------------------------------#
+
+    def __prefetch_entity_responses(self, prefetches):
+        """
+        Runs a list of independent `(h_o_def, query)` prefetches - in threads
+        if more than one worker was requested. The results are added in list
+        order so that the `dataset_results` keys stay the same as in sequential
+        execution.
+        """
+        if self.workers < 2 or len(prefetches) < 2:
+            for h_o_def, query in prefetches:
+                self.__prefetch_entity_response(h_o_def, query)
+            return
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(prefetches))) as executor:
+            e_r_s = list(executor.map(lambda p: self.__entity_response(*p), prefetches))
+        for r_k, e_r in e_r_s:
+            self.dataset_results.update({r_k: e_r})
+        return
 
 
     # -------------------------------------------------------------------------#
 
     def __prefetch_entity_response(self, h_o_def, query):
+        r_k, e_r = self.__entity_response(h_o_def, query)
+        self.dataset_results.update({r_k: e_r})
+        return
+
+
+    # -------------------------------------------------------------------------#
+
+    def __entity_response(self, h_o_def, query):
         s_c = h_o_def.get("source_collection")
         s_k = h_o_def.get("source_key")
-        t_c = h_o_def.get("target_collection")
-        t_k = h_o_def.get("target_key")
 
         dist = self.data_db[s_c].distinct(s_k, query)
+        return self.__entity_response_object(h_o_def, dist)
+
+
+    # -------------------------------------------------------------------------#
+
+    def __entity_response_object(self, h_o_def, dist):
+        t_c = h_o_def.get("target_collection")
+        t_k = h_o_def.get("target_key")
         t_v_s = dist if dist else []
 
         e_r = {**h_o_def}
@@ -189,10 +313,16 @@ class ByconDatasetResults():
         })
 
         r_k = f'{t_c}.{t_k}'
-        self.dataset_results.update({r_k: e_r})
-        return
+        return r_k, e_r
 
 
 ################################################################################
 ################################################################################
 ################################################################################
+
+def _distinct_sort_key(value):
+    """
+    Sort key for the (usually string) id values of a prefetch, grouping
+    values of different types instead of failing on their comparison.
+    """
+    return (type(value).__name__, value)
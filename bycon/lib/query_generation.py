@@ -1,12 +1,12 @@
 import humps, inspect, pymongo, re, sys
 from bson import SON
 from os import environ
-from pymongo import MongoClient
 
-from bycon_helpers import days_from_iso8601duration, prdbug, return_paginated_list
+from bycon_helpers import days_from_iso8601duration, paginated_range, prdbug
 from config import *
 from cytoband_parsing import Cytobands
 from genome_utils import ChroNames, GeneInfo, VariantTypes
+from handover_storage import handover_load, handover_values
 
 ################################################################################
 
@@ -145,7 +145,7 @@ class ByconQuery():
         if not (r_c := self.response_entity.get("collection")):
             return
 
-        data_db = MongoClient(host=DB_MONGOHOST)[self.ds_id]
+        data_db = get_mongo_client()[self.ds_id]
         if r_c not in data_db.list_collection_names():
             # TODO: warning?
             return
@@ -660,7 +660,7 @@ class ByconQuery():
         if len(BYC["BYC_FILTERS"]) < 1:
             return
 
-        data_db = MongoClient(host=DB_MONGOHOST)[self.ds_id]
+        data_db = get_mongo_client()[self.ds_id]
         coll_coll = data_db[ self.filtering_terms_coll ]
         self.collation_ids = coll_coll.distinct("id", {})
 
@@ -807,21 +807,27 @@ class ByconQuery():
         if not (accessid := BYC_PARS.get("accessid")):
             return
 
-        ho_client = MongoClient(host=DB_MONGOHOST)
-        ho_coll = ho_client[HOUSEKEEPING_DB][HOUSEKEEPING_HO_COLL]
-        h_o = ho_coll.find_one({"id": accessid})
+        h_o = handover_load(accessid)
 
         # accessid overrides ... ?
         if not h_o:
             return
 
         t_k = h_o["target_key"]
-        t_v = h_o["target_values"]
         c_n = h_o["target_collection"]
         t_e = h_o["target_entity"]
         t_c = h_o["target_count"]
 
-        t_v = return_paginated_list(t_v, self.skip, self.limit)
+        # only the value pages for the requested range are read (same logic as
+        # in `return_paginated_list`)
+        if t_c < 1:
+            return
+        if self.limit < 1 or BYC.get("PAGINATED_STATUS", False):
+            t_v = handover_values(h_o)
+        else:
+            BYC.update({"PAGINATED_STATUS": True})
+            p_range = paginated_range(t_c, self.skip, self.limit)
+            t_v = handover_values(h_o, *p_range) if p_range else []
         if len(t_v) < 1:
             return
         h_o_q = {t_k: {'$in': t_v}}
@@ -1,7 +1,8 @@
-import inspect, json, re, yaml
+import hashlib, inspect, json, pickle, re, yaml
+from copy import deepcopy
 from deepmerge import always_merger
 from json_ref_dict import RefDict, materialize
-from os import path, pardir, scandir, environ
+from os import path, pardir, replace, scandir, environ
 from pathlib import Path
 
 from config import *
@@ -10,6 +11,25 @@ from parameter_parsing import *
 
 ################################################################################
 
+"""
+The merged package & local configuration can be stored in a pickled snapshot
+file (by default `config_snapshot.pickle` in the `local` directory, or the path
+in the `BYCON_CONFIG_SNAPSHOT` environment variable; `off` disables its use).
+The snapshot is written with `housekeepers/configSnapshotWriter.py` and only
+used as long as the content hashes of all its source YAML files match; the
+domain specific instance overrides are still applied per request.
+"""
+
+CONFIG_SNAPSHOT_VERSION = 1
+CONFIG_SNAPSHOT_FILE = environ.get("BYCON_CONFIG_SNAPSHOT", path.join(LOC_PATH, "config_snapshot.pickle"))
+
+# the loaded snapshot (if any) and the unmodified configuration defaults, for
+# building snapshots independent of the current configuration state
+CONFIG_SNAPSHOT = {}
+BYC_CONFIG_BASE = deepcopy({k: BYC.get(k, {}) for k in ["beacon_defaults", "entity_defaults"] + BYC["loc_mod_pars"]})
+
+################################################################################
+
 def read_service_definition_files():
     """
     Reading the config from the same wrapper dir:
@@ -18,6 +38,138 @@ def read_service_definition_files():
       |- lib - read_specs.py
       |- definitions - __name__.yaml
     """
+    if read_config_snapshot():
+        return
+    _merge_package_config(BYC)
+
+
+################################################################################
+
+def update_rootpars_from_local_or_HOST():
+    # avoiding re-parsing of directories, e.g. during init stage
+    p_c_p = BYC.get("parsed_config_paths", [])
+    if LOC_PATH in p_c_p:
+        return
+
+    p_c_p.append(LOC_PATH)
+
+    i_ovr = read_local_config()
+    update_rootpars_from_HOST(i_ovr)
+
+    return
+
+
+################################################################################
+
+def read_local_config():
+    """
+    Merges the local configuration into `BYC` (if not already loaded from the
+    configuration snapshot) and returns the instance definitions.
+    """
+    if "instance_definitions" in CONFIG_SNAPSHOT:
+        return CONFIG_SNAPSHOT["instance_definitions"]
+    return _merge_local_config(BYC)
+
+
+################################################################################
+
+def update_rootpars_from_HOST(i_ovr={}):
+    # overwriting installation-wide defaults with instance-specific ones
+    # _i.e._ matching the current domain (to allow presentation of different
+    # Beacon instances from the same server)
+    if "___shell___" in ENV:
+        return
+    instance = "___none___"
+    host = environ.get("HTTP_HOST", "___none___")
+    for i_k, i_v in i_ovr.items():
+        doms = i_v.get("domains", [])
+        if host in doms:
+            instance = i_k
+            break
+    if instance in i_ovr:
+        _merge_instance_defaults(BYC, i_ovr[instance])
+
+
+################################################################################
+
+def read_config_snapshot():
+    """
+    Updates `BYC` from the configuration snapshot file if it exists and is
+    current w/ respect to its source files.
+    """
+    if CONFIG_SNAPSHOT_FILE.lower() in ["off", "false", "0"]:
+        return False
+    if not path.isfile(CONFIG_SNAPSHOT_FILE):
+        return False
+    try:
+        with open(CONFIG_SNAPSHOT_FILE, "rb") as s_f:
+            c_s = pickle.load(s_f)
+    except Exception as e:
+        prdbug(f'... ignoring config snapshot {CONFIG_SNAPSHOT_FILE}: {e}')
+        return False
+    if c_s.get("version") != CONFIG_SNAPSHOT_VERSION:
+        return False
+    if c_s.get("sources") != _config_source_hashes():
+        prdbug(f'... ignoring outdated config snapshot {CONFIG_SNAPSHOT_FILE}')
+        return False
+    CONFIG_SNAPSHOT.update(c_s)
+    BYC.update(c_s["config"])
+    return True
+
+
+################################################################################
+
+def write_config_snapshot(snapshot_file=None):
+    """
+    Writes the merged package & local configuration, the instance overrides
+    and the hashes of the source files to the snapshot file.
+    """
+    if not snapshot_file:
+        snapshot_file = CONFIG_SNAPSHOT_FILE
+    conf = deepcopy(BYC_CONFIG_BASE)
+    _merge_package_config(conf)
+    i_ovr = _merge_local_config(conf)
+    tmp_file = f'{snapshot_file}.tmp'
+    with open(tmp_file, "wb") as s_f:
+        pickle.dump({
+            "version": CONFIG_SNAPSHOT_VERSION,
+            "sources": _config_source_hashes(),
+            "config": conf,
+            "instance_definitions": i_ovr
+        }, s_f, protocol=pickle.HIGHEST_PROTOCOL)
+    replace(tmp_file, snapshot_file)
+    return snapshot_file
+
+
+################################################################################
+
+def _config_source_files():
+    s_fs = {}
+    if path.isdir(CONF_PATH):
+        for f in sorted(scandir(CONF_PATH), key=lambda x: x.name):
+            if f.is_file() and f.name.endswith("yaml"):
+                s_fs.update({f'config/{f.name}': f.path})
+    for p in ["instance_definitions"] + BYC["loc_mod_pars"]:
+        s_fs.update({f'local/{p}.yaml': path.join(LOC_PATH, f'{p}.yaml')})
+    return s_fs
+
+
+################################################################################
+
+def _config_source_hashes():
+    s_hs = {}
+    for s_k, s_p in _config_source_files().items():
+        s_h = None
+        if path.isfile(s_p):
+            with open(s_p, "rb") as s_f:
+                s_h = hashlib.sha1(s_f.read()).hexdigest()
+        s_hs.update({s_k: s_h})
+    return s_hs
+
+
+################################################################################
+
+def _merge_package_config(conf):
     if not path.isdir(CONF_PATH):
         return
     b_d_fs = [ f.name for f in scandir(CONF_PATH) if f.is_file() ]
@@ -28,58 +180,44 @@ def read_service_definition_files():
         o = {}
         ofp = path.join(CONF_PATH, f'{d}.yaml' )
         with open( ofp ) as od:
-            o = yaml.load( od , Loader=yaml.FullLoader)
-        BYC.update({d: o})
+            o = yaml.load( od , Loader=YAML_LOADER)
+        conf.update({d: o})
 
     e_d = always_merger.merge(
-        BYC.get("entity_defaults", {}),
-        BYC.get("services_entity_defaults", {})
+        conf.get("entity_defaults", {}),
+        conf.get("services_entity_defaults", {})
     )
 
-    BYC.update({"entity_defaults": e_d})
+    conf.update({"entity_defaults": e_d})
 
 
 ################################################################################
 
-def update_rootpars_from_local_or_HOST():
-    # avoiding re-parsing of directories, e.g. during init stage
-    p_c_p = BYC.get("parsed_config_paths", [])
-    if LOC_PATH in p_c_p:
-        return
-
-    p_c_p.append(LOC_PATH)
-
-    # overwriting installation-wide defaults with instance-specific ones
-    # _i.e._ matching the current domain (to allow presentation of different
-    # Beacon instances from the same server)
+def _merge_local_config(conf):
+    """
+    Merges the `local` instance overrides and the local configuration files
+    into `conf` and returns the instance definitions.
+    """
     i_ovr_f = path.join(LOC_PATH, "instance_definitions.yaml")
     i_ovr = load_yaml_empty_fallback(i_ovr_f)
 
     if "local" in i_ovr:
-        i_o_bdfs = i_ovr["local"].get("beacon_defaults", {})
-        i_o_edfs = i_ovr["local"].get("entity_defaults", {})
-        BYC.update({"beacon_defaults": always_merger.merge(BYC.get("beacon_defaults", {}), i_o_bdfs)})
-        BYC.update({"entity_defaults": always_merger.merge(BYC.get("entity_defaults", {}), i_o_edfs)})
-    if not "___shell___" in ENV:
-        instance = "___none___"
-        host = environ.get("HTTP_HOST", "___none___")
-        for i_k, i_v in i_ovr.items():
-            doms = i_v.get("domains", [])
-            if host in doms:
-                instance = i_k
-                break
-        if instance in i_ovr:
-            i_o_bdfs = i_ovr[instance].get("beacon_defaults", {})
-            i_o_edfs = i_ovr[instance].get("entity_defaults", {})
-            BYC.update({"beacon_defaults": always_merger.merge(BYC.get("beacon_defaults", {}), i_o_bdfs)})
-            BYC.update({"entity_defaults": always_merger.merge(BYC.get("entity_defaults", {}), i_o_edfs)})
+        _merge_instance_defaults(conf, i_ovr["local"])
 
     # TODO: better way to define which files are parsed from local
     for p in BYC.get("loc_mod_pars", []):
         f = path.join(LOC_PATH, f'{p}.yaml')
         d = load_yaml_empty_fallback(f)
         prdbug(f'...LOC_PATH file => {p}')
-        BYC.update({p: always_merger.merge(BYC.get(p, {}), d)})
+        conf.update({p: always_merger.merge(conf.get(p, {}), d)})
 
-    return
+    return i_ovr
+
+
+################################################################################
 
+def _merge_instance_defaults(conf, instance):
+    i_o_bdfs = instance.get("beacon_defaults", {})
+    i_o_edfs = instance.get("entity_defaults", {})
+    conf.update({"beacon_defaults": always_merger.merge(conf.get("beacon_defaults", {}), i_o_bdfs)})
+    conf.update({"entity_defaults": always_merger.merge(conf.get("entity_defaults", {}), i_o_edfs)})
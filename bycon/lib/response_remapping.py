@@ -1,5 +1,4 @@
 import datetime, re
-from pymongo import MongoClient
 from os import environ
 from isodate import date_isoformat
 
@@ -55,6 +54,7 @@ class VariantsResponse:
                 variant_ids.add(viid)
         variant_ids = list(variant_ids)
 
+        BV = ByconVariant()
         for d in variant_ids:
             d_vs = [var for var in self.pgx_vars if var.get('variant_internal_id', "__none__") == d]
             c_l_d = []
@@ -67,7 +67,7 @@ class VariantsResponse:
                     c_l_v.update({"variant_id": id_v})
                 c_l_d.append(c_l_v)
 
-            v_i = ByconVariant().vrsVariant(d_vs[0])
+            v_i = BV.vrsVariant(d_vs[0])
             for c_k in self.case_pars + ["variant_internal_id", "info"]:
                 v_i.pop(c_k, None)
             v_i = clean_empty_fields(v_i)
@@ -231,7 +231,7 @@ def remap_phenopackets(ds_id, r_s_res):
     if not "phenopacket" in BYC["response_entity_id"]:
         return r_s_res
 
-    mongo_client = MongoClient(host=DB_MONGOHOST)
+    mongo_client = get_mongo_client()
     data_db = mongo_client[ds_id]
     pxf_s = []
 
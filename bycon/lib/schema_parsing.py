@@ -1,7 +1,11 @@
-import humps, re, json
+import hashlib, humps, re, json, threading
 
+from importlib import metadata
+
+from copy import deepcopy
+from functools import lru_cache
 from json_ref_dict import RefDict, materialize
-from os import path, scandir, pardir
+from os import environ, path, replace, scandir, pardir, walk
 from pathlib import Path
 
 from bycon_helpers import prjsonnice, prdbug
@@ -9,30 +13,55 @@ from config import *
 
 ################################################################################
 
+"""
+Schema files are looked up through an index of the `schemas` tree (file name
+=> parent directory name & path) which is built once per process; materialized
+schemas and empty schema instances are kept in LRU caches and handed out as
+copies.
+
+If a precompiled `schemas_cache.json` exists (written by `write_schemas_cache()`,
+e.g. through `bycon/schemas/bin/schemasCacher.py` when building the package)
+the index and the materialized schemas are read from there and neither the
+schema tree has to be indexed nor any schema materialized. At process start only
+the source stamp of the cache (the installed `bycon` version) is compared; the
+full hash of the schema source files stored with the cache is only checked
+explicitly (`check_schemas_cache()`, `schemasCacher.py --check`). Therefore the
+cache has to be rebuilt after schema edits w/o a version change; setting
+`BYCON_SCHEMAS_CACHE=off` disables the use of the precompiled file (e.g. while
+editing schemas); the environment variable can also point to an alternative
+cache file.
+"""
+
+SCHEMAS_PATH = path.join(PKG_PATH, "schemas")
+SCHEMAS_CACHE_NAME = "schemas_cache.json"
+SCHEMAS_CACHE_FILE = environ.get("BYCON_SCHEMAS_CACHE", path.join(SCHEMAS_PATH, SCHEMAS_CACHE_NAME))
+SCHEMAS_CACHE_SIZE = 256
+SCHEMAS_EXCLUDE_KEYS = [ "examples" ] #"format",
+
+# file name => [ [parent directory name, path relative to `SCHEMAS_PATH`], ... ]
+# and relative path => materialized schema (only from the precompiled file)
+SCHEMAS_INDEX = {}
+SCHEMAS_PRECOMPILED = {}
+SCHEMAS_INDEX_LOCK = threading.Lock()
+
+################################################################################
+
 def read_schema_file(schema_name, item, ext="json"):
     # some lookup for the `request_entity_path_id` value in the case of "true"
     # entry types where schemas are defined in a directory with the path id
+    return _read_resolved_schema_file(_resolved_schema_name(schema_name), item, ext)
 
-    b_e_d = BYC.get("entity_defaults", {})
-    if schema_name in b_e_d:
-        r_p_id = b_e_d[schema_name].get("request_entity_path_id")
-        if isinstance(r_p_id, str):
-            schema_name = r_p_id
 
+################################################################################
+
+def _read_resolved_schema_file(schema_name, item, ext="json"):
     s_f_p = get_default_schema_file_path(schema_name, "defaultSchema", ext)
     # prdbug(f'...read_schema_file {schema_name}: {s_f_p}')
     if s_f_p is False:  # in case the name had been used as request_entity_path_id
         s_f_p = get_schema_file_path(schema_name, ext)
 
     if s_f_p is not False:
-        if len(item) > 1:
-            s_f_p = s_f_p+"#/"+item
-        root_def = RefDict(s_f_p)
-        
-        exclude_keys = [ "examples" ] #"format",
-        s = materialize(root_def, exclude_keys=exclude_keys)
-        assert isinstance(s, dict)
-        return s
+        return deepcopy(_materialized_schema(s_f_p, item))
 
     return False
 
@@ -40,12 +69,9 @@ def read_schema_file(schema_name, item, ext="json"):
 ################################################################################
 
 def get_schema_file_path(schema_name, ext="json"):
-    f_n = f'{schema_name}.{ext}'
-    p = Path(path.join( PKG_PATH, "schemas" ))
-    s_p_s = [ f for f in p.rglob("*") if f.is_file() ]
-    s_p_s = [ f for f in s_p_s if f.name == f_n ]
+    s_p_s = schemas_index().get(f'{schema_name}.{ext}', [])
     if len(s_p_s) == 1:
-        return f'{s_p_s[0].resolve()}'
+        return path.join(SCHEMAS_PATH, s_p_s[0][1])
 
     return False
 
@@ -53,17 +79,166 @@ def get_schema_file_path(schema_name, ext="json"):
 ################################################################################
 
 def get_default_schema_file_path(schema_path_id, file_name, ext="json"):
-    f_n = f'{file_name}.{ext}'
-    p = Path(path.join( PKG_PATH, "schemas" ))
-    s_p_s = [ f for f in p.rglob("*") if f.is_file() ]
-    s_p_s = [ f for f in s_p_s if f.name == f_n ]
-    s_p_s = [ f for f in s_p_s if f.parent.name == schema_path_id ]
+    s_p_s = schemas_index().get(f'{file_name}.{ext}', [])
+    s_p_s = [ f for f in s_p_s if f[0] == schema_path_id ]
     if len(s_p_s) == 1:
-        return f'{s_p_s[0].resolve()}'
+        return path.join(SCHEMAS_PATH, s_p_s[0][1])
 
     return False
 
 
+################################################################################
+
+def schemas_index():
+    if len(SCHEMAS_INDEX) > 0:
+        return SCHEMAS_INDEX
+    with SCHEMAS_INDEX_LOCK:
+        if len(SCHEMAS_INDEX) > 0:
+            return SCHEMAS_INDEX
+        if (s_c := _read_schemas_cache()):
+            SCHEMAS_PRECOMPILED.update(s_c.get("schemas", {}))
+            SCHEMAS_INDEX.update(s_c.get("index", {}))
+        else:
+            SCHEMAS_INDEX.update(_index_schemas_tree())
+    return SCHEMAS_INDEX
+
+
+################################################################################
+
+def write_schemas_cache(cache_file=None):
+    """
+    Writes the schema file index and all (locally resolvable) materialized JSON
+    schemas to the precompiled cache file; schemas with unresolvable (e.g.
+    remote) references are skipped and materialized on demand.
+    """
+    if not cache_file:
+        cache_file = path.join(SCHEMAS_PATH, SCHEMAS_CACHE_NAME)
+    s_i = _index_schemas_tree()
+    schemas = {}
+    for f_n, s_p_s in s_i.items():
+        if not f_n.endswith(".json"):
+            continue
+        for p_n, r_p in s_p_s:
+            try:
+                s = materialize(RefDict(path.join(SCHEMAS_PATH, r_p)), exclude_keys=SCHEMAS_EXCLUDE_KEYS)
+                json.dumps(s)
+            except Exception as e:
+                prdbug(f'... not caching schema {r_p}: {e}')
+                continue
+            schemas.update({r_p: s})
+    tmp_file = f'{cache_file}.tmp'
+    with open(tmp_file, "w") as c_f:
+        json.dump({
+            "stamp": _schemas_source_stamp(),
+            "sources": _schemas_source_hash(s_i),
+            "index": s_i,
+            "schemas": schemas
+        }, c_f)
+    replace(tmp_file, cache_file)
+    return cache_file, len(schemas)
+
+
+################################################################################
+
+def check_schemas_cache(cache_file=None):
+    """
+    Compares the hash of the schema source files stored in the cache file with
+    the current schema tree; `True` if the cache is up to date.
+    """
+    if not cache_file:
+        cache_file = path.join(SCHEMAS_PATH, SCHEMAS_CACHE_NAME)
+    if not (s_c := _load_schemas_cache(cache_file)):
+        return False
+    return s_c.get("sources") == _schemas_source_hash(_index_schemas_tree())
+
+
+################################################################################
+
+def _index_schemas_tree():
+    s_i = {}
+    for d_p, d_ns, f_ns in walk(SCHEMAS_PATH):
+        d_ns.sort()
+        p_n = path.basename(d_p)
+        for f_n in sorted(f_ns):
+            if f_n.startswith(SCHEMAS_CACHE_NAME):
+                continue
+            r_p = path.relpath(path.join(d_p, f_n), SCHEMAS_PATH)
+            s_i.setdefault(f_n, []).append([p_n, r_p])
+    return s_i
+
+
+################################################################################
+
+def _schemas_source_hash(s_i):
+    """
+    Hash over the paths and contents of the JSON & YAML schema files of the
+    index, for detecting an outdated precompiled cache.
+    """
+    s_h = hashlib.sha1()
+    for f_n in sorted(s_i.keys()):
+        if not f_n.endswith((".json", ".yaml")):
+            continue
+        for p_n, r_p in s_i[f_n]:
+            s_h.update(r_p.encode("utf-8"))
+            with open(path.join(SCHEMAS_PATH, r_p), "rb") as s_f:
+                s_h.update(s_f.read())
+    return s_h.hexdigest()
+
+
+################################################################################
+
+def _schemas_source_stamp():
+    """
+    Cheap source identifier checked at process start instead of the content
+    hash: the version of the installed `bycon` package.
+    """
+    try:
+        return metadata.version("bycon")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+################################################################################
+
+def _read_schemas_cache():
+    if SCHEMAS_CACHE_FILE.lower() in ["off", "false", "0"]:
+        return False
+    if not (s_c := _load_schemas_cache(SCHEMAS_CACHE_FILE)):
+        return False
+    if s_c.get("stamp") != _schemas_source_stamp():
+        prdbug(f'... ignoring schemas cache {SCHEMAS_CACHE_FILE} from another version')
+        return False
+    return s_c
+
+
+################################################################################
+
+def _load_schemas_cache(cache_file):
+    if not path.isfile(cache_file):
+        return False
+    try:
+        with open(cache_file) as c_f:
+            return json.load(c_f)
+    except Exception as e:
+        prdbug(f'... ignoring schemas cache {cache_file}: {e}')
+        return False
+
+
+################################################################################
+
+@lru_cache(maxsize=SCHEMAS_CACHE_SIZE)
+def _materialized_schema(s_f_p, item):
+    r_p = path.relpath(s_f_p, SCHEMAS_PATH)
+    if len(item) <= 1 and r_p in SCHEMAS_PRECOMPILED:
+        return SCHEMAS_PRECOMPILED[r_p]
+    if len(item) > 1:
+        s_f_p = s_f_p+"#/"+item
+    root_def = RefDict(s_f_p)
+    s = materialize(root_def, exclude_keys=SCHEMAS_EXCLUDE_KEYS)
+    assert isinstance(s, dict)
+    return s
+
+
 ################################################################################
 
 def instantiate_schema(schema):
@@ -94,10 +269,28 @@ def create_empty_instance(schema):
 ################################################################################
 
 def object_instance_from_schema_name(schema_name, root_key, ext="json"):
-    s_f = read_schema_file(schema_name, root_key, ext)
-    s_i = create_empty_instance(s_f)
+    s_i = _schema_instance(_resolved_schema_name(schema_name), root_key, ext)
 
-    return s_i
+    return deepcopy(s_i)
+
+
+################################################################################
+
+def _resolved_schema_name(schema_name):
+    b_e_d = BYC.get("entity_defaults", {})
+    if schema_name in b_e_d:
+        r_p_id = b_e_d[schema_name].get("request_entity_path_id")
+        if isinstance(r_p_id, str):
+            return r_p_id
+    return schema_name
+
+
+################################################################################
+
+@lru_cache(maxsize=SCHEMAS_CACHE_SIZE)
+def _schema_instance(schema_name, root_key, ext):
+    s_f = _read_resolved_schema_file(schema_name, root_key, ext)
+    return create_empty_instance(s_f)
 
 
 ################################################################################
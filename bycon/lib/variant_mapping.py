@@ -12,6 +12,24 @@ from genome_utils import ChroNames
 ################################################################################
 ################################################################################
 
+# schema based object templates, materialized once per process (see
+# `variant_schema_templates`) and only used as deep copied instances
+VARIANT_SCHEMA_TEMPLATES = {}
+
+def variant_schema_templates():
+    if len(VARIANT_SCHEMA_TEMPLATES) < 1:
+        for t_k, s_n in {
+            "vrs_allele": "VRSallele",
+            "vrs_cnv": "VRScopyNumberChange",
+            "vrs_adjacency": "VRSadjacency",
+            "pgx_variant": "pgxVariant"
+        }.items():
+            VARIANT_SCHEMA_TEMPLATES.update({t_k: object_instance_from_schema_name(s_n, "")})
+    return VARIANT_SCHEMA_TEMPLATES
+
+
+################################################################################
+
 class ByconVariant:
     def __init__(self):
         """
@@ -25,6 +43,11 @@ class ByconVariant:
         The class is geared towards the data we currently process through the
         Progenetix platform and does not cover some use cases outside of Progenetix
         and Beacon "common use" scenarios (as of Beacon v2 / 2023).
+
+        An instance can (and for larger numbers of variants should) be re-used
+        for the conversion of any number of variants, e.g. through the bulk
+        `byconVariants(variants)` and `pgxVariants(variants)` generators; the
+        schema templates are only materialized once per process.
         """
         self.byc_variant = {}
         self.pgx_variant = {}
@@ -33,6 +56,8 @@ class ByconVariant:
         self.pgxseg_variant = {}
 
         self.ChroNames = ChroNames()
+        self.refseq_ids = set(self.ChroNames.allRefseqs())
+        self.chro_ids = set(self.ChroNames.allChros())
         self.variant_types = BYC.get("variant_type_definitions", {})
         self.variant_types_map = {}
         for v_t, v_d in self.variant_types.items():
@@ -45,10 +70,11 @@ class ByconVariant:
         d_m = BYC["datatable_mappings"].get("definitions", {})
         d_m_v = d_m.get("genomicVariant", {})
         self.variant_mappings = d_m_v.get("parameters", {})
-        self.vrs_allele = object_instance_from_schema_name("VRSallele", "")
-        self.vrs_cnv = object_instance_from_schema_name("VRScopyNumberChange", "")
-        self.vrs_adjacency = object_instance_from_schema_name("VRSadjacency", "")
-        self.pgx_variant = object_instance_from_schema_name("pgxVariant", "")
+        s_t_s = variant_schema_templates()
+        self.vrs_allele = s_t_s["vrs_allele"]
+        self.vrs_cnv = s_t_s["vrs_cnv"]
+        self.vrs_adjacency = s_t_s["vrs_adjacency"]
+        self.pgx_variant_template = s_t_s["pgx_variant"]
 
 
     # -------------------------------------------------------------------------#
@@ -63,8 +89,18 @@ class ByconVariant:
 
     # -------------------------------------------------------------------------#
 
-    def pgxVariant(self, variant=None):
+    def byconVariants(self, variants=[]):
+        """
+        Generator for the canonical versions of a stream of variants.
+        """
+        for v in variants:
+            yield self.byconVariant(v)
+
 
+    # -------------------------------------------------------------------------#
+
+    def pgxVariant(self, variant=None):
+        self.pgx_variant = deepcopy(self.pgx_variant_template)
         if not variant:
             return self.pgx_variant
         self.byc_variant = variant
@@ -84,6 +120,17 @@ class ByconVariant:
         return self.pgx_variant
 
 
+    # -------------------------------------------------------------------------#
+
+    def pgxVariants(self, variants=[]):
+        """
+        Generator for the database (`pgxVariant`) versions of a stream of
+        variants.
+        """
+        for v in variants:
+            yield self.pgxVariant(v)
+
+
     # -------------------------------------------------------------------------#
 
     def vcfVariant(self, variant={}):
@@ -125,7 +172,7 @@ class ByconVariant:
             if v_l >= 50:
                 v_v.update({"INFO": f'IMPRECISE;SVCLAIM=D;END={v.get("end")};SVLEN={v_l}'})
 
-        self.vcf_variant.update(v_v) 
+        self.vcf_variant = v_v
         return self.vcf_variant
 
 
@@ -161,7 +208,7 @@ class ByconVariant:
         for v_o in ("identifiers", "info", "molecular_attributes", "variant_level_data"):
             vrs_v.update({v_o: self.byc_variant.get(v_o, {})})
 
-        self.vrs_variant.update(vrs_v)
+        self.vrs_variant = vrs_v
         return self.vrs_variant
 
 
@@ -320,8 +367,8 @@ class ByconVariant:
         if not "location" in (v := self.byc_variant):
             return
 
-        refs_ids = self.ChroNames.allRefseqs()
-        chro_ids = self.ChroNames.allChros()
+        refs_ids = self.refseq_ids
+        chro_ids = self.chro_ids
 
         s_id = v["location"].get("sequence_id", "___none___")
         chro = v["location"].get("chromosome", "___none___")
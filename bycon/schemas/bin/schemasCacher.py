@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+import sys
+from os import environ, path, pardir
+
+here_path = path.dirname( path.abspath(__file__) )
+pkg_path = path.join( here_path, pardir, pardir )
+sys.path.append( path.join( pkg_path ) )
+sys.path.append( path.join( pkg_path, "lib" ) )
+
+# the cache file is always (re-)built from the schema tree
+environ["BYCON_SCHEMAS_CACHE"] = "off"
+# the database names are not needed here; this avoids the database lookup at
+# import of the configuration, so the cache can be built w/o a MongoDB server
+environ["DATABASE_NAMES"] = ""
+
+from schema_parsing import check_schemas_cache, write_schemas_cache
+
+"""
+The script writes the precompiled `schemas_cache.json` file with the schema
+file index and the materialized JSON schemas of the package, so that request
+processing does not have to read the schema tree. It is run before the package
+build (see `updev.sh`) and has to be re-run after schema changes (at process
+start only the package version stored with the cache is checked); an optional
+argument specifies an alternative output file.
+
+With `--check` the cache file is only compared against the current schema files
+(content hash) and the script exits with status 1 if it is outdated.
+"""
+
+################################################################################
+################################################################################
+################################################################################
+
+def main():
+    args = sys.argv[1:]
+    check = "--check" in args
+    args = [a for a in args if a != "--check"]
+    c_f = args[0] if len(args) > 0 else None
+    if check:
+        if check_schemas_cache(c_f):
+            print(f'==> schemas cache is up to date')
+            return
+        print(f'==> schemas cache is outdated or missing; please re-run w/o `--check`')
+        sys.exit(1)
+    c_f, s_no = write_schemas_cache(c_f)
+    print(f'==> wrote {s_no} materialized schemas to {c_f}')
+
+
+################################################################################
+################################################################################
+################################################################################
+
+if __name__ == '__main__':
+    main()
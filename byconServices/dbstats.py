@@ -1,5 +1,4 @@
-from pymongo import MongoClient
-from bycon import BYC, DB_MONGOHOST, HOUSEKEEPING_DB, HOUSEKEEPING_INFO_COLL, print_json_response
+from bycon import BYC, get_mongo_client, HOUSEKEEPING_DB, HOUSEKEEPING_INFO_COLL, print_json_response
 from byconServiceLibs import ByconServiceResponse
 
 def dbstats():
@@ -12,7 +11,7 @@ def dbstats():
     * <https://progenetix.org/services/dbstats/>
     * <https://progenetix.org/services/dbstats/examplez>
     """
-    stats_client = MongoClient(host=DB_MONGOHOST)
+    stats_client = get_mongo_client()
     stats_coll = stats_client[HOUSEKEEPING_DB][HOUSEKEEPING_INFO_COLL]
     results = []
     stats = stats_coll.find({}, {"_id": 0 }).sort("date", -1).limit(1)
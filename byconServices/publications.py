@@ -1,13 +1,12 @@
 import re
 from os import environ, path, pardir
-from pymongo import MongoClient
 from operator import itemgetter
 
 from bycon import (
     BYC,
     BYC_PARS,
     BeaconErrorResponse,
-    DB_MONGOHOST,
+    get_mongo_client,
     geo_query,
     prdbug
 )
@@ -50,7 +49,7 @@ def publications():
     
     BeaconErrorResponse().respond_if_errors()
 
-    mongo_client = MongoClient(host=DB_MONGOHOST)
+    mongo_client = get_mongo_client()
     pub_coll = mongo_client[ "_byconServicesDB" ][ "publications" ]
     p_re = re.compile( f_d_s["pubmed"]["pattern"] )
     d_k = BYC_PARS.get("delivery_keys", [])
@@ -88,7 +87,6 @@ def publications():
 
         p_l.append( s )
 
-    mongo_client.close( )
     results = sorted(p_l, key=itemgetter('sortid'), reverse = True)
     __check_publications_map_response(results)
     ByconServiceResponse().print_populated_response(results)
@@ -140,7 +138,7 @@ def _create_filters_query():
 
     if BYC["TEST_MODE"] is True:
         test_mode_count = int(BYC_PARS.get('test_mode_count', 5))
-        mongo_client = MongoClient(host=DB_MONGOHOST)
+        mongo_client = get_mongo_client()
         data_coll = mongo_client[ "_byconServicesDB" ][ "publications" ]
 
         rs = list(data_coll.aggregate([{"$sample": {"size": test_mode_count}}]))
@@ -19,7 +19,8 @@ def sampleplots():
     `.../sampleplots/{id}`
 
     The plot type can be set with `plotType=samplesplot` (or `histoplot` but that is
-    the fallback). Plot options are available as usual.
+    the fallback). Plot options are available as usual. An uploaded probe file
+    (`fileId`) is plotted with `plotType=probesplot`.
 
     #### Examples (using the Progenetix resource as endpoint):
 
@@ -35,7 +36,9 @@ def sampleplots():
     inputfile = Path( path.join( *BYC["local_paths"][ "server_tmp_dir_loc" ], file_id ) )
 
     pb = ByconBundler()
-    if inputfile.is_file():
+    if inputfile.is_file() and "probes" in ByconPlotPars().plotType():
+        pdb = pb.probefile_to_plotbundle(inputfile)
+    elif inputfile.is_file():
         pdb = pb.pgxseg_to_plotbundle(inputfile)
     else:
         RSS = ByconResultSets().datasetsResults()
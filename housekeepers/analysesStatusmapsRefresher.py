@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
-import datetime
+import datetime, time
 from isodate import date_isoformat
-from pymongo import MongoClient
+from multiprocessing import Pool
+from pymongo import UpdateOne
 from progress.bar import Bar
 
 from bycon import *
@@ -21,107 +22,254 @@ log_path = path.join( loc_path, pardir, "logs" )
 * `bin/analysesStatusmapsRefresher.py -d progenetix -f "icdom-81703"`
 * `bin/analysesStatusmapsRefresher.py`
   - default; new statusmaps for all `progenetix` analyses
+* `bin/analysesStatusmapsRefresher.py -d progenetix --workers 8 --force true`
+  - statusmaps computed in 8 worker processes, w/o any confirmation prompts
+    (e.g. for scheduled runs; prompts are also skipped w/o a terminal)
+* `bin/analysesStatusmapsRefresher.py -d progenetix --force true --deleteDuplicates true`
+  - as above, with deletion of duplicate variants w/o confirmation
+
+If a `statusmaps_store_dir_loc` is defined in `local_paths.yaml` the statusmaps
+are additionally written to the binary `StatusmapStore` of the dataset and
+binning, which is then used for interval frequency calculations.
 """
 ################################################################################
 
-GB = GenomeBins()
-ask_limit_reset()
-assertSingleDatasetOrExit()
-
-ds_id = BYC["BYC_DATASET_IDS"][0]
-set_collation_types()
-print(f'=> Using data values from {ds_id} for {GB.get_genome_bin_count()} intervals...')
-
-limit = BYC_PARS.get("limit", 0)
-data_client = MongoClient(host=DB_MONGOHOST)
-data_db = data_client[ ds_id ]
-cs_coll = data_db[ "analyses" ]
-v_coll = data_db[ "variants" ]
-
-record_queries = ByconQuery().recordsQuery()
-ds_results = {}
-if len(record_queries["entities"].keys()) > 0:
-    DR = ByconDatasetResults(ds_id, record_queries)
-    ds_results = DR.retrieveResults()
-
-if not ds_results.get("analyses.id"):
-    print(f'... collecting analysis id values from {ds_id} ...')
-    ana_ids = []
-    c_i = 0
-    for ana in cs_coll.find( {} ):
-        c_i += 1
-        ana_ids.append(ana["id"])
-        if limit > 0:
-            if limit == c_i:
-                break
-    cs_no = len(ana_ids)
-    print(f'¡¡¡ Using {cs_no} analyses from {ds_id} !!!')
-else:
-    ana_ids = ds_results["analyses.id"]["target_values"]
-    cs_no = len(ana_ids)
-
-print(f'Re-generating statusmaps with {GB.get_genome_bin_count()} intervals for {cs_no} analyses...')
-bar = Bar("{} analyses".format(ds_id), max = cs_no, suffix='%(percent)d%%'+" of "+str(cs_no) )
-counter = 0
-updated = 0
-
-proceed = input(f'Do you want to continue to update database **{ds_id}**?\n(Y|n): ')
-if "n" in proceed.lower():
-    exit()
-
-GB = GenomeBins()
-
-duplicates = []
-
-no_cnv_type = 0
-for ana_id in ana_ids:
-    ana = cs_coll.find_one( { "id": ana_id } )
-    _id = ana.get("_id")
-    counter += 1
-    if "SNV" in ana.get("variant_class", "CNV"):
-        no_cnv_type += 1
-        continue
-
-    bar.next()
-    cs_vars = v_coll.find({ "analysis_id": ana_id })
-    maps, cs_cnv_stats, cs_chro_stats, dids = GB.getAnalysisFracMapsAndStats(cs_vars)
-    if len(dids) > 0:
-        duplicates += dids
-    update_obj = {
-        "info": ana.get("info", {}),
-        "cnv_statusmaps": maps,
-        "cnv_stats": cs_cnv_stats,
-        "cnv_chro_stats": cs_chro_stats,
-        "updated": datetime.datetime.now().isoformat()
-    }
+# analyses are processed in batches, each with a single query for the analyses,
+# a single (sorted) variants cursor and a single `bulk_write`
+BATCH_SIZE = 1000
+V_FIELDS = {"_id": 1, "analysis_id": 1, "variant_internal_id": 1, "variant_state.id": 1, "location": 1}
+# minimum interval between saves of the statusmap store index during a refresh
+INDEX_SAVE_SECONDS = 30
 
-    if BYC.get("TEST_MODE", False) is True: 
-        pass
+# per process objects, created in `_init_refresher`
+REFRESHER = {}
+
+################################################################################
+
+def main():
+    interactive = interactive_mode()
+    if interactive:
+        ask_limit_reset()
+    ds_id = assertSingleDatasetOrExit()
+    set_collation_types()
+
+    limit = BYC_PARS.get("limit", 0)
+    workers = max(1, BYC_PARS.get("workers", 1))
+    test_mode = BYC.get("TEST_MODE", False)
+
+    _init_refresher(ds_id, test_mode)
+    GB = REFRESHER["GB"]
+    cs_coll = REFRESHER["cs_coll"]
+    v_coll = REFRESHER["v_coll"]
+    print(f'=> Using data values from {ds_id} for {GB.get_genome_bin_count()} intervals...')
+
+    record_queries = ByconQuery().recordsQuery()
+    ds_results = {}
+    if len(record_queries["entities"].keys()) > 0:
+        DR = ByconDatasetResults(ds_id, record_queries)
+        ds_results = DR.retrieveResults()
+
+    if not ds_results.get("analyses.id"):
+        print(f'... collecting analysis id values from {ds_id} ...')
+        ana_ids = []
+        c_i = 0
+        for ana in cs_coll.find( {}, {"id": 1} ):
+            c_i += 1
+            ana_ids.append(ana["id"])
+            if limit > 0:
+                if limit == c_i:
+                    break
+        cs_no = len(ana_ids)
+        print(f'¡¡¡ Using {cs_no} analyses from {ds_id} !!!')
     else:
-        cs_coll.update_one( { "_id": _id }, { '$set': update_obj }  )
-        updated += 1
+        ana_ids = ds_results["analyses.id"]["target_values"]
+        cs_no = len(ana_ids)
+
+    print(f'Re-generating statusmaps with {GB.get_genome_bin_count()} intervals for {cs_no} analyses using {workers} worker(s)...')
+
+    if interactive:
+        proceed = input(f'Do you want to continue to update database **{ds_id}**?\n(Y|n): ')
+        if "n" in proceed.lower():
+            exit()
+
+    SMS = StatusmapStore(ds_id, GB.get_genome_binning(), GB.get_genome_bin_count())
+    store_rows = {}
+    if SMS.isConfigured() and not test_mode:
+        print(f'... statusmaps are also written to the store in {SMS.store_dir}')
+        store_rows = SMS.reserveRows(ana_ids)
+        SMS.setDataVersion(dataset_data_version(ds_id))
+
+    bar = Bar("{} analyses".format(ds_id), max = cs_no, suffix='%(percent)d%%'+" of "+str(cs_no) )
+    counts = {"processed": 0, "no_cnv_type": 0, "updated": 0}
+    duplicates = []
+
+    i_saved = time.time()
+    batches = []
+    for b_i in range(0, cs_no, BATCH_SIZE):
+        b_ids = ana_ids[b_i:b_i + BATCH_SIZE]
+        batches.append((b_ids, {ana_id: store_rows[ana_id] for ana_id in b_ids if ana_id in store_rows}))
+    if workers > 1:
+        # each worker process gets its own database client and GenomeBins instance
+        pool = Pool(processes=workers, initializer=_init_refresher, initargs=(ds_id, test_mode))
+        b_results = pool.imap_unordered(_refresh_statusmaps_batch, batches)
+    else:
+        pool = None
+        b_results = map(_refresh_statusmaps_batch, batches)
+
+    for b_res in b_results:
+        for k in counts.keys():
+            counts[k] += b_res[k]
+        duplicates += b_res["duplicates"]
+        BYC["WARNINGS"] += b_res["warnings"]
+        if len(store_rows) > 0:
+            # only rows with written statusmaps are indexed
+            SMS.setWrittenRows(b_res["written"])
+            SMS.setNoStatusmaps(b_res["no_statusmaps"])
+            if time.time() - i_saved > INDEX_SAVE_SECONDS:
+                SMS.saveIndex()
+                i_saved = time.time()
+        for i in range(b_res["batch_count"]):
+            bar.next()
+
+    if pool:
+        pool.close()
+        pool.join()
+
+    bar.finish()
+
+    if not test_mode:
+        dataset_data_version_update(ds_id)
+
+    print(f'{counts["processed"]} analyses were processed')
+    print(f'{counts["no_cnv_type"]} analyses were not from CNV calling')
+    print(f'{counts["updated"]} analyses were updated for\n    `cnv_statusmaps`\n    `cnv_stats`\n    `cnv_chro_stats`\nusing {GB.get_genome_bin_count()} bins ({BYC_PARS.get("genome_binning", "")})')
 
-    ############################################################################
+    if len(duplicates) > 0:
+        print(f'¡¡¡ {len(duplicates)} duplicate variant entries were found !!!')
+        delete = "n"
+        if BYC_PARS.get("delete_duplicates", False) is True:
+            delete = "y"
+        elif interactive:
+            delete = input(f'Do you want to delete **{len(duplicates)}** duplicate variants?\n(y|N): ')
+        else:
+            print(f'... duplicates are only deleted in non-interactive mode with `--deleteDuplicates true`; see the log file')
+        if "y" in delete.lower():
+            del_no = 0
+            for b_i in range(0, len(duplicates), BATCH_SIZE):
+                b_dids = duplicates[b_i:b_i + BATCH_SIZE]
+                if test_mode is True:
+                    for v in v_coll.find({"_id": {"$in": b_dids}}):
+                        print(f'...would delete {v}')
+                else:
+                    del_no += v_coll.delete_many({"_id": {"$in": b_dids}}).deleted_count
+            if del_no > 0:
+                dataset_data_version_update(ds_id)
+            print(f'{del_no} duplicates were deleted')
 
-bar.finish()
+    # the store is valid for the data version after all modifications
+    if len(store_rows) > 0:
+        SMS.setDataVersion(dataset_data_version(ds_id))
+        SMS.saveIndex()
 
-print(f"{counter} analyses were processed")
-print(f"{no_cnv_type} analyses were not from CNV calling")
-print(f'{updated} analyses were updated for\n    `cnv_statusmaps`\n    `cnv_stats`\n    `cnv_chro_stats`\nusing {GB.get_genome_bin_count()} bins ({BYC_PARS.get("genome_binning", "")})')
+    log = BYC.get("WARNINGS", [])
+    write_log(log, path.join( log_path, "analyses_statusmaps" ))
 
-if len(duplicates) > 0:
-    print(f'¡¡¡ {len(duplicates)} duplicate variant entries were found !!!')
-    delete = input(f'Do you want to delete **{len(duplicates)}** duplicate variants?\n(y|N): ')
-    if "y" in delete.lower():
-        del_no = 0
-        for v__id in duplicates:
-            if BYC.get("TEST_MODE", False) is True:
-                print(f'...would delete {v_coll.find_one( { "_id": v__id } )}')
-            else:
-                v_coll.delete_one( { "_id": v__id } )
-                del_no += 1
-        print(f'{del_no} duplicates were deleted')
 
-log = BYC.get("WARNINGS", [])
-write_log(log, path.join( log_path, "analyses_statusmaps" ))
+################################################################################
+
+def _init_refresher(ds_id, test_mode):
+    data_client = get_mongo_client()
+    GB = GenomeBins()
+    REFRESHER.update({
+        "GB": GB,
+        "SMS": StatusmapStore(ds_id, GB.get_genome_binning(), GB.get_genome_bin_count()),
+        "cs_coll": data_client[ds_id]["analyses"],
+        "v_coll": data_client[ds_id]["variants"],
+        "test_mode": test_mode
+    })
+
+
+################################################################################
+
+def _refresh_statusmaps_batch(batch):
+    b_ids, b_rows = batch
+    GB = REFRESHER["GB"]
+    cs_coll = REFRESHER["cs_coll"]
+    v_coll = REFRESHER["v_coll"]
+    w_no = len(BYC["WARNINGS"])
+
+    b_res = {
+        "batch_count": len(b_ids),
+        "processed": 0,
+        "no_cnv_type": 0,
+        "updated": 0,
+        "duplicates": [],
+        "no_statusmaps": [],
+        "written": []
+    }
+
+    b_anas = {}
+    for ana in cs_coll.find({"id": {"$in": b_ids}}, {"id": 1, "info": 1, "variant_class": 1}):
+        b_anas.update({ana["id"]: ana})
+
+    cnv_ids = []
+    for ana_id in b_ids:
+        if not (ana := b_anas.get(ana_id)):
+            b_res["no_statusmaps"].append(ana_id)
+            continue
+        b_res["processed"] += 1
+        if "SNV" in ana.get("variant_class", "CNV"):
+            b_res["no_cnv_type"] += 1
+            b_res["no_statusmaps"].append(ana_id)
+            continue
+        cnv_ids.append(ana_id)
+
+    b_maps = {}
+    cs_vars = v_coll.find({"analysis_id": {"$in": cnv_ids}}, V_FIELDS).sort("analysis_id", 1)
+    for ana_id, maps, cs_cnv_stats, cs_chro_stats, dids in GB.analysesFracMapsAndStats(cs_vars):
+        b_res["duplicates"] += dids
+        b_maps.update({ana_id: (maps, cs_cnv_stats, cs_chro_stats)})
+
+    updates = []
+    row_maps = {}
+    w_ids = []
+    for ana_id in cnv_ids:
+        if ana_id in b_maps:
+            maps, cs_cnv_stats, cs_chro_stats = b_maps[ana_id]
+        else:
+            # analyses w/o variants still get their (empty) maps
+            maps, cs_cnv_stats, cs_chro_stats, dids = GB.getAnalysisFracMapsAndStats([])
+        update_obj = {
+            "info": b_anas[ana_id].get("info", {}),
+            "cnv_statusmaps": maps,
+            "cnv_stats": cs_cnv_stats,
+            "cnv_chro_stats": cs_chro_stats,
+            "updated": datetime.datetime.now().isoformat()
+        }
+        updates.append(UpdateOne({"_id": b_anas[ana_id]["_id"]}, {'$set': update_obj}))
+        if ana_id in b_rows:
+            row_maps.update({b_rows[ana_id]: maps})
+            w_ids.append(ana_id)
+
+    if REFRESHER["test_mode"] is True:
+        pass
+    elif len(updates) > 0:
+        cs_coll.bulk_write(updates, ordered=False)
+        b_res["updated"] += len(updates)
+        if len(row_maps) > 0:
+            REFRESHER["SMS"].writeStatusmaps(row_maps)
+            b_res.update({"written": w_ids})
+
+    # warnings are handed over to the main process for logging
+    b_res.update({"warnings": BYC["WARNINGS"][w_no:]})
+    del BYC["WARNINGS"][w_no:]
+
+    return b_res
+
+
+################################################################################
+################################################################################
+################################################################################
 
+if __name__ == '__main__':
+    main()
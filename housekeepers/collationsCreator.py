@@ -2,10 +2,9 @@
 
 import datetime, json, re, sys, yaml
 from os import path, environ, pardir
-from pymongo import MongoClient
 from progress.bar import Bar
 
-from bycon import BYC, config, initialize_bycon_service, prdbug
+from bycon import BYC, get_mongo_client, initialize_bycon_service, prdbug
 from byconServiceLibs import assertSingleDatasetOrExit, hierarchy_from_file, set_collation_types, write_log
 
 dir_path = path.dirname( path.abspath(__file__) )
@@ -48,8 +47,8 @@ def main():
             print( "Creating dummy hierarchy for " + coll_type)
             hier =  _get_dummy_hierarchy(ds_id, coll_type, coll_defs)
 
-        coll_coll = MongoClient(host=config.DB_MONGOHOST)[ ds_id ]["collations"]
-        data_coll = MongoClient(host=config.DB_MONGOHOST)[ ds_id ][ collection ]
+        coll_coll = get_mongo_client()[ ds_id ]["collations"]
+        data_coll = get_mongo_client()[ ds_id ][ collection ]
 
         onto_ids = _get_ids_for_prefix( data_coll, coll_defs )
         onto_keys = list( set( onto_ids ) & hier.keys() )
@@ -145,7 +144,7 @@ def get_prefix_hierarchy( ds_id, coll_type, pre_h_f):
     # now adding terms missing from the tree ###################################
     print("Looking for missing {} codes in {}.{} ...".format(coll_type, ds_id, coll_defs["scope"]))
 
-    data_coll = MongoClient(host=config.DB_MONGOHOST)[ ds_id ][coll_defs["scope"]]
+    data_coll = get_mongo_client()[ ds_id ][coll_defs["scope"]]
     db_key = coll_defs.get("db_key", "")    
     onto_ids = _get_ids_for_prefix( data_coll, coll_defs )
 
@@ -223,7 +222,7 @@ def _make_dummy_publication_hierarchy():
     f_d_s = BYC.get("filter_definitions", {})
     coll_type = "pubmed"
     coll_defs = f_d_s[coll_type]
-    data_coll = MongoClient(host=config.DB_MONGOHOST)["_byconServicesDB"]["publications"]
+    data_coll = get_mongo_client()["_byconServicesDB"]["publications"]
     query = { "id": { "$regex": r'^PMID\:\d+?$' } }
     no = data_coll.count_documents( query )
     bar = Bar("Publications...", max = no, suffix='%(percent)d%%'+" of "+str(no) )
@@ -256,7 +255,7 @@ def _make_dummy_publication_hierarchy():
 ################################################################################
 
 def _get_dummy_hierarchy(ds_id, coll_type, coll_defs):
-    data_db = MongoClient(host=config.DB_MONGOHOST)[ ds_id ]
+    data_db = get_mongo_client()[ ds_id ]
     data_coll = data_db[ coll_defs["scope"] ]
     data_pat = coll_defs["pattern"]
     db_key = coll_defs["db_key"]
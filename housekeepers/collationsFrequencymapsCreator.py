@@ -2,12 +2,11 @@
 
 import datetime
 import time
-from pymongo import MongoClient
 from progress.bar import Bar
 from random import shuffle as random_shuffle
 
 from bycon import *
-from byconServiceLibs import assertSingleDatasetOrExit, ask_limit_reset, ByconBundler, GenomeBins, set_collation_types
+from byconServiceLibs import assertSingleDatasetOrExit, ask_limit_reset, ByconBundler, ByconPlotCache, GenomeBins, set_collation_types
 
 ################################################################################
 
@@ -28,7 +27,7 @@ def main():
 
     set_collation_types()
 
-    data_client = MongoClient(host=DB_MONGOHOST)
+    data_client = get_mongo_client()
     data_db = data_client[ ds_id ]
     coll_coll = data_db[ "collations" ]
     ind_coll = data_db["individuals"]
@@ -104,6 +103,8 @@ def main():
     
     if not BYC["TEST_MODE"]:
         bar.finish()
+        # cached collation plots are based on the previous frequencymaps
+        ByconPlotCache().clear()
 
 
 ################################################################################
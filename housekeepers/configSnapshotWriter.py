@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+
+from bycon import *
+
+"""
+## `configSnapshotWriter`
+
+The script writes the merged package & local configuration (as used by scripts
+in the `beaconServer` and `byconServices` directories, which share the `local`
+directory after installation) into a snapshot file which is read instead of
+the YAML files on startup, as long as none of them has been changed.
+
+* `housekeepers/configSnapshotWriter.py`
+  - writes `local/config_snapshot.pickle` (or the file defined through the
+    `BYCON_CONFIG_SNAPSHOT` environment variable)
+
+The snapshot is written by `updev.sh` before the server installation and has
+to be re-written after configuration changes (otherwise the YAML files are
+parsed again on each request).
+"""
+
+################################################################################
+################################################################################
+################################################################################
+
+def main():
+    s_f = write_config_snapshot()
+    print(f'==> wrote configuration snapshot to {s_f}')
+
+
+################################################################################
+################################################################################
+################################################################################
+
+if __name__ == '__main__':
+    main()
@@ -2,11 +2,10 @@
 
 import datetime
 import time
-from pymongo import MongoClient
 from progress.bar import Bar
 
 from bycon import *
-from byconServiceLibs import assertSingleDatasetOrExit, ask_limit_reset, ByconBundler, GenomeBins, set_collation_types
+from byconServiceLibs import assertSingleDatasetOrExit, ask_limit_reset, ByconBundler, ByconPlotCache, GenomeBins, frequencymaps_linkages_refresh, set_collation_types
 
 ################################################################################
 
@@ -18,7 +17,7 @@ def main():
     set_collation_types()
     print(f'=> Using data values from {ds_id} for {GB.get_genome_bin_count()} intervals...')
 
-    data_client = MongoClient(host=DB_MONGOHOST)
+    data_client = get_mongo_client()
     data_db = data_client[ ds_id ]
     coll_coll = data_db[ "collations" ]
     fm_coll = data_db[ "frequencymaps" ]
@@ -102,6 +101,13 @@ def main():
 
     if not BYC["TEST_MODE"]:
         bar.finish()
+        # cached collation plots are based on the previous frequencymaps
+        ByconPlotCache().clear()
+        # precomputed clustering of all groups per collation type
+        p_d_p = BYC.get("plot_defaults", {}).get("plot_parameters", {})
+        c_m = p_d_p.get("plot_cluster_metric", {}).get("default", "complete")
+        l_no = frequencymaps_linkages_refresh(ds_id, c_m, BYC_PARS.get("min_number", 0))
+        print(f'==> stored {l_no} collation type cluster linkages')
 
 
 ################################################################################
@@ -3,7 +3,6 @@
 import re, json, yaml, sys, datetime
 from isodate import date_isoformat
 from os import path, environ, pardir, system
-from pymongo import MongoClient
 from progress.bar import Bar
 
 from bycon import *
@@ -32,7 +31,7 @@ def main():
         "datasets_counts": input("Recalculate counts for all datasets?\n(y|N): ")
     }
 
-    data_db = MongoClient(host=DB_MONGOHOST)[ ds_id ]
+    data_db = get_mongo_client()[ ds_id ]
 
     #>-------------------- MongoDB index updates -----------------------------<#
 
@@ -147,7 +146,7 @@ def main():
 
         b_info = __dataset_update_counts()
 
-        info_coll = MongoClient(host=DB_MONGOHOST)[ HOUSEKEEPING_DB ][ HOUSEKEEPING_INFO_COLL ]
+        info_coll = get_mongo_client()[ HOUSEKEEPING_DB ][ HOUSEKEEPING_INFO_COLL ]
         info_coll.delete_many( { "date": b_info["date"] } ) #, upsert=True
         info_coll.insert_one( b_info ) #, upsert=True 
 
@@ -172,6 +171,10 @@ def main():
 
     #>-------------------- / update frequencymaps ----------------------------<#
 
+    # invalidates cached query results for the dataset
+    if not BYC["TEST_MODE"]:
+        dataset_data_version_update(ds_id)
+
 ################################################################################
 #################################### subs ######################################
 ################################################################################
@@ -179,12 +182,12 @@ def main():
 def __dataset_update_counts():
 
     b_info = { "date": date_isoformat(datetime.datetime.now()), "datasets": { } }
-    mongo_client = MongoClient(host=DB_MONGOHOST)
+    mongo_client = get_mongo_client()
 
     # this is independend of the dataset selected for the script & will update
     # for all in any run
     for i_ds_id in BYC["dataset_definitions"].keys():
-        if not i_ds_id in BYC["DATABASE_NAMES"]:
+        if not i_ds_id in database_names():
             print(f'¡¡¡ Dataset "{i_ds_id}" does not exist !!!')
             continue
 
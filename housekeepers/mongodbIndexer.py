@@ -2,9 +2,9 @@
 
 import re
 from os import environ, path
-from pymongo import MongoClient, GEOSPHERE
+from pymongo import GEOSPHERE
 
-from bycon import BYC, DB_MONGOHOST
+from bycon import BYC, get_mongo_client
 from byconServiceLibs import *
 
 loc_path = path.dirname( path.abspath(__file__) )
@@ -24,7 +24,7 @@ def mongodb_indexer():
     dt_m = BYC["datatable_mappings"]
     s_c = BYC.get("service_config", {})
     b_rt_s = s_c["indexed_response_types"]
-    mongo_client = MongoClient(host=DB_MONGOHOST)
+    mongo_client = get_mongo_client()
     data_db = mongo_client[ds_id]
     coll_names = data_db.list_collection_names()
     for r_t, r_d in b_rt_s.items():
@@ -72,7 +72,7 @@ def mongodb_indexer():
 ################################################################################
             
 def __index_by_colldef(ds_id, coll_defs):
-    mongo_client = MongoClient(host=DB_MONGOHOST)
+    mongo_client = get_mongo_client()
     i_db = mongo_client[ds_id]
     coll_names = i_db.list_collection_names()
 
@@ -2,7 +2,6 @@
 
 from os import pardir, path, system
 from bycon import *
-from pymongo import MongoClient
 
 loc_path = path.dirname( path.abspath(__file__) )
 project_path = path.join(loc_path , pardir)
@@ -48,7 +47,7 @@ def main():
         exit()
     set_entities()
 
-    mongo_client = MongoClient(host=DB_MONGOHOST)
+    mongo_client = get_mongo_client()
     mongo_db = mongo_client[examples_db]
     test_colls = mongo_db.list_collection_names()
     for coll in list(test_colls):
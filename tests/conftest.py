@@ -0,0 +1,17 @@
+import sys
+from os import environ, path, pardir
+
+"""
+Common setup for the tests: `bycon` is imported from this repository w/o a
+database lookup for the dataset names and w/o parsing the `pytest` command line
+(which `bycon` does at import).
+"""
+
+environ.setdefault("DATABASE_NAMES", "examplez")
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), pardir))
+
+argv = sys.argv
+sys.argv = argv[:1]
+import bycon
+import byconServiceLibs
+sys.argv = argv
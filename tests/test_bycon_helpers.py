@@ -0,0 +1,80 @@
+import random
+
+"""
+Equivalence check of the chunked `$in` based `mongo_records_by_values` against
+the previous per-value `find_one` retrieval (kept here as reference), with a
+minimal in-memory stand-in for a MongoDB collection which returns `find`
+results in arbitrary order.
+"""
+
+from bycon import mongo_records_by_values
+
+################################################################################
+
+class MemoryCollection:
+    """
+    Supports `find` / `find_one` with `{key: value}` and `{key: {"$in": [...]}}`
+    queries on top-level keys and inclusion / exclusion projections.
+    """
+    def __init__(self, docs, seed=42):
+        self.docs = docs
+        self.rnd = random.Random(seed)
+
+    def find(self, query, fields=None):
+        (key, q_v), = query.items()
+        values = set(q_v["$in"]) if type(q_v) is dict else {q_v}
+        docs = [d for d in self.docs if d.get(key) in values]
+        self.rnd.shuffle(docs)
+        return [self.__project(d, fields) for d in docs]
+
+    def find_one(self, query, fields=None):
+        (key, q_v), = query.items()
+        for d in self.docs:
+            if d.get(key) == q_v:
+                return self.__project(d, fields)
+        return None
+
+    def __project(self, doc, fields):
+        if not fields:
+            return dict(doc)
+        if any(v for f, v in fields.items() if f != "_id"):
+            keys = [f for f, v in fields.items() if v] + ([] if fields.get("_id", 1) == 0 else ["_id"])
+            return {k: v for k, v in doc.items() if k in keys}
+        return {k: v for k, v in doc.items() if k not in fields}
+
+
+################################################################################
+
+def reference_records_by_values(coll, values, key="id", fields=None):
+    # previous per-value retrieval
+    for v in values:
+        if (rec := coll.find_one({key: v}, fields)):
+            yield rec
+
+
+################################################################################
+################################################################################
+################################################################################
+
+def test_mongo_records_by_values_order():
+    docs = [{"_id": i, "id": f'id{i:03}', "biosample_id": f'bs{i % 7}', "name": f'n{i}'} for i in range(200)]
+    coll = MemoryCollection(docs)
+    rnd = random.Random(7)
+    # random order, missing values and duplicates
+    values = rnd.sample([d["id"] for d in docs], 150) + ["___missing___"]
+    values += values[:5]
+    rnd.shuffle(values)
+    for fields in [None, {"_id": 0}, {"name": 1}, {"_id": 0, "name": 1}, {"_id": 0, "id": 0}]:
+        for chunk_size in [0, 1, 7, 1000]:
+            recs = list(mongo_records_by_values(coll, values, fields=fields, chunk_size=chunk_size))
+            assert recs == list(reference_records_by_values(coll, values, fields=fields)), f'{fields} / {chunk_size}'
+
+
+def test_mongo_records_by_values_key():
+    docs = [{"_id": i, "id": f'id{i:03}', "biosample_id": f'bs{i % 7}'} for i in range(50)]
+    coll = MemoryCollection(docs)
+    values = ["bs3", "bs1", "bs3", "bs9"]
+    # one record per value (all records of a value are equal in this projection)
+    recs = list(mongo_records_by_values(coll, values, key="biosample_id", fields={"_id": 0, "biosample_id": 1}))
+    assert recs == list(reference_records_by_values(coll, values, key="biosample_id", fields={"_id": 0, "biosample_id": 1}))
+
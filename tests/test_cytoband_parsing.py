@@ -0,0 +1,46 @@
+import random
+
+"""
+Equivalence check of the `bisect` based `cytobands_list_from_positions` against
+the previous filtering of the complete cytoband list (kept here as reference).
+No database access is needed.
+"""
+
+from bycon import Cytobands, cytobands_list_from_positions
+
+################################################################################
+
+def reference_cytobands_list(chro, start, end=None):
+    # previous `cytobands_list_from_positions` (for a given start)
+    start = int(start)
+    if not end:
+        end = start + 1
+    end = int(end)
+    cytobands = list(filter(lambda d: d["chro"] == chro, Cytobands().get_all_cytobands()))
+    cytobands = list(filter(lambda d: int(d["end"]) > start, cytobands))
+    cytobands = list(filter(lambda d: int(d["start"]) < end, cytobands))
+    return cytobands, chro, start, end
+
+
+################################################################################
+################################################################################
+################################################################################
+
+def test_cytobands_list_from_positions():
+    rnd = random.Random(42)
+    c_l = Cytobands().get_all_cytolimits()
+    for chro, c_v in c_l.items():
+        size = c_v["size"]
+        # band borders, chromosome ends and random ranges
+        positions = [(1, 2), (size - 1, size), (c_v["p"][-1], c_v["p"][-1] + 1), (1, size + 1000)]
+        positions += [(s, s + rnd.choice([1, 10000, 5000000, size])) for s in [rnd.randrange(1, size) for i in range(20)]]
+        for start, end in positions:
+            assert cytobands_list_from_positions(chro, start, end) == reference_cytobands_list(chro, start, end), f'{chro}:{start}-{end}'
+        # w/o end a single base is used
+        start = rnd.randrange(1, size)
+        assert cytobands_list_from_positions(chro, start) == reference_cytobands_list(chro, start)
+
+
+def test_cytobands_list_unknown_chromosome():
+    assert cytobands_list_from_positions("___none___", 1, 100)[0] == []
+
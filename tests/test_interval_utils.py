@@ -0,0 +1,136 @@
+import random
+
+"""
+Equivalence checks of the binned `GenomeBins` intervals and the vectorized CNV
+coverage accumulation against the previous per-interval implementation (kept
+here as reference). No database access is needed.
+"""
+
+from bycon import BYC, Cytobands, cytobands_label_from_positions
+from byconServiceLibs import GenomeBins
+
+################################################################################
+
+def reference_genomic_intervals(binning="1Mb"):
+    # previous `GenomeBins.__generate_genomic_intervals`
+    i_d = BYC["interval_definitions"]
+    c_l = Cytobands().get_all_cytolimits()
+    int_b = i_d["genome_bin_sizes"]["values"][binning]
+    e_p = int_b * i_d["terminal_intervals_soft_expansion_fraction"].get("value", 0.1)
+    intervals = []
+    i = 1
+    for chro in c_l.keys():
+        p_max = c_l[chro]["p"][-1]
+        q_max = c_l[chro]["size"]
+        arm = "p"
+        start = 0
+        p_first = p_max
+        while p_first >= int_b + e_p:
+            p_first -= int_b
+        end = start + p_first
+        while start < q_max:
+            int_p = int_b
+            if end > q_max:
+                end = q_max
+            elif q_max < end + e_p:
+                end = q_max
+                int_p += e_p
+            if end >= p_max:
+                arm = "q"
+            cbs = cytobands_label_from_positions(chro, start, end)
+            intervals.append({
+                "no": i,
+                "id": f'{chro}{arm}:{start:09}-{end:09}',
+                "reference_name": chro,
+                "arm": arm,
+                "cytobands": f'{chro}{cbs}',
+                "start": start,
+                "end": end,
+                "size": end - start
+            })
+            start = end
+            end += int_p
+            i += 1
+    return intervals
+
+
+################################################################################
+
+def reference_coverage_maps(intervals, variants):
+    # previous `GenomeBins.__interval_cnv_coverage_arrays` (w/o duplicates)
+    v_t_d = BYC["variant_type_definitions"]
+    cov_labs = {"DUP": 'dup', "DEL": 'del'}
+    hl_labs = {"HLDUP": "hldup", "HLDEL": "hldel"}
+    maps = {lab: [0] * len(intervals) for lab in [*cov_labs.values(), *hl_labs.values()]}
+    digests = set()
+    for v in variants:
+        v_t_c = v.get("variant_state", {}).get("id", "__NA__")
+        if not (dup_del := v_t_d.get(v_t_c, {}).get("DUPDEL")):
+            continue
+        cov_lab = cov_labs[dup_del]
+        hl_lab = hl_labs.get(v_t_d[v_t_c].get("HLDUPDEL", "___none___"))
+        if (v_i_id := v.get("variant_internal_id")) in digests:
+            continue
+        digests.add(v_i_id)
+        loc = v["location"]
+        for i, intv in enumerate(intervals):
+            if intv["reference_name"] != loc["chromosome"]:
+                continue
+            if loc["start"] >= intv["end"] or loc["end"] <= intv["start"]:
+                continue
+            ov = min(intv["end"], loc["end"]) - max(intv["start"], loc["start"])
+            maps[cov_lab][i] += ov
+            if hl_lab:
+                maps[hl_lab][i] += ov
+    return maps
+
+
+################################################################################
+
+def random_cnv_variants(count=300, seed=42):
+    rnd = random.Random(seed)
+    c_l = Cytobands().get_all_cytolimits()
+    chros = list(c_l.keys())
+    v_t_s = ["EFO:0030067", "EFO:0030068", "EFO:0030070", "EFO:0030071", "EFO:0030072", "EFO:0020073", "SO:0001059"]
+    variants = []
+    for i in range(count):
+        chro = rnd.choice(chros)
+        size = c_l[chro]["size"]
+        start = rnd.randrange(0, size)
+        # small, large and chromosome spanning variants
+        end = min(size, start + rnd.choice([1, 1000, 500000, 3000000, size]))
+        variants.append({
+            "variant_internal_id": f'{chro}:{start}-{end}:{i}',
+            "variant_state": {"id": rnd.choice(v_t_s)},
+            "location": {"chromosome": chro, "start": start, "end": end}
+        })
+    # a duplicated variant is only counted once
+    variants.append(dict(variants[0]))
+    return variants
+
+
+################################################################################
+################################################################################
+################################################################################
+
+def test_genome_bins_intervals():
+    GB = GenomeBins()
+    assert GB.get_genome_bins() == reference_genomic_intervals(GB.get_genome_binning())
+
+
+def test_cnv_coverage_maps():
+    GB = GenomeBins()
+    variants = random_cnv_variants()
+    maps = GB.getAnalysisCoverageMaps(variants)
+    ref_maps = reference_coverage_maps(GB.get_genome_bins(), variants)
+    assert maps["variant_count"] == len(variants)
+    for lab, ref_cov in ref_maps.items():
+        assert maps[lab] == ref_cov, lab
+
+
+def test_cnv_coverage_maps_empty():
+    GB = GenomeBins()
+    maps = GB.getAnalysisCoverageMaps([])
+    assert maps["variant_count"] == 0
+    assert maps["dup"] == [0] * GB.get_genome_bin_count()
+
@@ -0,0 +1,90 @@
+import random, tempfile
+import numpy as np
+from os import remove
+
+"""
+Checks of the `ProbeData` columns against the probe objects they are created
+from: probes on unknown chromosomes are dropped and the remaining ones are
+sorted (stable) by the cytoband chromosome order and position, for probe lists
+as well as for probe files; the probe object list of a file keeps the file
+order and all probes.
+"""
+
+from bycon import Cytobands
+from byconServiceLibs import ByconBundler, ProbeData
+
+################################################################################
+
+def random_probes(count=5000, seed=42):
+    rnd = random.Random(seed)
+    c_l = Cytobands().get_all_cytolimits()
+    chros = list(c_l.keys()) + ["Un_gl000220"]
+    probes = []
+    for i in range(count):
+        chro = rnd.choice(chros)
+        size = c_l.get(chro, {}).get("size", 100000)
+        probes.append({
+            "probe_id": f'p{i}',
+            "reference_name": chro,
+            # duplicated positions check the stable sorting
+            "start": rnd.randrange(0, size) if i % 10 else 1000,
+            "value": round(rnd.uniform(-2, 2), 4)
+        })
+    return probes
+
+
+################################################################################
+
+def reference_probe_list(probes):
+    chro_names = list(Cytobands().get_all_cytolimits().keys())
+    c_i = {c: i for i, c in enumerate(chro_names)}
+    probes = [p for p in probes if p["reference_name"] in c_i]
+    probes = sorted(probes, key=lambda p: (c_i[p["reference_name"]], p["start"]))
+    return [
+        {
+            "probe_id": p["probe_id"],
+            "reference_name": p["reference_name"],
+            "start": p["start"],
+            # the values are stored as float32
+            "value": float(np.float32(p["value"]))
+        } for p in probes
+    ]
+
+
+################################################################################
+################################################################################
+################################################################################
+
+def test_probe_data_sorting():
+    probes = random_probes()
+    P = ProbeData(probes)
+    ref = reference_probe_list(probes)
+    assert P.probeCount() == len(ref)
+    assert P.probeList() == ref
+    for chro, (c_f, c_l) in P.chro_index.items():
+        assert {p["reference_name"] for p in ref[c_f:c_l]} == {chro}
+        assert c_l - c_f == len([p for p in ref if p["reference_name"] == chro])
+
+
+def test_probe_data_sorted_input():
+    # already sorted input is kept as is
+    ref = reference_probe_list(random_probes(seed=7))
+    assert ProbeData(ref).probeList() == ref
+
+
+def test_probe_file_reading():
+    probes = random_probes(count=1000)
+    p_f, p_p = tempfile.mkstemp(suffix=".tsv")
+    try:
+        with open(p_f, "w") as p_fh:
+            p_fh.write("#meta=>some header\n")
+            p_fh.write("probe_id\treference_name\tstart\tvalue\n")
+            for p in probes:
+                p_fh.write(f'{p["probe_id"]}\t{p["reference_name"]}\t{p["start"]}\t{p["value"]}\n')
+        assert ByconBundler().read_probedata_columns(p_p).probeList() == reference_probe_list(probes)
+        assert ByconBundler().read_probedata_file(p_p) == probes
+        p_b = ByconBundler().probefile_to_plotbundle(p_p)["analyses_probes_bundles"]
+        assert p_b[0]["cn_probes"].probeList() == reference_probe_list(probes)
+    finally:
+        remove(p_p)
+
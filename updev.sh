@@ -2,11 +2,13 @@
 # and then performs the server update.
 
 pip3 uninstall bycon --break-system-packages
+./bycon/schemas/bin/schemasCacher.py
 python3 -m build --sdist .
 BY=(./dist/*tar.gz)
 pip3 install $BY --break-system-packages
 ./bycon/schemas/bin/yamlerRunner.sh
 ./markdowner.py
+./housekeepers/configSnapshotWriter.py
 # pipreqs --force .
 # python3 -m build --wheel && twine upload dist/*
 # git tag v2.0.9  & git push --tags